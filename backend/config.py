@@ -20,11 +20,42 @@ class Settings:
     DATAIKU_HOST: str = os.getenv("DATAIKU_HOST", "")
     API_KEY: str = os.getenv("API_KEY", "")
     PROJECT_KEY: str = os.getenv("PROJECT_KEY", "MALEE_NEW")
+    # Where datasets/folders are read from: "dataiku" (live DSS) or "local" (CSV files, for offline benchmarks)
+    DATA_SOURCE: str = os.getenv("DATA_SOURCE", "dataiku")
+    LOCAL_DATA_DIR: str = os.getenv("LOCAL_DATA_DIR", str(Path(__file__).resolve().parent.parent / "data"))
+    LOCAL_DATASET_FILES: str = os.getenv("LOCAL_DATASET_FILES", "")  # "dataset=file.csv,dataset2=other.csv"
     
     # Dashboard Settings
     PROJECT_KEY_DASHBOARD: str = os.getenv("PROJECT_KEY_DASHBOARD", "MALEE_NEW")
     DATASET_DASHBOARD_SUMMARY: str = os.getenv("DATASET_DASHBOARD_SUMMARY", "sale_data_final_1")
     DATASET_ANALYTICS_DASHBOARD: str = os.getenv("DATASET_ANALYTICS_DASHBOARD", "join_data_cl_fill_prepared")
+    DATASET_CACHE_TTL: int = int(os.getenv("DATASET_CACHE_TTL", "300"))  # seconds before a snapshot is revalidated
+    DATASET_CACHE_MAX_MB: int = int(os.getenv("DATASET_CACHE_MAX_MB", "1024"))  # memory budget across all cached datasets
+    # Execution model: aggregation runs on a bounded compute pool, Dataiku downloads on a fetch pool
+    COMPUTE_WORKERS: int = int(os.getenv("COMPUTE_WORKERS", "4"))  # threads for dashboard/analytics aggregation
+    COMPUTE_MAX_QUEUE: int = int(os.getenv("COMPUTE_MAX_QUEUE", "64"))  # waiting requests before SERVER_BUSY (0 = unbounded)
+    DATASET_FETCH_WORKERS: int = int(os.getenv("DATASET_FETCH_WORKERS", "2"))  # concurrent dataset downloads/refreshes
+    RESULT_CACHE_MAX_MB: int = int(os.getenv("RESULT_CACHE_MAX_MB", "64"))  # budget for cached endpoint responses
+    DATASET_BATCH_SIZE: int = int(os.getenv("DATASET_BATCH_SIZE", "50000"))  # rows per streamed ingestion batch
+    # Incremental refresh (opt-in): comma-separated datasets that re-fetch only their trailing months on TTL
+    # expiry. Undated rows are not re-fetched, so new ones only appear after the next full reload.
+    DATASET_INCREMENTAL: str = os.getenv("DATASET_INCREMENTAL", "")
+    DATASET_INCREMENTAL_TRAILING_MONTHS: int = int(os.getenv("DATASET_INCREMENTAL_TRAILING_MONTHS", "2"))  # months that can still change
+    DATASET_FULL_REFRESH_HOURS: float = float(os.getenv("DATASET_FULL_REFRESH_HOURS", "24"))  # full reload at least this often
+    # Date column used for incremental and split downloads, and the DSS formula pushed down to filter it
+    DATASET_DATE_COLUMN: str = os.getenv("DATASET_DATE_COLUMN", "date")
+    DATASET_DATE_FILTER: str = os.getenv("DATASET_DATE_FILTER", 'strval("{column}") {op} "{value}"')
+    # Parallel download: partitions (or date slices) fetched concurrently by this many workers
+    DATASET_DOWNLOAD_WORKERS: int = int(os.getenv("DATASET_DOWNLOAD_WORKERS", "4"))
+    # Non-partitioned datasets with DATASET_DATE_COLUMN are split into slices of N months from this day (empty = off)
+    DATASET_DOWNLOAD_SPLIT_FROM: str = os.getenv("DATASET_DOWNLOAD_SPLIT_FROM", "")
+    DATASET_DOWNLOAD_SPLIT_MONTHS: int = int(os.getenv("DATASET_DOWNLOAD_SPLIT_MONTHS", "6"))
+    # Local Arrow snapshots for fast cold start (empty string disables; mount a volume to keep across deploys)
+    SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", str(Path(__file__).resolve().parent.parent / ".snapshots"))
+    # Auto-generated mask names, shared by every worker and kept across restarts (empty string = in memory only);
+    # defaults to the user's cache directory so running the app never writes into the source tree
+    MASK_REGISTRY_FILE: str = os.getenv("MASK_REGISTRY_FILE", str(
+        Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "malee-sales-app" / "mask_registry.json"))
     
     # Gemini AI Settings
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
@@ -1,4 +1,5 @@
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -6,6 +7,7 @@ import logging
 
 from backend.config import settings
 from backend.routers import dashboard, scoring, health, test_new_dataset, analytics, ai, predict
+from backend.services.dataset_cache import dataset_cache
 
 # Configure logging
 logging.basicConfig(
@@ -14,11 +16,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Map local snapshots (or start background downloads) so the first request does not wait on Dataiku
+    dataset_cache.warm([settings.DATASET_DASHBOARD_SUMMARY, settings.DATASET_ANALYTICS_DASHBOARD])
+    yield
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     # CORS
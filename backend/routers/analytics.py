@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 from datetime import datetime
 
+import numpy as np
+
 from ..schemas.common import APIResponse
 from ..schemas.dashboard_v2 import (
     DashboardSummaryResponse, 
@@ -16,34 +18,30 @@ from ..schemas.dashboard_v2 import (
     PerformanceRankingItem, 
     ScatterPoint, 
     ErrorDistBin,
-    TimeSeriesPoint
+    TimeSeriesPoint,
+    AnalyticsBatchRequest,
+    AnalyticsBatchResponse,
+    ColumnarHeatmap,
+    ColumnarMonthlyTS,
+    ColumnarTimeSeries
 )
-from ..services.dataiku_service import dataiku_service
 from ..services.data_masking import masker
+from ..services.dataset_cache import dataset_cache
+from ..services.table_index import table_index
+from ..services.olap_cube import aggregate_cube
+from ..services.filter_options import filter_options
+from ..services.result_cache import result_cache
+from ..services.worker_pools import offloaded
+from ..services import deep_dive
 from ..config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# In-memory cache for analytics data
-DATA_CACHE = {}
-CACHE_TTL = 300 # 5 minutes
-
-def get_cached_dataset(dataset_name: str):
-    now = datetime.now().timestamp()
-    if dataset_name in DATA_CACHE:
-        cached = DATA_CACHE[dataset_name]
-        if now - cached["timestamp"] < CACHE_TTL:
-            return cached["data"]
-    
-    logger.info(f"Fetching fresh data for {dataset_name}")
-    rows = dataiku_service.get_dataset_rows(dataset_name)
-    DATA_CACHE[dataset_name] = {"timestamp": now, "data": rows}
-    return rows
-
 @router.get("/filters", response_model=APIResponse[FilterOptionsResponse])
 @router.get("/filters", response_model=APIResponse[FilterOptionsResponse])
-async def get_analytics_filters(
+@offloaded(prefetch=settings.DATASET_ANALYTICS_DASHBOARD)
+def get_analytics_filters(
     product_group: Optional[str] = None,
     flavor: Optional[str] = None,
     size: Optional[str] = None,
@@ -55,39 +53,26 @@ async def get_analytics_filters(
         if flavor: flavor = masker.unmask("flavor", flavor)
         if customer: customer = masker.unmask("customer", customer)
 
-        rows = get_cached_dataset(settings.DATASET_ANALYTICS_DASHBOARD)
-
-        filtered_rows = []
-        for row in rows:
-            if row.get("Product_Group") == "Canned Fruit": continue
-            if product_group and not masker.match("product_group", row.get("Product_Group", ""), product_group): continue
-            if flavor and not masker.match("flavor", row.get("Flavor", ""), flavor): continue
-            if size and str(row.get("Size")) != str(size): continue
-            if customer and not masker.match("customer", row.get("Customer", ""), customer): continue
-            filtered_rows.append(row)
-
-        product_groups = set()
-        flavors = set()
-        sizes = set()
-        customers = set()
-        mechgroups = set()
-
-        for row in filtered_rows:
-            if val := row.get("Product_Group"): product_groups.add(val)
-            if val := row.get("Flavor"): flavors.add(val)
-            if val := row.get("Size"): sizes.add(str(val))
-            if val := row.get("Customer"): customers.add(val)
-            if val := row.get("MechGroup"): mechgroups.add(val)
+        snapshot = dataset_cache.get(settings.DATASET_ANALYTICS_DASHBOARD)
+        table = snapshot.table
+
+        # Cascading options come from the snapshot's co-occurrence index (memoized per selection)
+        opts = filter_options(table).options(
+            {"Product_Group": product_group, "Flavor": flavor, "Size": size and str(size), "Customer": customer},
+            exact=["Size"],
+            exclude={"Product_Group": ["Canned Fruit"]},
+            columns=["Product_Group", "Flavor", "Size", "Customer", "MechGroup"],
+        )
 
         return APIResponse(
             success=True,
             data=FilterOptionsResponse(
-                product_groups=sorted([masker.mask("product_group", v) for v in product_groups]),
-                flavors=sorted([masker.mask("flavor", v) for v in flavors]),
-                sizes=sorted([masker.mask("size", v) for v in sizes]),
-                customers=sorted([masker.mask("customer", v) for v in customers]),
+                product_groups=opts["Product_Group"],
+                flavors=opts["Flavor"],
+                sizes=opts["Size"],
+                customers=opts["Customer"],
                 sites=[],
-                mechgroups=sorted([masker.mask("mechgroup", v) for v in mechgroups])
+                mechgroups=opts["MechGroup"]
             )
         )
     except Exception as e:
@@ -96,7 +81,225 @@ async def get_analytics_filters(
 
 
 
+def _summary_selection(table, start_id: int, end_id: int, customer, product_group, size, flavor,
+                       mechgroup, has_promotion) -> np.ndarray:
+    """Rows of `table` (a snapshot or its cube cells) matching the summary filters."""
+    sel = table_index(table).select(start_id, end_id)
+    sel.exclude("Product_Group", ["Canned Fruit"])
+
+    sel.match("Customer", customer)
+    sel.match("Product_Group", product_group)
+    sel.match("Size", size)
+    sel.match("Flavor", flavor)
+    sel.match("MechGroup", mechgroup)
+
+    sel.where_value("has_promotion", has_promotion)
+    return sel.rows()
+
+
+def _summary_widgets(table, start_id: int, end_id: int, customer, product_group, size, flavor, mechgroup,
+                     has_promotion, breakdown: Optional[str]) -> Dict[str, Any]:
+    """
+    /summary widgets over the selected cube cells: kpi, monthly_ts, breakdown_ts,
+    by_customer, by_site, top_products, plus the selected row count (record_count).
+    """
+    # Rows without a parseable "date" carry month_id 0 and fall outside any range.
+    # Every filter is a cube dimension, so all KPIs roll up the selected cube cells.
+    cube = aggregate_cube(table)
+    cells = cube.cells
+    cell_idx = _summary_selection(cells, start_id, end_id, customer, product_group, size, flavor,
+                                  mechgroup, has_promotion)
+
+    def total(measure: str) -> float:
+        return float(cells.num(measure)[cell_idx].sum())
+
+    # Aggregation
+    count_rows = int(total("rows"))
+    total_actual_agg = total("actual")
+    total_planned_agg = total("planned")
+    sum_abs_diff = total("abs_err")
+    sum_diff = total("err")
+
+    # Split Volume Risks
+    total_under_vol = total("under_vol")  # Shortfall (Planned > Actual)
+    total_over_vol = total("over_vol")    # Excess (Actual > Planned)
+
+    # Promo days fall back to 1.0 per promo row when 0 or missing (Daily granularity assumption)
+    promo_rows_count = int(total("promo_rows"))
+    sum_discount = total("discount_sum")
+    sum_promo_days = total("promo_days_sum")
+
+    cust_col = table.cat("Customer", default="Unknown")
+    pg_col = table.cat("Product_Group", default="Unknown")
+    fl_col = table.cat("Flavor", default="Unknown")
+    sz_col = table.cat("Size", default="Unknown")
+
+    # Monthly / customer / product totals (groups in first-seen row order)
+    (months,), (month_actual,) = cube.rollup(cell_idx, ["month_id"], ["actual"])
+    monthly_agg = {(m // 100, m % 100): a for m, a in zip(months.tolist(), month_actual.tolist())}
+
+    (cust_codes,), (cust_actual,) = cube.rollup(cell_idx, ["Customer"], ["actual"])
+    cust_agg = dict(zip(cust_codes.tolist(), cust_actual.tolist()))   # customer code -> actual
+
+    (pg_c, fl_c, sz_c), (p_actual,) = cube.rollup(cell_idx, ["Product_Group", "Flavor", "Size"], ["actual"])
+    product_agg = dict(zip(zip(pg_c.tolist(), fl_c.tolist(), sz_c.tolist()), p_actual.tolist()))   # (group, flavor, size) codes -> actual
+
+    # Monthly Promo Stats: (year, month) -> {discount_sum, pdays_sum, count}, months with promo rows only
+    (p_months,), (p_count, p_disc, p_days) = cube.rollup(
+        cell_idx, ["month_id"], ["promo_rows", "discount_sum", "promo_days_sum"])
+    monthly_promo_stats = {
+        (m // 100, m % 100): {"discount_sum": d, "pdays_sum": pd, "count": int(c)}
+        for m, c, d, pd in zip(p_months.tolist(), p_count.tolist(), p_disc.tolist(), p_days.tolist()) if c > 0
+    }
+
+    # Masked names per dictionary code (shared across requests on this snapshot)
+    cust_names = masker.labels("customer", cust_col)
+    pg_names = masker.labels("product_group", pg_col)
+    fl_names = masker.labels("flavor", fl_col)
+    sz_names = masker.labels("size", sz_col)
+
+    # Breakdown Logic: (breakdown_val, year, month) -> qty, one masked label per distinct code
+    breakdown_agg = {}
+    breakdown_dims = {"product_group": ["Product_Group"], "flavor": ["Flavor"], "size": ["Flavor", "Size"]}.get(breakdown)
+    if breakdown_dims:
+        (*codes, b_months), (b_actual,) = cube.rollup(cell_idx, breakdown_dims + ["month_id"], ["actual"])
+        labels = {}
+        for key, m, a in zip(zip(*(c.tolist() for c in codes)), b_months.tolist(), b_actual.tolist()):
+            if key not in labels:
+                if breakdown == 'product_group':
+                    labels[key] = pg_names[key[0]]
+                elif breakdown == 'flavor':
+                    labels[key] = fl_names[key[0]] or "Other"
+                else:
+                    fl, sz = fl_col.categories[key[0]].strip(), sz_col.categories[key[1]].strip()
+                    masked_fl = fl_names[key[0]] if fl else ""
+                    masked_sz = sz_names[key[1]] if sz else ""
+                    labels[key] = f"{masked_fl} {masked_sz}" if masked_fl and sz else "Other"
+            b_key = labels[key]
+            if b_key:
+                breakdown_agg[(b_key, m // 100, m % 100)] = breakdown_agg.get((b_key, m // 100, m % 100), 0.0) + a
+
+    # KPI Calc
+    promo_coverage = (promo_rows_count / count_rows * 100) if count_rows > 0 else 0.0
+    avg_disc = (sum_discount / promo_rows_count) if promo_rows_count > 0 else 0.0
+    
+    wape = (sum_abs_diff / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
+    bias = (sum_diff / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
+    under_plan_rate = (total_under_vol / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
+    over_plan_rate = (total_over_vol / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
+    
+    # New KPIs
+    target_achieved = ((total_actual_agg - total_planned_agg) / total_planned_agg * 100) if total_planned_agg > 0 else 0.0
+    avg_promo_days = (sum_promo_days / promo_rows_count) if promo_rows_count > 0 else 0.0
+    total_active_items = len(product_agg)
+
+    # Global Summary (Overview uses total_actual_agg as total_qty)
+    # Calculate MoM
+    ts_list = [
+        MonthlyTSPoint(year=y, month=m, qty=q) 
+        for (y, m), q in monthly_agg.items()
+    ]
+    ts_list.sort(key=lambda x: x.year * 100 + x.month)
+
+    # Calculate MoM for Promo Metrics
+    avg_discount_pct_change = 0.0
+    avg_promo_days_change = 0.0
+    
+    # Sort monthly stats keys
+    sorted_promo_months = sorted(monthly_promo_stats.keys(), key=lambda x: x[0]*100 + x[1])
+    if len(sorted_promo_months) >= 2:
+        curr_key = sorted_promo_months[-1]
+        prev_key = sorted_promo_months[-2]
+        
+        curr_stats = monthly_promo_stats[curr_key]
+        prev_stats = monthly_promo_stats[prev_key]
+        
+        curr_avg_disc = curr_stats["discount_sum"] / curr_stats["count"] if curr_stats["count"] > 0 else 0
+        prev_avg_disc = prev_stats["discount_sum"] / prev_stats["count"] if prev_stats["count"] > 0 else 0
+        
+        curr_avg_pdays = curr_stats["pdays_sum"] / curr_stats["count"] if curr_stats["count"] > 0 else 0
+        prev_avg_pdays = prev_stats["pdays_sum"] / prev_stats["count"] if prev_stats["count"] > 0 else 0
+        
+        # Discount Change (Relative %)
+        if prev_avg_disc > 0:
+            avg_discount_pct_change = ((curr_avg_disc - prev_avg_disc) / prev_avg_disc) * 100
+            
+        # Promo Days Change (Absolute Days)
+        avg_promo_days_change = curr_avg_pdays - prev_avg_pdays
+
+    
+    # Construct Breakdown List
+    breakdown_list = []
+    if breakdown and breakdown_agg:
+        # Group by label first
+        label_groups = {}
+        for (label, y, m), qty in breakdown_agg.items():
+            if label not in label_groups:
+                label_groups[label] = []
+            label_groups[label].append(MonthlyTSPoint(year=y, month=m, qty=qty))
+        
+        from ..schemas.dashboard_v2 import TimeSeriesPoint
+        
+        for label, points in label_groups.items():
+            points.sort(key=lambda x: x.year * 100 + x.month)
+            breakdown_list.append(TimeSeriesPoint(label=label, data=points))
+
+    mom_growth = 0.0
+    if len(ts_list) >= 2:
+        latest = ts_list[-1].qty
+        previous = ts_list[-2].qty
+        if previous > 0:
+            mom_growth = ((latest - previous) / previous) * 100
+            
+    kpi_obj = KPI(
+        total_qty=total_actual_agg,
+        mom_growth=mom_growth,
+        promo_coverage=promo_coverage,
+        avg_discount_pct=avg_disc,
+        total_actual=total_actual_agg,
+        total_planned=total_planned_agg,
+        wape=wape,
+        bias=bias,
+        under_plan_volume=total_under_vol,
+        under_plan_rate=under_plan_rate,
+        over_plan_volume=total_over_vol,
+        over_plan_rate=over_plan_rate,
+        # New Fields
+        total_active_items=total_active_items,
+        avg_promo_days=avg_promo_days,
+        target_achievement_rate=target_achieved,
+        
+        # Change Metrics
+        avg_discount_pct_change=avg_discount_pct_change,
+        avg_promo_days_change=avg_promo_days_change
+    )
+    
+    # Group Lists (masked)
+    cust_list = [GroupByPoint(label=cust_names[k], qty=v) for k, v in cust_agg.items()]
+    cust_list.sort(key=lambda x: x.qty, reverse=True)
+    cust_list = cust_list[:20]
+
+    site_list = [] # No site data
+
+    prod_list = []
+    for (pg, fl, sz), q in product_agg.items():
+        prod_list.append(TopProductPoint(product_group=pg_names[pg], flavor=fl_names[fl], size=sz_names[sz], qty=q))
+    prod_list.sort(key=lambda x: x.qty, reverse=True)
+    prod_list = prod_list[:10]
+
+    return {
+        "kpi": kpi_obj,
+        "monthly_ts": ts_list,
+        "breakdown_ts": breakdown_list if breakdown else None,
+        "by_customer": cust_list,
+        "by_site": site_list,
+        "top_products": prod_list,
+        "record_count": count_rows,
+    }
+
+
 @router.get("/summary", response_model=APIResponse[DashboardSummaryResponse])
+@offloaded(prefetch=settings.DATASET_ANALYTICS_DASHBOARD)
 def get_analytics_summary(
     year_from: Optional[int] = None,
     month_from: Optional[int] = None,
@@ -110,52 +313,26 @@ def get_analytics_summary(
     mechgroup: Optional[List[str]] = Query(None),
     has_promotion: Optional[int] = None,
     breakdown: Optional[str] = None,
+    format: str = "objects",  # see WIRE_FORMATS
 ):
+    if format not in WIRE_FORMATS:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"format must be one of {', '.join(WIRE_FORMATS)}",
+        })
     try:
-        # Unmask incoming filter params
-        if customer: customer = [masker.unmask("customer", v) for v in customer]
-        if product_group: product_group = [masker.unmask("product_group", v) for v in product_group]
-        if flavor: flavor = [masker.unmask("flavor", v) for v in flavor]
-        if size: size = [masker.unmask("size", v) for v in size]
-        if mechgroup: mechgroup = [masker.unmask("mechgroup", v) for v in mechgroup]
-
-        rows = get_cached_dataset(settings.DATASET_ANALYTICS_DASHBOARD)
-
-        # Helper for loose column matching
-        def get_val_idx(row, keys):
-            for k in keys:
-                if k in row: return row[k]
-                # Case insensitive check
-                for rk in row.keys():
-                    if rk.lower() == k.lower(): return row[rk]
-            return None
-
-        import os
-        log_path = os.path.join(os.getcwd(), "backend_debug.txt")
-        
-        if rows and len(rows) > 0:
-            try:
-                with open(log_path, "w") as f:
-                    f.write(f"DEBUG DATASET: {settings.DATASET_ANALYTICS_DASHBOARD}\n")
-                    f.write(f"DEBUG COLUMNS: {list(rows[0].keys())}\n")
-                    
-                    # Check for promo related keys
-                    first_row = rows[0]
-                    f.write(f"DEBUG FIRST ROW: {first_row}\n")
-                    
-                    p_day = get_val_idx(first_row, ["Promo_Days", "promo_days", "duration"])
-                    disc = get_val_idx(first_row, ["discount_pct", "discount", "usage"])
-                    has_promo = get_val_idx(first_row, ["has_promotion", "is_promo"])
-                    
-                    f.write(f"Resolved Promo_Days: {p_day}\n")
-                    f.write(f"Resolved discount_pct: {disc}\n")
-                    f.write(f"Resolved has_promotion: {has_promo}\n")
+        # Unmask and normalize incoming filter params once
+        customer = masker.compile("customer", customer)
+        product_group = masker.compile("product_group", product_group)
+        flavor = masker.compile("flavor", flavor)
+        size = masker.compile("size", size)
+        mechgroup = masker.compile("mechgroup", mechgroup)
 
-            except Exception as e:
-                print(f"Failed to write debug log: {e}")
+        snapshot = dataset_cache.get(settings.DATASET_ANALYTICS_DASHBOARD)
+        table = snapshot.table
 
+        promo_col = table.find_column(["has_promotion", "is_promo"])
 
-        
         # Date Logic
         current_year = datetime.now().year
         current_month = datetime.now().month
@@ -170,536 +347,247 @@ def get_analytics_summary(
             
         start_id = year_from * 100 + (month_from or 1)
         end_id = year_to * 100 + (month_to or 12)
-        
-        filtered_rows = []
-        
-        for row in rows:
-            try:
-                # Parse "date" column
-                date_val = row.get("date")
-                if not date_val:
-                    continue
-                
-                r_year, r_month = 0, 0
-                
-                if isinstance(date_val, datetime):
-                    r_year = date_val.year
-                    r_month = date_val.month
-                else:
-                    # Handle string formats: "2023-01-28T00:00:00" or "2023-01-28 00:00:00"
-                    s_val = str(date_val).replace('T', ' ').split(' ')[0]
-                    try:
-                        dt = datetime.strptime(s_val, "%Y-%m-%d")
-                        r_year = dt.year
-                        r_month = dt.month
-                    except ValueError:
-                        continue
-
-                month_id = r_year * 100 + r_month
-                
-                if not (start_id <= month_id <= end_id):
-                    continue
-                
-                if row.get("Product_Group") == "Canned Fruit": continue
-                
-                if customer and not masker.match_in("customer", row.get("Customer", ""), customer): continue
-                if product_group and not masker.match_in("product_group", row.get("Product_Group", ""), product_group): continue
-                if size and not masker.match_in("size", str(row.get("Size", "")), size): continue
-                if flavor and not masker.match_in("flavor", row.get("Flavor", ""), flavor): continue
-                if mechgroup and not masker.match_in("mechgroup", row.get("MechGroup", ""), mechgroup): continue
-
-                if has_promotion is not None:
-                    r_promo = int(float(row.get("has_promotion", 0)))
-                    if r_promo != has_promotion: continue
-
-                # Enrich row with parsed date for aggregation
-                row["_year"] = r_year
-                row["_month"] = r_month
-                filtered_rows.append(row)
-                
-            except Exception:
-                continue
-        
-        # Aggregation
-        total_actual_agg = 0.0
-        total_planned_agg = 0.0
-        sum_abs_diff = 0.0
-        sum_diff = 0.0
-        
-        # Split Volume Risks
-        total_under_vol = 0.0 # Shortfall (Planned > Actual)
-        total_over_vol = 0.0  # Excess (Actual > Planned)
-        
-        promo_rows_count = 0
-        sum_discount = 0.0
-        sum_promo_days = 0.0
-        active_items_set = set()
-        
-        # Breakdown Logic
-        breakdown_agg = {} # (breakdown_val, year, month) -> qty
-        monthly_promo_stats = {} # (year, month) -> {discount_sum, pdays_sum, count}
-        monthly_agg = {}
-        cust_agg = {}
-        product_agg = {}
-
-        for row in filtered_rows:
-            # Map columns
-            # Actual_sale might be string
-            actual = float(row.get("Actual_sale") or 0)
-            planned = float(row.get("Planed_sales_from_start") or 0)
-            
-            # is_promo = int(float(row.get("has_promotion", 0))) == 1
-            # Secure handling of has_promotion
-            raw_promo = get_val_idx(row, ["has_promotion", "is_promo"])
-            is_promo = False
-            if raw_promo:
-                try:
-                    is_promo = int(float(raw_promo)) == 1
-                except:
-                    is_promo = str(raw_promo).lower() in ['true', '1', 'yes']
-
-            # disc = float(row.get("discount_pct") or 0)
-            raw_disc = get_val_idx(row, ["discount_pct", "discount"])
-            disc = float(raw_disc or 0)
-            
-            total_actual_agg += actual
-            total_planned_agg += planned
-            
-            diff = actual - planned
-            sum_abs_diff += abs(diff)
-            sum_diff += diff
-            
-            if diff > 0:
-                total_over_vol += diff
-            elif diff < 0:
-                total_under_vol += abs(diff)
-            
-            p_key = (str(row.get("Product_Group")), str(row.get("Flavor")), str(row.get("Size")))
-            active_items_set.add(p_key)
-            
-            # Monthly
-            y, m = row["_year"], row["_month"]
-            monthly_agg[(y, m)] = monthly_agg.get((y, m), 0.0) + actual
-
-            if is_promo:
-                promo_rows_count += 1
-                sum_discount += disc
-                # Try to get Promo_Days, default to 0 if missing. Only count if is_promo is true
-                raw_pdays = get_val_idx(row, ["promotion_dt", "Promo_Days", "promo_days", "duration", "promotion_days"])
-                p_days = 0.0
-                if raw_pdays is not None:
-                     try:
-                         p_days = float(raw_pdays)
-                     except:
-                         p_days = 0.0
-                
-                # If explicitly 0 or None, fallback to 1.0 (Daily granularity assumption)
-                if p_days <= 0:
-                     p_days = 1.0
-                
-                sum_promo_days += p_days
-                
-                # Monthly Promo Stats Aggregation
-                k_m = (y, m)
-                if k_m not in monthly_promo_stats:
-                    monthly_promo_stats[k_m] = {"discount_sum": 0.0, "pdays_sum": 0.0, "count": 0}
-                monthly_promo_stats[k_m]["discount_sum"] += disc
-                monthly_promo_stats[k_m]["pdays_sum"] += p_days
-                monthly_promo_stats[k_m]["count"] += 1
-                
-            
-            # Breakdown Aggregation
-            if breakdown:
-                b_key = None
-                if breakdown == 'product_group':
-                    b_key = masker.mask("product_group", row.get("Product_Group", "Other"))
-                elif breakdown == 'flavor':
-                    val = row.get("Flavor", "Other")
-                    b_key = masker.mask("flavor", val) if val else "Other"
-                elif breakdown == 'size':
-                    sz = str(row.get("Size", "Other")).strip()
-                    fl = str(row.get("Flavor", "")).strip()
-                    masked_fl = masker.mask("flavor", fl) if fl else ""
-                    masked_sz = masker.mask("size", sz)
-                    b_key = f"{masked_fl} {masked_sz}" if masked_fl and sz else "Other"
-                
-                if b_key:
-                    breakdown_agg[(b_key, y, m)] = breakdown_agg.get((b_key, y, m), 0.0) + actual
-            
-            # Customer
-            c = row.get("Customer", "Unknown")
-            cust_agg[c] = cust_agg.get(c, 0.0) + actual
-            
-            # Product
-            pg = row.get("Product_Group", "Unknown")
-            fl = row.get("Flavor", "Unknown")
-            sz = str(row.get("Size", "Unknown"))
-            p_key = (pg, fl, sz)
-            product_agg[p_key] = product_agg.get(p_key, 0.0) + actual
-
-        # KPI Calc
-        count_rows = len(filtered_rows)
-        promo_coverage = (promo_rows_count / count_rows * 100) if count_rows > 0 else 0.0
-        avg_disc = (sum_discount / promo_rows_count) if promo_rows_count > 0 else 0.0
-        
-        wape = (sum_abs_diff / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
-        bias = (sum_diff / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
-        under_plan_rate = (total_under_vol / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
-        over_plan_rate = (total_over_vol / total_actual_agg * 100) if total_actual_agg > 0 else 0.0
-        
-        # New KPIs
-        target_achieved = ((total_actual_agg - total_planned_agg) / total_planned_agg * 100) if total_planned_agg > 0 else 0.0
-        avg_promo_days = (sum_promo_days / promo_rows_count) if promo_rows_count > 0 else 0.0
-        total_active_items = len(active_items_set)
-
-        # Global Summary (Overview uses total_actual_agg as total_qty)
-        # Calculate MoM
-        ts_list = [
-            MonthlyTSPoint(year=y, month=m, qty=q) 
-            for (y, m), q in monthly_agg.items()
-        ]
-        ts_list.sort(key=lambda x: x.year * 100 + x.month)
-
-        # Calculate MoM for Promo Metrics
-        avg_discount_pct_change = 0.0
-        avg_promo_days_change = 0.0
-        
-        # Sort monthly stats keys
-        sorted_promo_months = sorted(monthly_promo_stats.keys(), key=lambda x: x[0]*100 + x[1])
-        if len(sorted_promo_months) >= 2:
-            curr_key = sorted_promo_months[-1]
-            prev_key = sorted_promo_months[-2]
-            
-            curr_stats = monthly_promo_stats[curr_key]
-            prev_stats = monthly_promo_stats[prev_key]
-            
-            curr_avg_disc = curr_stats["discount_sum"] / curr_stats["count"] if curr_stats["count"] > 0 else 0
-            prev_avg_disc = prev_stats["discount_sum"] / prev_stats["count"] if prev_stats["count"] > 0 else 0
-            
-            curr_avg_pdays = curr_stats["pdays_sum"] / curr_stats["count"] if curr_stats["count"] > 0 else 0
-            prev_avg_pdays = prev_stats["pdays_sum"] / prev_stats["count"] if prev_stats["count"] > 0 else 0
-            
-            # Discount Change (Relative %)
-            if prev_avg_disc > 0:
-                avg_discount_pct_change = ((curr_avg_disc - prev_avg_disc) / prev_avg_disc) * 100
-                
-            # Promo Days Change (Absolute Days)
-            avg_promo_days_change = curr_avg_pdays - prev_avg_pdays
 
-        
-        # Construct Breakdown List
-        breakdown_list = []
-        if breakdown and breakdown_agg:
-            # Group by label first
-            label_groups = {}
-            for (label, y, m), qty in breakdown_agg.items():
-                if label not in label_groups:
-                    label_groups[label] = []
-                label_groups[label].append(MonthlyTSPoint(year=y, month=m, qty=qty))
-            
-            from ..schemas.dashboard_v2 import TimeSeriesPoint
-            
-            for label, points in label_groups.items():
-                points.sort(key=lambda x: x.year * 100 + x.month)
-                breakdown_list.append(TimeSeriesPoint(label=label, data=points))
-
-        mom_growth = 0.0
-        if len(ts_list) >= 2:
-            latest = ts_list[-1].qty
-            previous = ts_list[-2].qty
-            if previous > 0:
-                mom_growth = ((latest - previous) / previous) * 100
-                
-        kpi_obj = KPI(
-            total_qty=total_actual_agg,
-            mom_growth=mom_growth,
-            promo_coverage=promo_coverage,
-            avg_discount_pct=avg_disc,
-            total_actual=total_actual_agg,
-            total_planned=total_planned_agg,
-            wape=wape,
-            bias=bias,
-            under_plan_volume=total_under_vol,
-            under_plan_rate=under_plan_rate,
-            over_plan_volume=total_over_vol,
-            over_plan_rate=over_plan_rate,
-            # New Fields
-            total_active_items=total_active_items,
-            avg_promo_days=avg_promo_days,
-            target_achievement_rate=target_achieved,
-            
-            # Change Metrics
-            avg_discount_pct_change=avg_discount_pct_change,
-            avg_promo_days_change=avg_promo_days_change
+        # Repeat views of the same filters on the same snapshot are served from the result cache
+        cache_key = result_cache.key(
+            "analytics/summary", snapshot, start_id=start_id, end_id=end_id, customer=customer.normalized,
+            product_group=product_group.normalized, size=size.normalized, flavor=flavor.normalized,
+            mechgroup=mechgroup.normalized,
+            has_promotion=has_promotion, breakdown=breakdown, format=format,
         )
+        cached = result_cache.get(cache_key, snapshot)
+        if cached is not None:
+            return APIResponse(success=True, data=cached)
+
+        import os
+        log_path = os.path.join(os.getcwd(), "backend_debug.txt")
         
-        # Group Lists (masked)
-        cust_list = [GroupByPoint(label=masker.mask("customer", k), qty=v) for k, v in cust_agg.items()]
-        cust_list.sort(key=lambda x: x.qty, reverse=True)
-        cust_list = cust_list[:20]
-
-        site_list = [] # No site data
-
-        prod_list = []
-        for (pg, fl, sz), q in product_agg.items():
-            prod_list.append(TopProductPoint(product_group=masker.mask("product_group", pg), flavor=masker.mask("flavor", fl), size=masker.mask("size", sz), qty=q))
-        prod_list.sort(key=lambda x: x.qty, reverse=True)
-        prod_list = prod_list[:10]
+        if table.n_rows > 0:
+            try:
+                with open(log_path, "w") as f:
+                    f.write(f"DEBUG DATASET: {settings.DATASET_ANALYTICS_DASHBOARD}\n")
+                    f.write(f"DEBUG COLUMNS: {table.column_names}\n")
+                    
+                    # Check for promo related keys
+                    first_row = table.row(0)
+                    f.write(f"DEBUG FIRST ROW: {first_row}\n")
+                    
+                    f.write(f"Resolved Promo_Days: {first_row.get(table.find_column(['Promo_Days', 'promo_days', 'duration']))}\n")
+                    f.write(f"Resolved discount_pct: {first_row.get(table.find_column(['discount_pct', 'discount', 'usage']))}\n")
+                    f.write(f"Resolved has_promotion: {first_row.get(promo_col)}\n")
+
+            except Exception as e:
+                print(f"Failed to write debug log: {e}")
         
-        return APIResponse(
-            success=True,
-            data=DashboardSummaryResponse(
-                kpi=kpi_obj,
-                monthly_ts=ts_list,
-                breakdown_ts=breakdown_list if breakdown else None,
-                by_customer=cust_list,
-                by_site=site_list,
-                top_products=prod_list,
-                meta={
-                    "refreshed_at": datetime.now().isoformat(),
-                    "record_count": count_rows,
-                    "dataset": settings.DATASET_ANALYTICS_DASHBOARD,
-                    "debug_columns": list(rows[0].keys()) if rows else [],
-                    "debug_sample": str(rows[0]) if rows else "No Data",
-                    "debug_promo_check": {
-                        "p_days_sample": [r.get("Promo_Days") for r in rows[:5]] if rows else [],
-                        "disc_sample": [r.get("discount_pct") for r in rows[:5]] if rows else [],
-                        "has_promo_sample": [r.get("has_promotion") for r in rows[:5]] if rows else []
-                    }
+        widgets = _summary_widgets(table, start_id, end_id, customer, product_group, size, flavor,
+                                   mechgroup, has_promotion, breakdown)
+        if format == "columnar":
+            widgets = _columnar_time_series(widgets)
+        record_count = widgets.pop("record_count")
+        data = DashboardSummaryResponse(
+            **widgets,
+            meta={
+                "refreshed_at": datetime.now().isoformat(),
+                "record_count": record_count,
+                "dataset": settings.DATASET_ANALYTICS_DASHBOARD,
+                **snapshot.meta(),
+                "debug_columns": table.column_names,
+                "debug_sample": str(table.row(0)) if table.n_rows else "No Data",
+                "debug_promo_check": {
+                    "p_days_sample": table.head("Promo_Days"),
+                    "disc_sample": table.head("discount_pct"),
+                    "has_promo_sample": table.head("has_promotion")
                 }
-            )
+            }
         )
+        result_cache.put(cache_key, data)
+        return APIResponse(success=True, data=data)
     except Exception as e:
         logger.error(f"Analytics summary error: {e}", exc_info=True)
         return APIResponse(success=False, error={"code": "INTERNAL_ERROR", "message": str(e)})
 
-@router.get("/deep-dive", response_model=APIResponse[DeepDiveResponse])
-def get_deep_dive_analytics(
-    year_from: Optional[int] = None,
-    month_from: Optional[int] = None,
-    year_to: Optional[int] = None,
-    month_to: Optional[int] = None,
-    customer: Optional[List[str]] = Query(None),
-    product_group: Optional[List[str]] = Query(None),
-    size: Optional[List[str]] = Query(None),
-    flavor: Optional[List[str]] = Query(None),
-    mechgroup: Optional[List[str]] = Query(None),
-    has_promotion: Optional[int] = None,
-    breakdown: Optional[str] = None, # Added breakdown parameter
-):
-    try:
-        # Unmask incoming filter params
-        if customer: customer = [masker.unmask("customer", v) for v in customer]
-        if product_group: product_group = [masker.unmask("product_group", v) for v in product_group]
-        if flavor: flavor = [masker.unmask("flavor", v) for v in flavor]
-        if size: size = [masker.unmask("size", v) for v in size]
-        if mechgroup: mechgroup = [masker.unmask("mechgroup", v) for v in mechgroup]
+# Wire formats of heatmaps, monthly_ts and breakdown_ts: one object per point (default), or
+# parallel arrays plus label dictionaries (Columnar* schemas)
+WIRE_FORMATS = ("objects", "columnar")
+
+# Deep-dive widget groups; /deep-dive computes all of them, /batch only those requested
+DEEP_DIVE_WIDGETS = ("kpi", "heatmaps", "rankings", "scatter", "error_dist", "stability_trend", "sales_trend")
+
+
+def _deep_dive_selection(table, start_id: int, end_id: int, customer, product_group, size, flavor,
+                         mechgroup, has_promotion) -> np.ndarray:
+    """Rows of `table` matching the deep-dive filters (product_group also keeps "All" rows)."""
+    sel = table_index(table).select(start_id, end_id)
+
+    # Robust Filtering: match_in semantics (strip + case-insensitive) on dictionary codes
+    if product_group:
+        pg_col = table.cat("Product_Group")
+        sel.where_codes("Product_Group", np.union1d(product_group.codes(pg_col), pg_col.codes_for(["All"], exact=True)))
+    sel.match("Size", size)
+    sel.match("Flavor", flavor)
+    sel.match("MechGroup", mechgroup)
+    sel.match("Customer", customer)
+
+    sel.where_value("has_promotion", has_promotion)
+    return sel.rows()
+
+
+def _heatmap_points(cells: Dict[Any, Dict[str, float]]) -> List[AccuracyHeatmapPoint]:
+    # Built from computed floats and masked labels: model_construct skips re-validation
+    return [
+        AccuracyHeatmapPoint.model_construct(row=k[0], month=k[1],
+                           wape=(v["ae"] / v["a"] * 100 if v["a"] > 0 else 0.0),
+                           bias=(v["e"] / v["a"] * 100 if v["a"] > 0 else 0.0),
+                           actual=v["a"],
+                           planned=v["p"],
+                           error=v["e"])
+        for k, v in cells.items()
+    ]
+
+
+def _heatmap_columns(cells: Dict[Any, Dict[str, float]]) -> ColumnarHeatmap:
+    """format=columnar heatmap: the cells of _heatmap_points, in the same order, as parallel arrays."""
+    rows: Dict[str, int] = {}
+    months: Dict[str, int] = {}
+    row = [rows.setdefault(k[0], len(rows)) for k in cells]
+    month = [months.setdefault(k[1], len(months)) for k in cells]
+    sums = list(cells.values())
+    return ColumnarHeatmap.model_construct(
+        rows=list(rows), months=list(months), row=row, month=month,
+        wape=[v["ae"] / v["a"] * 100 if v["a"] > 0 else 0.0 for v in sums],
+        bias=[v["e"] / v["a"] * 100 if v["a"] > 0 else 0.0 for v in sums],
+        actual=[v["a"] for v in sums],
+        planned=[v["p"] for v in sums],
+        error=[v["e"] for v in sums],
+    )
+
+
+def _columnar_time_series(widgets: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary widgets with monthly_ts / breakdown_ts (when present) as parallel arrays."""
+    out = dict(widgets)
+    points = widgets.get("monthly_ts")
+    if points is not None:
+        out["monthly_ts"] = ColumnarMonthlyTS.model_construct(
+            year=[p.year for p in points], month=[p.month for p in points], qty=[p.qty for p in points])
+    series = widgets.get("breakdown_ts")
+    if series is not None:
+        out["breakdown_ts"] = ColumnarTimeSeries.model_construct(
+            labels=[ts.label for ts in series],
+            label=[i for i, ts in enumerate(series) for _ in ts.data],
+            year=[p.year for ts in series for p in ts.data],
+            month=[p.month for ts in series for p in ts.data],
+            qty=[p.qty for ts in series for p in ts.data],
+        )
+    return out
+
+
+def _deep_dive_widgets(table, idx: np.ndarray, breakdown: Optional[str], scatter_limit: int,
+                       scatter_strategy: str, scatter_seed: int,
+                       widgets=DEEP_DIVE_WIDGETS, format: str = "objects") -> Dict[str, Any]:
+    """
+    DeepDiveResponse fields of the requested `widgets` (DEEP_DIVE_WIDGETS) over the selected rows;
+    heatmaps are ColumnarHeatmap when `format` is "columnar".
+    """
+    cust_col = table.cat("Customer", default="Unknown")
+    pg_col = table.cat("Product_Group", default="Unknown")
+    fl_col = table.cat("Flavor", default="-")
+    sz_col = table.cat("Size", default="-")
+    mech_col = table.cat("MechGroup")
+
+    actual = table.num("Actual_sale")[idx]
+    planned = table.num("Planed_sales_from_start")[idx]
+    err = actual - planned
+    is_promo = np.trunc(table.num("has_promotion")[idx]) == 1
+    discount = table.num("discount_pct")[idx]
+    month_ids = table.month_id[idx]
+    m_labels = deep_dive.month_labels(month_ids)
+
+    # Masked names per dictionary code (shared across requests on this snapshot)
+    cust_names = masker.labels("customer", cust_col)
+    fl_names = masker.labels("flavor", fl_col)
+    sz_names = masker.labels("size", sz_col)
+    mech_names = masker.labels("mechgroup", mech_col)
+    cust_label = cust_names.__getitem__
+    # Dynamic Product Heatmap Key (masked)
+    if breakdown == 'flavor':
+        prod_codes = fl_col.codes[idx]
+        prod_label = lambda code: fl_names[code] or "Unknown"
+    else:
+        prod_codes = pg_col.codes[idx]
+        prod_label = masker.labels("product_group", pg_col).__getitem__
+
+    out: Dict[str, Any] = {}
+
+    # Aggregations (grouped over codes; Python work per distinct cell)
+    if "heatmaps" in widgets:
+        hm_cust = deep_dive.accuracy_cells(cust_col.codes[idx], cust_label, month_ids, m_labels, actual, planned, err)   # (customer, month_str) -> {a, p, ae, e}
+        hm_prod = deep_dive.accuracy_cells(prod_codes, prod_label, month_ids, m_labels, actual, planned, err)   # (product_group, month_str) -> {a, p, ae, e}
+        heatmap = _heatmap_columns if format == "columnar" else _heatmap_points
+        out["heatmap_customer"] = heatmap(hm_cust)
+        out["heatmap_product"] = heatmap(hm_prod)
+
+    if "error_dist" in widgets:
+        out["error_dist"] = [ErrorDistBin(bin=k, count=v) for k, v in deep_dive.error_histogram(err, planned)]
+
+    # Scatter: representative sample (promo-stratified, largest errors always kept)
+    if "scatter" in widgets:
+        out["scatter_data"] = [
+            ScatterPoint.model_construct(
+                planned=float(planned[pos]),
+                actual=float(actual[pos]),
+                is_promo=bool(is_promo[pos]),
+                label=f"{prod_label(int(prod_codes[pos]))} - {cust_label(int(cust_col.codes[idx[pos]]))}"
+            )
+            for pos in deep_dive.scatter_rows(err, is_promo, scatter_limit, scatter_strategy, scatter_seed).tolist()
+        ]
 
-        rows = get_cached_dataset(settings.DATASET_ANALYTICS_DASHBOARD)
+    # Rankings: pick the top rows by |error| first, then build items for those rows only
+    # (point and item fields are computed floats/bools/labels, so they skip re-validation)
+    def ranking_items(positions: np.ndarray) -> List[PerformanceRankingItem]:
+        rows = idx[positions]
+        items = []
+        for pos, row in zip(positions.tolist(), rows.tolist()):
+            customer = cust_label(int(cust_col.codes[row]))
+            flavor = fl_names[int(fl_col.codes[row])]
+            size = sz_names[int(sz_col.codes[row])]
+            err_v = float(err[pos])
+            items.append(PerformanceRankingItem.model_construct(
+                date=m_labels[int(month_ids[pos])],
+                customer=customer,
+                sku=f"{flavor} {size}",
+                product_group=prod_label(int(prod_codes[pos])),
+                flavor=flavor,
+                size=size,
+                planned=float(planned[pos]),
+                actual=float(actual[pos]),
+                error=err_v,
+                abs_error=abs(err_v),
+                under_over_volume=err_v,
+                has_promotion=bool(is_promo[pos]),
+                mech_group=mech_names[int(mech_col.codes[row])],
+                discount_pct=float(discount[pos])
+            ))
+        return items
 
-        # Filtering logic (same as summary)
-        current_year = datetime.now().year
-        current_month = datetime.now().month
-        if not year_to:
-            year_to = current_year
-            month_to = current_month
-        if not year_from:
-            year_from = year_to - 1 # Default to last 12 months for deep dive
-            month_from = month_to
-            
-        start_id = year_from * 100 + (month_from or 1)
-        end_id = year_to * 100 + (month_to or 12)
-        
-        filtered_rows = []
-        logger.info(f"Deep Dive Params: {year_from}-{month_from} to {year_to}-{month_to}")
-        logger.info(f"Total Rows in Dataset: {len(rows)}")
-        
-        error_count = 0
-        filtered_count = 0
-        MAX_LOG_ERRORS = 5
+    if "rankings" in widgets:
+        under_rows, over_rows = deep_dive.ranking_rows(err, deep_dive.RANKING_SIZE)
+        out["ranking_under_plan"] = ranking_items(under_rows)
+        out["ranking_over_plan"] = ranking_items(over_rows)
 
-        for i, row in enumerate(rows):
-            try:
-                # Optimized Date Parsing (Assumes ISO format or similar YYYY-MM-DD...)
-                date_val = row.get("date")
-                if not date_val: continue
-                
-                r_year, r_month = 0, 0
-                
-                if isinstance(date_val, datetime):
-                    r_year, r_month = date_val.year, date_val.month
-                else:
-                    s_val = str(date_val)
-                    # Fast path for standard "YYYY-MM-DD..." format
-                    if len(s_val) >= 7:
-                        try:
-                            # Direct slicing is much faster than strptime
-                            # "2023-01-28..." -> year=2023, month=01
-                            y_str = s_val[:4]
-                            m_str = s_val[5:7]
-                            
-                            if y_str.isdigit() and m_str.isdigit():
-                                r_year = int(y_str)
-                                r_month = int(m_str)
-                            else:
-                                # Fallback to slower parsing if format is weird
-                                s_clean = s_val.replace('T', ' ').split(' ')[0]
-                                dt = datetime.strptime(s_clean, "%Y-%m-%d")
-                                r_year, r_month = dt.year, dt.month
-                        except ValueError:
-                             continue
-                    else:
-                        continue
-
-                month_id = r_year * 100 + r_month
-                if not (start_id <= month_id <= end_id): 
-                    continue
-                
-                # Exclude Canned Fruit
-                # Robust Filtering: Handle potential whitespace mismatch
-                row_pg = row.get("Product_Group", "").strip()
-                row_flavor = row.get("Flavor", "").strip()
-                row_size = str(row.get("Size", "")).strip()
-                row_cust = row.get("Customer", "").strip()
-                row_mech = row.get("MechGroup", "").strip()
-
-                if product_group and row_pg != "All" and not masker.match_in("product_group", row_pg, product_group): continue
-                if size and not masker.match_in("size", row_size, size): continue
-                if flavor and not masker.match_in("flavor", row_flavor, flavor): continue
-                if mechgroup and not masker.match_in("mechgroup", row_mech, mechgroup): continue
-                if customer and not masker.match_in("customer", row_cust, customer): continue
-                
-                if has_promotion is not None:
-                    # Robust int/float conversion
-                    try:
-                         val = int(float(row.get("has_promotion", 0)))
-                         if val != has_promotion: continue
-                    except:
-                         continue
-                
-                row["_year"], row["_month"] = r_year, r_month
-                filtered_rows.append(row)
-                filtered_count += 1
-                
-                if i % 10000 == 0:
-                    logger.info(f"Processed {i} rows...")
-                    
-            except Exception as e:
-                 error_count += 1
-                 if error_count <= MAX_LOG_ERRORS:
-                     logger.error(f"Row error: {e}")
-                 continue
-        
-        logger.info(f"Deep Dive: Filtered {filtered_count} rows from {len(rows)}. Total errors: {error_count}")
-
-        # Aggregations
-        hm_cust = {} # (customer, month_str) -> {actual, planned, abs_err, err}
-        hm_prod = {} # (product_group, month_str) -> {actual, planned, abs_err, err}
-        monthly_stability = {} # (year, month) -> {actual, planned, abs_err, err}
-        scatter_data = []
-        error_bins = {
-            "< -30%": 0, "-30% to -20%": 0, "-20% to -10%": 0, "-10% to 0%": 0,
-            "0% to 10%": 0, "10% to 20%": 0, "20% to 30%": 0, "> 30%": 0
-        }
-        
-        total_actual = 0.0
-        total_planned = 0.0
-        total_abs_err = 0.0
-        total_err = 0.0
-        
-        total_under_vol = 0.0
-        total_over_vol = 0.0
-        
-        ranking_items = []
-        
-        for row in filtered_rows:
-            actual = float(row.get("Actual_sale") or 0)
-            planned = float(row.get("Planed_sales_from_start") or 0)
-            y, m = row["_year"], row["_month"]
-            m_str = f"{datetime(y, m, 1).strftime('%b %y')}"
-            
-            err = actual - planned
-            abs_err = abs(err)
-            
-            if err > 0:
-                total_over_vol += err
-            elif err < 0:
-                total_under_vol += abs(err)
-            
-            total_actual += actual
-            total_planned += planned
-            total_abs_err += abs_err
-            total_err += err
-            
-            # Heatmaps (masked)
-            c = masker.mask("customer", row.get("Customer", "Unknown"))
-
-            # Dynamic Product Heatmap Key (masked)
-            pg = "Unknown"
-            if breakdown == 'flavor':
-                 val = row.get("Flavor")
-                 pg = masker.mask("flavor", val) if val else "Unknown"
-            else:
-                 pg = masker.mask("product_group", row.get("Product_Group", "Unknown"))
-            
-            for key, val in [(hm_cust, c), (hm_prod, pg)]:
-                k = (val, m_str)
-                if k not in key: key[k] = {"a": 0.0, "p": 0.0, "ae": 0.0, "e": 0.0}
-                key[k]["a"] += actual
-                key[k]["p"] += planned
-                key[k]["ae"] += abs_err
-                key[k]["e"] += err
-                
-            # Stability
-            k_m = (y, m)
-            if k_m not in monthly_stability: monthly_stability[k_m] = {"a": 0.0, "p": 0.0, "ae": 0.0, "e": 0.0}
-            monthly_stability[k_m]["a"] += actual
-            monthly_stability[k_m]["p"] += planned
-            monthly_stability[k_m]["ae"] += abs_err
-            monthly_stability[k_m]["e"] += err
-            
-            # Scatter
-            scatter_data.append(ScatterPoint(
-                planned=planned,
-                actual=actual,
-                is_promo=int(float(row.get("has_promotion", 0))) == 1,
-                label=f"{pg} - {c}"
-            ))
-            
-            # Error Dist
-            err_pct = (err / planned * 100) if planned > 0 else 0.0
-            if err_pct < -30: error_bins["< -30%"] += 1
-            elif err_pct < -20: error_bins["-30% to -20%"] += 1
-            elif err_pct < -10: error_bins["-20% to -10%"] += 1
-            elif err_pct < 0: error_bins["-10% to 0%"] += 1
-            elif err_pct < 10: error_bins["0% to 10%"] += 1
-            elif err_pct < 20: error_bins["10% to 20%"] += 1
-            elif err_pct < 30: error_bins["20% to 30%"] += 1
-            else: error_bins["> 30%"] += 1
-            
-            # Ranking Item (masked)
-            ranking_items.append(PerformanceRankingItem(
-                date=m_str,
-                customer=c,
-                sku=f"{masker.mask('flavor', row.get('Flavor', '-'))} {masker.mask('size', str(row.get('Size', '-')))}",
-                product_group=pg,
-                flavor=masker.mask("flavor", row.get("Flavor", "-")),
-                size=masker.mask("size", str(row.get("Size", "-"))),
-                planned=planned,
-                actual=actual,
-                error=err,
-                abs_error=abs_err,
-                under_over_volume=err,
-                has_promotion=int(float(row.get("has_promotion", 0))) == 1,
-                mech_group=masker.mask("mechgroup", row.get("MechGroup", "")),
-                discount_pct=float(row.get("discount_pct") or 0)
-            ))
+    if "kpi" in widgets:
+        total_actual = float(actual.sum())
+        total_planned = float(planned.sum())
+        total_abs_err = float(np.abs(err).sum())
+        total_err = float(err.sum())
+
+        total_under_vol = float(-err[err < 0].sum())
+        total_over_vol = float(err[err > 0].sum())
 
         # Finalize KPIs
         wape = (total_abs_err / total_actual * 100) if total_actual > 0 else 0.0
         bias = (total_err / total_actual * 100) if total_actual > 0 else 0.0
         
-        kpi_obj = KPI(
+        out["kpi"] = KPI(
             total_qty=total_actual,
             mom_growth=0.0, # Not calculated for deep dive summary
             promo_coverage=0.0,
@@ -720,42 +608,16 @@ def get_deep_dive_analytics(
             avg_promo_days=0.0,
             target_achievement_rate=((total_actual - total_planned) / total_planned * 100) if total_planned > 0 else 0.0
         )
-        
-        # Format Heatmaps
-        # Format Heatmaps
-        heatmap_cust_list = [
-            AccuracyHeatmapPoint(row=k[0], month=k[1], 
-                               wape=(v["ae"] / v["a"] * 100 if v["a"] > 0 else 0), 
-                               bias=(v["e"] / v["a"] * 100 if v["a"] > 0 else 0),
-                               actual=v["a"],
-                               planned=v["p"],
-                               error=v["e"])
-            for k, v in hm_cust.items()
-        ]
-        heatmap_prod_list = [
-            AccuracyHeatmapPoint(row=k[0], month=k[1], 
-                               wape=(v["ae"] / v["a"] * 100 if v["a"] > 0 else 0), 
-                               bias=(v["e"] / v["a"] * 100 if v["a"] > 0 else 0),
-                               actual=v["a"],
-                               planned=v["p"],
-                               error=v["e"])
-            for k, v in hm_prod.items()
-        ]
-        
-        # Sort Rankings
-        ranking_items.sort(key=lambda x: x.abs_error, reverse=True)
-        under_plan = [x for x in ranking_items if x.error > 0][:50]
-        over_plan = [x for x in ranking_items if x.error < 0][:50]
-        
-        # Format Trend (Stability & Sales vs Plan)
+
+    # Format Trend (Stability & Sales vs Plan)
+    if "stability_trend" in widgets or "sales_trend" in widgets:
+        monthly_stability = deep_dive.monthly_accuracy(month_ids, actual, planned, err)   # (year, month) -> {a, p, ae, e}
         trend_pts = []
         bias_pts = []
         actual_pts = []
         planned_pts = []
         
-        sorted_m = sorted(monthly_stability.keys())
-        for y, m in sorted_m:
-            v = monthly_stability[(y, m)]
+        for (y, m), v in monthly_stability.items():
             w = (v["ae"] / v["a"] * 100 if v["a"] > 0 else 0)
             b = (v["e"] / v["a"] * 100 if v["a"] > 0 else 0)
             
@@ -763,32 +625,220 @@ def get_deep_dive_analytics(
             bias_pts.append(MonthlyTSPoint(year=y, month=m, qty=b))
             actual_pts.append(MonthlyTSPoint(year=y, month=m, qty=v["a"]))
             planned_pts.append(MonthlyTSPoint(year=y, month=m, qty=v["p"]))
+
+        if "stability_trend" in widgets:
+            out["stability_trend"] = [
+                TimeSeriesPoint(label="WAPE", data=trend_pts),
+                TimeSeriesPoint(label="Bias", data=bias_pts)
+            ]
+        if "sales_trend" in widgets:
+            out["sales_trend"] = [
+                TimeSeriesPoint(label="Actual Sales", data=actual_pts),
+                TimeSeriesPoint(label="Planned Sales", data=planned_pts)
+            ]
+    return out
+
+
+@router.get("/deep-dive", response_model=APIResponse[DeepDiveResponse])
+@offloaded(prefetch=settings.DATASET_ANALYTICS_DASHBOARD)
+def get_deep_dive_analytics(
+    year_from: Optional[int] = None,
+    month_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    month_to: Optional[int] = None,
+    customer: Optional[List[str]] = Query(None),
+    product_group: Optional[List[str]] = Query(None),
+    size: Optional[List[str]] = Query(None),
+    flavor: Optional[List[str]] = Query(None),
+    mechgroup: Optional[List[str]] = Query(None),
+    has_promotion: Optional[int] = None,
+    breakdown: Optional[str] = None, # Added breakdown parameter
+    scatter_limit: int = Query(500, ge=0, le=5000),
+    scatter_strategy: str = "stratified",  # see deep_dive.SCATTER_STRATEGIES
+    scatter_seed: int = 0,
+    format: str = "objects",  # see WIRE_FORMATS
+):
+    if scatter_strategy not in deep_dive.SCATTER_STRATEGIES:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"scatter_strategy must be one of {', '.join(deep_dive.SCATTER_STRATEGIES)}",
+        })
+    if format not in WIRE_FORMATS:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"format must be one of {', '.join(WIRE_FORMATS)}",
+        })
+    try:
+        # Unmask and normalize incoming filter params once
+        customer = masker.compile("customer", customer)
+        product_group = masker.compile("product_group", product_group)
+        flavor = masker.compile("flavor", flavor)
+        size = masker.compile("size", size)
+        mechgroup = masker.compile("mechgroup", mechgroup)
+
+        snapshot = dataset_cache.get(settings.DATASET_ANALYTICS_DASHBOARD)
+        table = snapshot.table
+
+        # Filtering logic (same as summary)
+        current_year = datetime.now().year
+        current_month = datetime.now().month
+        if not year_to:
+            year_to = current_year
+            month_to = current_month
+        if not year_from:
+            year_from = year_to - 1 # Default to last 12 months for deep dive
+            month_from = month_to
             
-        stability_trend = [
-            TimeSeriesPoint(label="WAPE", data=trend_pts),
-            TimeSeriesPoint(label="Bias", data=bias_pts)
-        ]
-        
-        sales_trend = [
-            TimeSeriesPoint(label="Actual Sales", data=actual_pts),
-            TimeSeriesPoint(label="Planned Sales", data=planned_pts)
-        ]
+        start_id = year_from * 100 + (month_from or 1)
+        end_id = year_to * 100 + (month_to or 12)
         
-        return APIResponse(
-            success=True,
-            data=DeepDiveResponse(
-                kpi=kpi_obj,
-                heatmap_customer=heatmap_cust_list,
-                heatmap_product=heatmap_prod_list,
-                ranking_under_plan=under_plan,
-                ranking_over_plan=over_plan,
-                scatter_data=scatter_data[:500], # Limit scatter points
-                error_dist=[ErrorDistBin(bin=k, count=v) for k, v in error_bins.items()],
-                stability_trend=stability_trend,
-                sales_trend=sales_trend,
-                meta={"refreshed_at": datetime.now().isoformat(), "record_count": len(filtered_rows)}
-            )
+        logger.info(f"Deep Dive Params: {year_from}-{month_from} to {year_to}-{month_to}")
+        logger.info(f"Total Rows in Dataset: {table.n_rows}")
+
+        cache_key = result_cache.key(
+            "analytics/deep-dive", snapshot, start_id=start_id, end_id=end_id, customer=customer.normalized,
+            product_group=product_group.normalized, size=size.normalized, flavor=flavor.normalized,
+            mechgroup=mechgroup.normalized,
+            has_promotion=has_promotion, breakdown=breakdown, scatter_limit=scatter_limit,
+            scatter_strategy=scatter_strategy, scatter_seed=scatter_seed, format=format,
         )
+        cached = result_cache.get(cache_key, snapshot)
+        if cached is not None:
+            return APIResponse(success=True, data=cached)
+
+        idx = _deep_dive_selection(table, start_id, end_id, customer, product_group, size, flavor,
+                                   mechgroup, has_promotion)
+        logger.info(f"Deep Dive: Filtered {len(idx)} rows from {table.n_rows}")
+
+        data = DeepDiveResponse(
+            **_deep_dive_widgets(table, idx, breakdown, scatter_limit, scatter_strategy, scatter_seed,
+                                 format=format),
+            meta={"refreshed_at": datetime.now().isoformat(), "record_count": len(idx), **snapshot.meta()}
+        )
+        result_cache.put(cache_key, data)
+        return APIResponse(success=True, data=data)
     except Exception as e:
         logger.error(f"Deep dive error: {e}", exc_info=True)
         return APIResponse(success=False, error={"code": "INTERNAL_ERROR", "message": str(e)})
+
+
+# Widgets of /batch: /summary ones roll up the cube, /deep-dive ones share one row selection
+SUMMARY_WIDGETS = ("kpi", "monthly_ts", "breakdown_ts", "by_customer", "top_products")
+BATCH_WIDGETS = SUMMARY_WIDGETS + tuple(w for w in DEEP_DIVE_WIDGETS if w != "kpi") + ("filter_options",)
+
+
+def _period_ids(year_from: Optional[int], month_from: Optional[int], year_to: Optional[int],
+                month_to: Optional[int], years_back: int) -> Tuple[int, int]:
+    """(start_id, end_id) with the endpoints' defaults: up to now, `years_back` years when year_from is omitted."""
+    if not year_to:
+        year_to = datetime.now().year
+        month_to = datetime.now().month
+    if not year_from:
+        year_from = year_to - years_back
+        month_from = month_to
+    return year_from * 100 + (month_from or 1), year_to * 100 + (month_to or 12)
+
+
+@router.post("/batch", response_model=APIResponse[AnalyticsBatchResponse])
+@offloaded(prefetch=settings.DATASET_ANALYTICS_DASHBOARD)
+def get_analytics_batch(request: AnalyticsBatchRequest):
+    """
+    Several widgets of one page for one filter set. Each selection is computed once and
+    shared: the cube cells for the /summary widgets (kpi is the summary KPI), the rows for
+    the /deep-dive widgets, the co-occurrence index for filter_options. Widgets match their
+    single-endpoint counterparts for the same filters, including their default date ranges
+    (/summary: two years, /deep-dive: one year, when year_from is omitted).
+    """
+    widgets = set(request.widgets)
+    unknown = sorted(widgets.difference(BATCH_WIDGETS))
+    if unknown or not widgets:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"widgets must be a non-empty subset of {', '.join(BATCH_WIDGETS)}; got {unknown or 'none'}",
+        })
+    if request.scatter_strategy not in deep_dive.SCATTER_STRATEGIES:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"scatter_strategy must be one of {', '.join(deep_dive.SCATTER_STRATEGIES)}",
+        })
+    if request.format not in WIRE_FORMATS:
+        return APIResponse(success=False, error={
+            "code": "INVALID_PARAMETER",
+            "message": f"format must be one of {', '.join(WIRE_FORMATS)}",
+        })
+    try:
+        # Unmask and normalize incoming filter params once
+        customer = masker.compile("customer", request.customer)
+        product_group = masker.compile("product_group", request.product_group)
+        flavor = masker.compile("flavor", request.flavor)
+        size = masker.compile("size", request.size)
+        mechgroup = masker.compile("mechgroup", request.mechgroup)
+        has_promotion, breakdown = request.has_promotion, request.breakdown
+
+        snapshot = dataset_cache.get(settings.DATASET_ANALYTICS_DASHBOARD)
+        table = snapshot.table
+
+        # Date Logic (as /summary and /deep-dive respectively)
+        period = (request.year_from, request.month_from, request.year_to, request.month_to)
+        start_id, end_id = _period_ids(*period, years_back=2)
+        deep_start_id, deep_end_id = _period_ids(*period, years_back=1)
+
+        cache_key = result_cache.key(
+            "analytics/batch", snapshot, start_id=start_id, end_id=end_id, deep_start_id=deep_start_id,
+            customer=customer.normalized,
+            product_group=product_group.normalized, size=size.normalized, flavor=flavor.normalized,
+            mechgroup=mechgroup.normalized,
+            has_promotion=has_promotion, breakdown=breakdown, scatter_limit=request.scatter_limit,
+            scatter_strategy=request.scatter_strategy, scatter_seed=request.scatter_seed, format=request.format,
+            widgets=sorted(widgets),
+        )
+        cached = result_cache.get(cache_key, snapshot)
+        if cached is not None:
+            return APIResponse(success=True, data=cached)
+
+        out: Dict[str, Any] = {}
+        meta: Dict[str, Any] = {}
+        if widgets.intersection(SUMMARY_WIDGETS):
+            summary = _summary_widgets(table, start_id, end_id, customer, product_group, size, flavor,
+                                       mechgroup, has_promotion, breakdown)
+            if request.format == "columnar":
+                summary = _columnar_time_series(summary)
+            meta["record_count"] = summary["record_count"]
+            out.update({w: summary[w] for w in SUMMARY_WIDGETS if w in widgets})
+
+        deep_widgets = [w for w in DEEP_DIVE_WIDGETS if w in widgets and w != "kpi"]
+        if deep_widgets:
+            idx = _deep_dive_selection(table, deep_start_id, deep_end_id, customer, product_group, size, flavor,
+                                       mechgroup, has_promotion)
+            meta["deep_dive_record_count"] = len(idx)
+            out.update(_deep_dive_widgets(table, idx, breakdown, request.scatter_limit,
+                                          request.scatter_strategy, request.scatter_seed, widgets=deep_widgets,
+                                          format=request.format))
+
+        if "filter_options" in widgets:
+            opts = filter_options(table).options(
+                {"Product_Group": product_group.values, "Flavor": flavor.values, "Size": size.values,
+                 "Customer": customer.values},
+                exact=["Size"],
+                exclude={"Product_Group": ["Canned Fruit"]},
+                columns=["Product_Group", "Flavor", "Size", "Customer", "MechGroup"],
+            )
+            out["filter_options"] = FilterOptionsResponse(
+                product_groups=opts["Product_Group"],
+                flavors=opts["Flavor"],
+                sizes=opts["Size"],
+                customers=opts["Customer"],
+                sites=[],
+                mechgroups=opts["MechGroup"]
+            )
+
+        data = AnalyticsBatchResponse(
+            **out,
+            meta={"refreshed_at": datetime.now().isoformat(), **meta,
+                  "dataset": settings.DATASET_ANALYTICS_DASHBOARD, **snapshot.meta()}
+        )
+        result_cache.put(cache_key, data)
+        return APIResponse(success=True, data=data)
+    except Exception as e:
+        logger.error(f"Analytics batch error: {e}", exc_info=True)
+        return APIResponse(success=False, error={"code": "INTERNAL_ERROR", "message": str(e)})
@@ -3,6 +3,8 @@ from typing import List, Dict, Any, Optional
 import logging
 from datetime import datetime
 
+import numpy as np
+
 from ..schemas.common import APIResponse
 from ..schemas.dashboard_v2 import (
     DashboardSummaryResponse, 
@@ -13,33 +15,22 @@ from ..schemas.dashboard_v2 import (
     TopProductPoint,
     FilterOptionsResponse
 )
-from ..services.dataiku_service import dataiku_service
 from ..services.data_masking import masker
+from ..services.dataset_cache import dataset_cache
+from ..services.columnar import group_sum
+from ..services.table_index import table_index
+from ..services.olap_cube import aggregate_cube
+from ..services.filter_options import filter_options
+from ..services.result_cache import result_cache
+from ..services.worker_pools import offloaded
 from ..config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# In-memory cache for dashboard data (simple implementation)
-DATA_CACHE = {}
-CACHE_TTL = 300 # 5 minutes
-
-def get_cached_dataset(dataset_name: str):
-    now = datetime.now().timestamp()
-    if dataset_name in DATA_CACHE:
-        cached = DATA_CACHE[dataset_name]
-        if now - cached["timestamp"] < CACHE_TTL:
-            logger.info(f"Using cached data for {dataset_name}")
-            return cached["data"]
-    
-    # Fetch fresh data
-    logger.info(f"Fetching fresh data for {dataset_name}")
-    rows = dataiku_service.get_dataset_rows(dataset_name)
-    DATA_CACHE[dataset_name] = {"timestamp": now, "data": rows}
-    return rows
-
 @router.get("/filters", response_model=APIResponse[FilterOptionsResponse])
-async def get_dashboard_filters(
+@offloaded(prefetch=settings.DATASET_DASHBOARD_SUMMARY)
+def get_dashboard_filters(
     product_group: Optional[str] = None,
     flavor: Optional[str] = None,
     size: Optional[str] = None,
@@ -54,41 +45,25 @@ async def get_dashboard_filters(
         if flavor: flavor = masker.unmask("flavor", flavor)
         if customer: customer = masker.unmask("customer", customer)
 
-        rows = get_cached_dataset(settings.DATASET_DASHBOARD_SUMMARY)
-
-        product_groups = set()
-        flavors = set()
-        sizes = set()
-        customers = set()
-        sites = set()
-        mechgroups = set()
-
-        for row in rows:
-            # Apply cascading filters (case-insensitive via masker)
-            if product_group and not masker.match("product_group", row.get("Product_Group", ""), product_group): continue
-            if flavor and not masker.match("flavor", row.get("Flavor", ""), flavor): continue
-            if size and str(row.get("Size")) != str(size): continue
-            if customer and not masker.match("customer", row.get("Customer", ""), customer): continue
+        snapshot = dataset_cache.get(settings.DATASET_DASHBOARD_SUMMARY)
+        table = snapshot.table
 
-            # Collect options
-            if val := row.get("Product_Group"):
-                if val != "Canned Fruit":
-                    product_groups.add(val)
-            if val := row.get("Flavor"): flavors.add(val)
-            if val := row.get("Size"): sizes.add(str(val))
-            if val := row.get("Customer"): customers.add(val)
-            if val := row.get("site_name_public"): sites.add(val)
-            if val := row.get("MechGroup"): mechgroups.add(val)
+        # Cascading options come from the snapshot's co-occurrence index (memoized per selection)
+        opts = filter_options(table).options(
+            {"Product_Group": product_group, "Flavor": flavor, "Size": size and str(size), "Customer": customer},
+            exact=["Size"],
+            hide={"Product_Group": ["Canned Fruit"]},
+        )
 
         return APIResponse(
             success=True,
             data=FilterOptionsResponse(
-                product_groups=sorted([masker.mask("product_group", v) for v in product_groups]),
-                flavors=sorted([masker.mask("flavor", v) for v in flavors]),
-                sizes=sorted([masker.mask("size", v) for v in sizes]),
-                customers=sorted([masker.mask("customer", v) for v in customers]),
-                sites=sorted([masker.mask("site", v) for v in sites]),
-                mechgroups=sorted([masker.mask("mechgroup", v) for v in mechgroups])
+                product_groups=opts["Product_Group"],
+                flavors=opts["Flavor"],
+                sizes=opts["Size"],
+                customers=opts["Customer"],
+                sites=opts["site_name_public"],
+                mechgroups=opts["MechGroup"]
             )
         )
     except Exception as e:
@@ -99,6 +74,7 @@ async def get_dashboard_filters(
         )
 
 @router.get("/summary", response_model=APIResponse[DashboardSummaryResponse])
+@offloaded(prefetch=settings.DATASET_DASHBOARD_SUMMARY)
 def get_dashboard_summary(
     year_from: Optional[int] = None,
     month_from: Optional[int] = None,
@@ -113,16 +89,17 @@ def get_dashboard_summary(
     has_promotion: Optional[int] = None,
 ):
     try:
-        # 0. Unmask incoming filter params
-        if customer: customer = [masker.unmask("customer", v) for v in customer]
-        if product_group: product_group = [masker.unmask("product_group", v) for v in product_group]
-        if flavor: flavor = [masker.unmask("flavor", v) for v in flavor]
-        if site: site = [masker.unmask("site", v) for v in site]
-        if size: size = [masker.unmask("size", v) for v in size]
-        if mechgroup: mechgroup = [masker.unmask("mechgroup", v) for v in mechgroup]
+        # 0. Unmask and normalize incoming filter params once
+        customer = masker.compile("customer", customer)
+        product_group = masker.compile("product_group", product_group)
+        flavor = masker.compile("flavor", flavor)
+        site = masker.compile("site", site)
+        size = masker.compile("size", size)
+        mechgroup = masker.compile("mechgroup", mechgroup)
 
         # 1. Read Data (Cached)
-        rows = get_cached_dataset(settings.DATASET_DASHBOARD_SUMMARY)
+        snapshot = dataset_cache.get(settings.DATASET_DASHBOARD_SUMMARY)
+        table = snapshot.table
 
         # 2. Prepare Filter Logic
         current_year = datetime.now().year
@@ -139,77 +116,61 @@ def get_dashboard_summary(
         start_id = year_from * 100 + (month_from or 1)
         end_id = year_to * 100 + (month_to or 12)
 
-        filtered_rows = []
-
-        # 3. Apply Filters
-        for row in rows:
-            try:
-                # Exclude Canned Fruit
-                if row.get("Product_Group") == "Canned Fruit":
-                    continue
-
-                # Parse date (Legacy format: Billing_Date_year, Billing_Date_month)
-                r_year = int(row.get("Billing_Date_year", 0))
-                r_month = int(row.get("Billing_Date_month", 0))
-                month_id = r_year * 100 + r_month
-
-                if not (start_id <= month_id <= end_id): continue
-
-                if customer and not masker.match_in("customer", row.get("Customer", ""), customer): continue
-                if site and not masker.match_in("site", row.get("site_name_public", ""), site): continue
-                if product_group and not masker.match_in("product_group", row.get("Product_Group", ""), product_group): continue
-                if size and not masker.match_in("size", str(row.get("Size", "")), size): continue
-                if flavor and not masker.match_in("flavor", row.get("Flavor", ""), flavor): continue
-                if mechgroup and not masker.match_in("mechgroup", row.get("MechGroup", ""), mechgroup): continue
-                
-                if has_promotion is not None:
-                    r_promo = int(row.get("has_promotion", 0))
-                    if r_promo != has_promotion: continue
-                
-                filtered_rows.append(row)
-                
-            except Exception:
-                continue
-        
-        # 4. Aggregation
-        total_qty = 0.0
-        promo_rows_count = 0
-        sum_discount_pct_on_promo = 0.0
-        count_rows = len(filtered_rows)
-        
-        monthly_agg = {}   # (year, month) -> qty
-        cust_agg = {}      # customer -> qty
-        site_agg = {}      # site -> qty
-        product_agg = {}   # (group, flavor, size) -> qty
-        
-        for row in filtered_rows:
-            qty = float(row.get("Quantity_sum", 0))
-            is_promo = int(row.get("has_promotion", 0)) == 1
-            disc = float(row.get("discount_pct", 0))
-            
-            total_qty += qty
-            if is_promo:
-                promo_rows_count += 1
-                sum_discount_pct_on_promo += disc
-            
-            # Monthly TS
-            y, m = int(row.get("Billing_Date_year")), int(row.get("Billing_Date_month"))
-            monthly_agg[(y, m)] = monthly_agg.get((y, m), 0.0) + qty
-            
-            # By Customer
-            c = row.get("Customer", "Unknown")
-            cust_agg[c] = cust_agg.get(c, 0.0) + qty
-            
-            # By Site
-            s = row.get("site_name_public", "Unknown")
-            site_agg[s] = site_agg.get(s, 0.0) + qty
-            
-            # Top Products
-            pg = row.get("Product_Group", "Unknown")
-            fl = row.get("Flavor", "Unknown")
-            sz = str(row.get("Size", "Unknown"))
-            p_key = (pg, fl, sz)
-            product_agg[p_key] = product_agg.get(p_key, 0.0) + qty
+        # Repeat views of the same filters on the same snapshot are served from the result cache
+        cache_key = result_cache.key(
+            "dashboard/summary", snapshot, start_id=start_id, end_id=end_id, customer=customer.normalized,
+            site=site.normalized, product_group=product_group.normalized, size=size.normalized,
+            flavor=flavor.normalized, mechgroup=mechgroup.normalized, has_promotion=has_promotion,
+        )
+        cached = result_cache.get(cache_key, snapshot)
+        if cached is not None:
+            return APIResponse(success=True, data=cached)
+
+        # 3. Apply Filters (to the snapshot's aggregate cube: every filter is a cube dimension)
+        cells = aggregate_cube(table).cells
+        sel = table_index(cells).select(start_id, end_id)
+        sel.exclude("Product_Group", ["Canned Fruit"])  # Exclude Canned Fruit
+
+        sel.match("Customer", customer)
+        sel.match("site_name_public", site)
+        sel.match("Product_Group", product_group)
+        sel.match("Size", size)
+        sel.match("Flavor", flavor)
+        sel.match("MechGroup", mechgroup)
+
+        sel.where_value("has_promotion", has_promotion)
+
+        idx = sel.rows()
+
+        # 4. Aggregation (roll up the selected cells)
+        qty = cells.num("qty")[idx]
+
+        count_rows = int(cells.num("rows")[idx].sum())
+        total_qty = float(qty.sum())
+        promo_rows_count = int(cells.num("promo_rows")[idx].sum())
+        sum_discount_pct_on_promo = float(cells.num("discount_sum")[idx].sum())
+
+        months, month_inv = np.unique(cells.month_id[idx], return_inverse=True)
+        month_qty = np.bincount(month_inv, weights=qty, minlength=len(months))
+        monthly_agg = {(m // 100, m % 100): q for m, q in zip(months.tolist(), month_qty.tolist())}   # (year, month) -> qty
+
+        cust_col = cells.cat("Customer", default="Unknown")
+        (cust_codes,), (cust_qty,), _ = group_sum([cust_col.codes[idx]], [len(cust_col.categories)], qty)
+        cust_agg = dict(zip(cust_codes.tolist(), cust_qty.tolist()))   # customer code -> qty
+
+        site_col = cells.cat("site_name_public", default="Unknown")
+        (site_codes,), (site_qty,), _ = group_sum([site_col.codes[idx]], [len(site_col.categories)], qty)
+        site_agg = dict(zip(site_codes.tolist(), site_qty.tolist()))   # site code -> qty
+
+        pg_col = cells.cat("Product_Group", default="Unknown")
+        fl_col = cells.cat("Flavor", default="Unknown")
+        sz_col = cells.cat("Size", default="Unknown")
+        (pg_c, fl_c, sz_c), (p_qty,), _ = group_sum(
+            [pg_col.codes[idx], fl_col.codes[idx], sz_col.codes[idx]],
+            [len(pg_col.categories), len(fl_col.categories), len(sz_col.categories)],
+            qty,
+        )
+        product_agg = dict(zip(zip(pg_c.tolist(), fl_c.tolist(), sz_c.tolist()), p_qty.tolist()))   # (group, flavor, size) codes -> qty
 
         # 5. Construct Response Objects
         ts_list = [
@@ -248,34 +209,41 @@ def get_dashboard_summary(
             target_achievement_rate=0.0
         )
         
-        cust_list = [GroupByPoint(label=masker.mask("customer", k), qty=v) for k, v in cust_agg.items()]
+        # Masked names per dictionary code (shared across requests on this snapshot)
+        cust_names = masker.labels("customer", cust_col)
+        site_names = masker.labels("site", site_col)
+        pg_names = masker.labels("product_group", pg_col)
+        fl_names = masker.labels("flavor", fl_col)
+        sz_names = masker.labels("size", sz_col)
+
+        cust_list = [GroupByPoint(label=cust_names[k], qty=v) for k, v in cust_agg.items()]
         cust_list.sort(key=lambda x: x.qty, reverse=True)
         cust_list = cust_list[:20]
 
-        site_list = [GroupByPoint(label=masker.mask("site", k), qty=v) for k, v in site_agg.items()]
+        site_list = [GroupByPoint(label=site_names[k], qty=v) for k, v in site_agg.items()]
         site_list.sort(key=lambda x: x.qty, reverse=True)
 
         prod_list = []
         for (pg, fl, sz), q in product_agg.items():
-            prod_list.append(TopProductPoint(product_group=masker.mask("product_group", pg), flavor=masker.mask("flavor", fl), size=masker.mask("size", sz), qty=q))
+            prod_list.append(TopProductPoint(product_group=pg_names[pg], flavor=fl_names[fl], size=sz_names[sz], qty=q))
         prod_list.sort(key=lambda x: x.qty, reverse=True)
         prod_list = prod_list[:10]
         
-        return APIResponse(
-            success=True,
-            data=DashboardSummaryResponse(
-                kpi=kpi_obj,
-                monthly_ts=ts_list,
-                by_customer=cust_list,
-                by_site=site_list,
-                top_products=prod_list,
-                meta={
-                    "refreshed_at": datetime.now().isoformat(),
-                    "record_count": count_rows,
-                    "dataset": settings.DATASET_DASHBOARD_SUMMARY
-                }
-            )
+        data = DashboardSummaryResponse(
+            kpi=kpi_obj,
+            monthly_ts=ts_list,
+            by_customer=cust_list,
+            by_site=site_list,
+            top_products=prod_list,
+            meta={
+                "refreshed_at": datetime.now().isoformat(),
+                "record_count": count_rows,
+                "dataset": settings.DATASET_DASHBOARD_SUMMARY,
+                **snapshot.meta()
+            }
         )
+        result_cache.put(cache_key, data)
+        return APIResponse(success=True, data=data)
         
     except Exception as e:
         logger.error(f"Dashboard summary error: {e}", exc_info=True)
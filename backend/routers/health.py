@@ -1,6 +1,9 @@
 
 from fastapi import APIRouter
 from ..schemas.common import APIResponse
+from ..services.dataset_cache import dataset_cache
+from ..services.result_cache import result_cache
+from ..services import worker_pools
 
 router = APIRouter()
 
@@ -8,3 +11,15 @@ router = APIRouter()
 async def health_check():
     """Health check endpoint."""
     return APIResponse(success=True, data={"status": "ok", "version": "1.0.0"})
+
+
+@router.get("/cache", response_model=APIResponse[dict])
+async def cache_stats():
+    """Dataset and result cache hit/miss/eviction counters and resident memory."""
+    return APIResponse(success=True, data={**dataset_cache.stats(), "result_cache": result_cache.stats()})
+
+
+@router.get("/pools", response_model=APIResponse[dict])
+async def pool_stats():
+    """Compute and fetch pool concurrency limits, queue depth and task counters."""
+    return APIResponse(success=True, data=worker_pools.stats())
@@ -1,5 +1,7 @@
 from typing import Generic, TypeVar, Optional, Any
+from fastapi.responses import Response
 from pydantic import BaseModel
+from pydantic_core import to_json
 from datetime import datetime
 
 T = TypeVar("T")
@@ -18,3 +20,18 @@ class APIResponse(BaseModel, Generic[T]):
     data: Optional[T] = None
     meta: Meta = Meta()
     error: Optional[ErrorDetail] = None
+
+class ModelJSONResponse(Response):
+    """
+    JSON response for an already-built model (e.g. APIResponse), encoded in one pass by
+    pydantic-core. Returning it skips FastAPI's response_model re-validation and
+    jsonable_encoder; the body is the same JSON. The model stays available as `.model`.
+    """
+    media_type = "application/json"
+
+    def __init__(self, model: BaseModel, **kwargs: Any):
+        self.model = model
+        super().__init__(model, **kwargs)
+
+    def render(self, content: BaseModel) -> bytes:
+        return to_json(content)
@@ -1,5 +1,5 @@
 from typing import List, Optional, Union, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class DashboardFilters(BaseModel):
     year_from: Optional[int] = None
@@ -59,10 +59,23 @@ class TimeSeriesPoint(BaseModel):
     label: str
     data: List[MonthlyTSPoint]
 
+# format=columnar: parallel arrays instead of one object per point (point i = element i of each array)
+class ColumnarMonthlyTS(BaseModel):
+    year: List[int]
+    month: List[int]
+    qty: List[float]
+
+class ColumnarTimeSeries(BaseModel):
+    labels: List[str]  # label dictionary
+    label: List[int]   # index into labels, per point
+    year: List[int]
+    month: List[int]
+    qty: List[float]
+
 class DashboardSummaryResponse(BaseModel):
     kpi: KPI
-    monthly_ts: List[MonthlyTSPoint]
-    breakdown_ts: Optional[List[TimeSeriesPoint]] = None
+    monthly_ts: Union[List[MonthlyTSPoint], ColumnarMonthlyTS]
+    breakdown_ts: Optional[Union[List[TimeSeriesPoint], ColumnarTimeSeries]] = None
     by_customer: List[GroupByPoint]
     by_site: List[GroupByPoint]
     top_products: List[TopProductPoint]
@@ -84,6 +97,18 @@ class AccuracyHeatmapPoint(BaseModel):
     planned: float
     error: float
 
+class ColumnarHeatmap(BaseModel):
+    # format=columnar: cell i is (rows[row[i]], months[month[i]])
+    rows: List[str]
+    months: List[str]
+    row: List[int]
+    month: List[int]
+    wape: List[float]
+    bias: List[float]
+    actual: List[float]
+    planned: List[float]
+    error: List[float]
+
 class PerformanceRankingItem(BaseModel):
     date: str
     customer: str
@@ -112,8 +137,8 @@ class ErrorDistBin(BaseModel):
 
 class DeepDiveResponse(BaseModel):
     kpi: KPI
-    heatmap_customer: List[AccuracyHeatmapPoint]
-    heatmap_product: List[AccuracyHeatmapPoint]
+    heatmap_customer: Union[List[AccuracyHeatmapPoint], ColumnarHeatmap]
+    heatmap_product: Union[List[AccuracyHeatmapPoint], ColumnarHeatmap]
     ranking_under_plan: List[PerformanceRankingItem]
     ranking_over_plan: List[PerformanceRankingItem]
     scatter_data: List[ScatterPoint]
@@ -121,3 +146,40 @@ class DeepDiveResponse(BaseModel):
     stability_trend: List[TimeSeriesPoint]
     sales_trend: List[TimeSeriesPoint]
     meta: Dict[str, Any]
+
+class AnalyticsBatchRequest(BaseModel):
+    year_from: Optional[int] = None
+    month_from: Optional[int] = None
+    year_to: Optional[int] = None
+    month_to: Optional[int] = None
+    customer: Optional[List[str]] = None
+    product_group: Optional[List[str]] = None
+    size: Optional[List[str]] = None
+    flavor: Optional[List[str]] = None
+    mechgroup: Optional[List[str]] = None
+    has_promotion: Optional[int] = None
+    breakdown: Optional[str] = None
+    scatter_limit: int = Field(500, ge=0, le=5000)
+    scatter_strategy: str = "stratified"
+    scatter_seed: int = 0
+    format: str = "objects"  # "objects" | "columnar" (heatmaps, monthly_ts, breakdown_ts)
+    widgets: List[str]  # kpi, monthly_ts, breakdown_ts, by_customer, top_products, heatmaps, rankings,
+                        # scatter, error_dist, stability_trend, sales_trend, filter_options
+
+class AnalyticsBatchResponse(BaseModel):
+    # Only the requested widgets are set
+    kpi: Optional[KPI] = None
+    monthly_ts: Optional[Union[List[MonthlyTSPoint], ColumnarMonthlyTS]] = None
+    breakdown_ts: Optional[Union[List[TimeSeriesPoint], ColumnarTimeSeries]] = None
+    by_customer: Optional[List[GroupByPoint]] = None
+    top_products: Optional[List[TopProductPoint]] = None
+    heatmap_customer: Optional[Union[List[AccuracyHeatmapPoint], ColumnarHeatmap]] = None
+    heatmap_product: Optional[Union[List[AccuracyHeatmapPoint], ColumnarHeatmap]] = None
+    ranking_under_plan: Optional[List[PerformanceRankingItem]] = None
+    ranking_over_plan: Optional[List[PerformanceRankingItem]] = None
+    scatter_data: Optional[List[ScatterPoint]] = None
+    error_dist: Optional[List[ErrorDistBin]] = None
+    stability_trend: Optional[List[TimeSeriesPoint]] = None
+    sales_trend: Optional[List[TimeSeriesPoint]] = None
+    filter_options: Optional[FilterOptionsResponse] = None
+    meta: Dict[str, Any]
@@ -142,41 +142,49 @@ class AgentTools:
         ── นี่คือ tool ที่ Agent เรียกเมื่อต้องการ "ดูข้อมูล" ──
         """
         try:
-            from ..services.dataiku_service import dataiku_service
+            import numpy as np
+            from ..services.dataset_cache import dataset_cache
+            from ..services.columnar import group_sum
+            from ..services.data_masking import masker
+
+            table = dataset_cache.get(settings.DATASET_DASHBOARD_SUMMARY).table
 
-            rows = dataiku_service.get_dataset_rows(settings.DATASET_DASHBOARD_SUMMARY)
+            # Aggregate (Canned Fruit excluded)
+            idx = np.flatnonzero(~table.mask_in("Product_Group", ["Canned Fruit"], exact=True))
+            qty = table.num("Quantity_sum")[idx]
+            total_qty = float(qty.sum())
 
-            # Aggregate
-            total_qty = 0.0
+            # Monthly
             monthly_agg = {}
+            months, month_inv = np.unique(table.month_id[idx], return_inverse=True)
+            for month_id, q in zip(months.tolist(), np.bincount(month_inv, weights=qty, minlength=len(months)).tolist()):
+                y, m = month_id // 100, month_id % 100
+                if y and m:
+                    monthly_agg[f"{y}-{m:02d}"] = q
+
+            # Customer (masked)
             cust_agg = {}
+            cust_col = table.cat("Customer", default="Unknown")
+            cust_names = masker.labels("customer", cust_col)
+            (codes,), (sums,), _ = group_sum([cust_col.codes[idx]], [len(cust_col.categories)], qty)
+            for code, q in zip(codes.tolist(), sums.tolist()):
+                c = cust_names[code]
+                cust_agg[c] = cust_agg.get(c, 0) + q
+
+            # Product (masked)
             product_agg = {}
-
-            for row in rows:
-                if row.get("Product_Group") == "Canned Fruit":
-                    continue
-
-                qty = float(row.get("Quantity_sum", 0))
-                total_qty += qty
-
-                # Monthly
-                y = int(row.get("Billing_Date_year", 0))
-                m = int(row.get("Billing_Date_month", 0))
-                if y and m:
-                    key = f"{y}-{m:02d}"
-                    monthly_agg[key] = monthly_agg.get(key, 0) + qty
-
-                # Customer (masked)
-                from ..services.data_masking import masker
-                c = masker.mask("customer", row.get("Customer", "Unknown"))
-                cust_agg[c] = cust_agg.get(c, 0) + qty
-
-                # Product (masked)
-                pg = masker.mask("product_group", row.get("Product_Group", ""))
-                fl = masker.mask("flavor", row.get("Flavor", ""))
-                sz = masker.mask("size", str(row.get("Size", "")))
+            pg_col, fl_col, sz_col = table.cat("Product_Group"), table.cat("Flavor"), table.cat("Size")
+            (pg_c, fl_c, sz_c), (sums,), _ = group_sum(
+                [pg_col.codes[idx], fl_col.codes[idx], sz_col.codes[idx]],
+                [len(pg_col.categories), len(fl_col.categories), len(sz_col.categories)],
+                qty,
+            )
+            pg_names, fl_names, sz_names = (masker.labels("product_group", pg_col), masker.labels("flavor", fl_col),
+                                            masker.labels("size", sz_col))
+            for a, b, c, q in zip(pg_c.tolist(), fl_c.tolist(), sz_c.tolist(), sums.tolist()):
+                pg, fl, sz = pg_names[a], fl_names[b], sz_names[c]
                 p_key = f"{fl} {sz} ({pg})"
-                product_agg[p_key] = product_agg.get(p_key, 0) + qty
+                product_agg[p_key] = product_agg.get(p_key, 0) + q
 
             # Sort and top N
             top_products = sorted(product_agg.items(), key=lambda x: x[1], reverse=True)[:10]
@@ -304,17 +312,25 @@ class AgentTools:
     def get_product_list(self, params: dict) -> dict:
         """ดึงรายการสินค้าทั้งหมด"""
         try:
-            from ..services.dataiku_service import dataiku_service
-            rows = dataiku_service.get_dataset_rows(settings.DATASET_DASHBOARD_SUMMARY)
-
+            import numpy as np
+            from ..services.dataset_cache import dataset_cache
+            from ..services.columnar import group_sum
             from ..services.data_masking import masker
+
+            table = dataset_cache.get(settings.DATASET_DASHBOARD_SUMMARY).table
+
+            idx = np.flatnonzero(~table.mask_in("Product_Group", ["Canned Fruit"], exact=True))
+            pg_col, fl_col, sz_col = table.cat("Product_Group"), table.cat("Flavor"), table.cat("Size")
+            (pg_c, fl_c, sz_c), _, _ = group_sum(
+                [pg_col.codes[idx], fl_col.codes[idx], sz_col.codes[idx]],
+                [len(pg_col.categories), len(fl_col.categories), len(sz_col.categories)],
+            )
+
+            pg_names, fl_names = masker.labels("product_group", pg_col), masker.labels("flavor", fl_col)
             products = set()
-            for row in rows:
-                if row.get("Product_Group") == "Canned Fruit":
-                    continue
-                pg = masker.mask("product_group", row.get("Product_Group", ""))
-                fl = masker.mask("flavor", row.get("Flavor", ""))
-                sz = str(row.get("Size", ""))
+            for a, b, c in zip(pg_c.tolist(), fl_c.tolist(), sz_c.tolist()):
+                pg, fl = pg_names[a], fl_names[b]
+                sz = sz_col.categories[c]
                 if fl:
                     products.add(f"{fl} {sz} ({pg})")
 
@@ -326,15 +342,18 @@ class AgentTools:
     def get_customer_list(self, params: dict) -> dict:
         """ดึงรายการลูกค้าทั้งหมด"""
         try:
-            from ..services.dataiku_service import dataiku_service
-            rows = dataiku_service.get_dataset_rows(settings.DATASET_DASHBOARD_SUMMARY)
-
+            import numpy as np
+            from ..services.dataset_cache import dataset_cache
             from ..services.data_masking import masker
+
+            table = dataset_cache.get(settings.DATASET_DASHBOARD_SUMMARY).table
+
             customers = set()
-            for row in rows:
-                c = row.get("Customer", "")
-                if c:
-                    customers.add(masker.mask("customer", c))
+            cust_col = table.cat("Customer")
+            cust_names = masker.labels("customer", cust_col)
+            for code in np.unique(cust_col.codes).tolist():
+                if cust_col.categories[code]:
+                    customers.add(cust_names[code])
 
             return {"status": "success", "customers": sorted(list(customers)), "count": len(customers)}
         except Exception as e:
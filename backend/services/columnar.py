@@ -0,0 +1,531 @@
+"""
+Columnar Table Engine
+=====================
+Keeps a Dataiku dataset in memory as one typed NumPy array per column
+instead of one Python dict per row.
+
+- Numeric columns      -> float64 arrays (missing / empty -> 0.0)
+- Categorical columns  -> int32 codes + dictionary of distinct values
+- month_id             -> int32 YYYYMM, derived from `date` or Billing_Date_year/month,
+                          plus int16 `year` / int8 `month` views of it (0 = undated)
+
+Rows are stably sorted by month_id when a table is built, so a month range is a
+contiguous slice found by binary search (month_range) instead of a per-row
+date parse or comparison.
+
+Tables are built incrementally from fixed-size RecordBatches (see
+DataikuService.iter_dataset_batches), so only one batch of Python objects
+is alive at a time during a refresh.
+
+Usage:
+    from ..services.columnar import ColumnarTable, TableBuilder
+
+    builder = TableBuilder("join_data_cl_fill_prepared", column_names)
+    for batch in dataiku_service.iter_dataset_batches("join_data_cl_fill_prepared"):
+        builder.add_batch(batch)
+    table = builder.build()
+
+    rows = table_index(table).select(202301, 202412).where("Customer", ["Lotus"]).rows()
+    total = table.num("Actual_sale")[rows].sum()
+
+Incremental refresh builds only the re-fetched rows against the previous
+snapshot (TableBuilder(..., template=table)) so dictionary codes line up, then
+splices them in with table.with_months_replaced(delta, from_month_id).
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Always dictionary-encoded, even when values look numeric (e.g. Size "200")
+CATEGORICAL_COLUMNS = ("Customer", "Product_Group", "Flavor", "Size", "MechGroup", "site_name_public", "date")
+
+# Router filter param -> dataset column
+FILTER_COLUMNS = {
+    "customer": "Customer",
+    "site": "site_name_public",
+    "product_group": "Product_Group",
+    "size": "Size",
+    "flavor": "Flavor",
+    "mechgroup": "MechGroup",
+}
+
+_TRUE_STRINGS = {"true", "yes"}
+_FALSE_STRINGS = {"false", "no"}
+
+
+def _parse_numeric(values: Sequence[Any]) -> Optional[np.ndarray]:
+    """Parse a column as float64 (empty values -> 0.0); None if any non-empty value is not numeric."""
+    try:
+        arr = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        arr = np.zeros(len(values), dtype=np.float64)
+        for i, v in enumerate(values):
+            if v is None or v == "":
+                continue
+            try:
+                arr[i] = float(v)
+            except (TypeError, ValueError):
+                s = str(v).strip().lower()
+                if s in _TRUE_STRINGS:
+                    arr[i] = 1.0
+                elif s not in _FALSE_STRINGS:
+                    return None
+    arr[np.isnan(arr)] = 0.0
+    return arr
+
+
+def _is_empty(values: Sequence[Any]) -> bool:
+    return all(v is None or v == "" for v in values)
+
+
+def _format_number(value: float) -> str:
+    """Text of a value parsed as a number, for a column that turned out to be text."""
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _parse_month_id(value: str) -> int:
+    """'2023-01-28T00:00:00' / '2023-01-28 00:00:00' -> 202301 (0 if unparseable)."""
+    s_val = value.replace("T", " ").split(" ")[0]
+    try:
+        dt = datetime.strptime(s_val, "%Y-%m-%d")
+    except ValueError:
+        return 0
+    return dt.year * 100 + dt.month
+
+
+class CategoricalColumn:
+    """Dictionary-encoded column: `categories[codes[i]]` is the value of row i."""
+
+    __slots__ = ("codes", "categories", "_normalized", "__weakref__")
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+        self._normalized: Optional[Dict[str, List[int]]] = None
+
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> "CategoricalColumn":
+        """Dictionary-encode a value sequence (codes assigned in first-seen order)."""
+        lookup: Dict[str, int] = {}
+        keys = ("" if v is None else v if isinstance(v, str) else str(v) for v in values)
+        codes = np.fromiter((lookup.setdefault(k, len(lookup)) for k in keys), dtype=np.int32, count=len(values))
+        return cls(codes, list(lookup))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(c) for c in self.categories)
+
+    def normalized(self) -> Dict[str, List[int]]:
+        """strip().lower() value -> codes (same comparison as masker.match_in)."""
+        if self._normalized is None:
+            norm: Dict[str, List[int]] = {}
+            for code, value in enumerate(self.categories):
+                if value:
+                    norm.setdefault(value.strip().lower(), []).append(code)
+            self._normalized = norm
+        return self._normalized
+
+    def codes_for(self, values: Sequence[str], exact: bool = False) -> np.ndarray:
+        """Codes whose value is in `values` (case-insensitive unless exact)."""
+        if exact:
+            wanted = {str(v) for v in values}
+            codes = [c for c, value in enumerate(self.categories) if value in wanted]
+        else:
+            norm = self.normalized()
+            codes = [c for v in values for c in norm.get(str(v).strip().lower(), ())]
+        return np.asarray(sorted(set(codes)), dtype=np.int32)
+
+    def mask_codes(self, codes: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(self.categories), dtype=bool)
+        hit[codes] = True
+        return hit[self.codes]
+
+    def mask_in(self, values: Sequence[str], exact: bool = False) -> np.ndarray:
+        return self.mask_codes(self.codes_for(values, exact=exact))
+
+
+Column = Union[np.ndarray, CategoricalColumn]
+
+
+class ColumnarTable:
+    """A dataset snapshot held as typed column arrays."""
+
+    def __init__(self, name: str, columns: Dict[str, Column], month_id: np.ndarray):
+        self.name = name
+        self.columns = columns
+        self.month_id = month_id
+        self.n_rows = len(month_id)
+        self.year = (month_id // 100).astype(np.int16)
+        self.month = (month_id % 100).astype(np.int8)
+
+    @classmethod
+    def from_records(cls, name: str, column_names: List[str], records: List[Sequence[Any]]) -> "ColumnarTable":
+        """Build from row lists (values ordered as `column_names`)."""
+        builder = TableBuilder(name, column_names)
+        builder.add_batch(RecordBatch.from_records(column_names, records))
+        return builder.build()
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        dates = self.month_id.nbytes + self.year.nbytes + self.month.nbytes
+        return dates + sum(c.nbytes for c in self.columns.values())
+
+    @property
+    def is_month_sorted(self) -> bool:
+        return bool(np.all(self.month_id[1:] >= self.month_id[:-1]))
+
+    def sorted_by_month(self) -> "ColumnarTable":
+        """This table with rows stably ordered by month_id (self if already sorted)."""
+        if self.is_month_sorted:
+            return self
+        order = np.argsort(self.month_id, kind="stable")
+        columns: Dict[str, Column] = {}
+        for name, col in self.columns.items():
+            if isinstance(col, CategoricalColumn):
+                columns[name] = CategoricalColumn(col.codes[order], col.categories)
+            else:
+                columns[name] = col[order]
+        return ColumnarTable(self.name, columns, self.month_id[order])
+
+    def has(self, name: str) -> bool:
+        return name in self.columns
+
+    def find_column(self, candidates: Sequence[str]) -> Optional[str]:
+        """First candidate present in the table (exact, then case-insensitive)."""
+        lowered = {c.lower(): c for c in self.columns}
+        for k in candidates:
+            if k in self.columns:
+                return k
+            if k.lower() in lowered:
+                return lowered[k.lower()]
+        return None
+
+    def num(self, name: Optional[str]) -> np.ndarray:
+        """Numeric column; zeros if missing or not numeric."""
+        col = self.columns.get(name) if name else None
+        if isinstance(col, np.ndarray):
+            return col
+        return np.zeros(self.n_rows, dtype=np.float64)
+
+    def cat(self, name: str, default: str = "") -> CategoricalColumn:
+        """Categorical column; a constant `default` column if missing."""
+        col = self.columns.get(name)
+        if isinstance(col, CategoricalColumn):
+            return col
+        if isinstance(col, np.ndarray):
+            return CategoricalColumn.encode([str(v) for v in col.tolist()])
+        return CategoricalColumn(np.zeros(self.n_rows, dtype=np.int32), [default])
+
+    def mask_in(self, name: str, values: Sequence[str], exact: bool = False) -> np.ndarray:
+        return self.cat(name).mask_in(values, exact=exact)
+
+    def month_range(self, start_id: int, end_id: int) -> slice:
+        """Rows with start_id <= month_id <= end_id, as a slice (binary search over sorted month_id)."""
+        lo = int(np.searchsorted(self.month_id, start_id, side="left"))
+        hi = int(np.searchsorted(self.month_id, end_id, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def rows_from(self, month_id: int) -> "ColumnarTable":
+        """Rows with month_id >= `month_id` of this month-sorted table (self if that is all of them)."""
+        lo = int(np.searchsorted(self.month_id, month_id, side="left"))
+        if lo == 0:
+            return self
+        columns: Dict[str, Column] = {}
+        for name, col in self.columns.items():
+            if isinstance(col, CategoricalColumn):
+                columns[name] = CategoricalColumn(col.codes[lo:], col.categories)
+            else:
+                columns[name] = col[lo:]
+        return ColumnarTable(self.name, columns, self.month_id[lo:])
+
+    def with_months_replaced(self, delta: "ColumnarTable", from_month_id: int) -> "ColumnarTable":
+        """
+        New table with every row from `from_month_id` onwards replaced by `delta`.
+
+        Undated rows (month_id 0) are kept from this table; the delta's own undated rows
+        are dropped, since a refresh would otherwise add them again each time. `delta`
+        must have been built with TableBuilder(template=self): its dictionaries extend
+        ours, so old codes stay valid.
+        """
+        if delta.column_names != self.column_names:
+            raise ValueError(f"Schema of {self.name} changed; a full reload is required")
+        delta = delta.sorted_by_month().rows_from(from_month_id)
+        keep = self.month_id < from_month_id
+        columns: Dict[str, Column] = {}
+        for name, col in self.columns.items():
+            new = delta.columns[name]
+            if isinstance(col, CategoricalColumn):
+                columns[name] = CategoricalColumn(np.concatenate([col.codes[keep], new.codes]), new.categories)
+            else:
+                columns[name] = np.concatenate([col[keep], new])
+        table = ColumnarTable(self.name, columns, np.concatenate([self.month_id[keep], delta.month_id]))
+        return table.sorted_by_month()
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Materialize a single row as a dict (debug / sample output only)."""
+        out = {}
+        for name, col in self.columns.items():
+            if isinstance(col, CategoricalColumn):
+                out[name] = col.categories[col.codes[i]]
+            else:
+                out[name] = float(col[i])
+        return out
+
+    def head(self, name: str, n: int = 5) -> List[Any]:
+        col = self.columns.get(name)
+        if col is None:
+            return [None] * min(n, self.n_rows)
+        if isinstance(col, CategoricalColumn):
+            return [col.categories[c] for c in col.codes[:n].tolist()]
+        return col[:n].tolist()
+
+
+class RecordBatch:
+    """A fixed-size slice of a dataset, stored column-wise (one value sequence per column)."""
+
+    __slots__ = ("column_names", "columns", "n_rows")
+
+    def __init__(self, column_names: List[str], columns: List[Sequence[Any]]):
+        self.column_names = column_names
+        self.columns = columns
+        self.n_rows = len(columns[0]) if columns else 0
+
+    @classmethod
+    def from_records(cls, column_names: List[str], records: List[Sequence[Any]]) -> "RecordBatch":
+        columns = [list(c) for c in zip(*records)] if records else [[] for _ in column_names]
+        # Short rows (trailing empty cells) leave zip() short of columns
+        columns += [[None] * len(records) for _ in range(len(column_names) - len(columns))]
+        return cls(column_names, columns[:len(column_names)])
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+
+class TableBuilder:
+    """
+    Builds a ColumnarTable batch by batch.
+
+    Each batch is converted to typed chunks immediately (numeric -> float64,
+    categorical -> int32 codes against a growing dictionary), so the Python
+    row objects of a batch can be released before the next one is read.
+
+    A column's kind comes from `template` (an earlier snapshot whose dictionaries are
+    extended, never reordered), from CATEGORICAL_COLUMNS, or from its first non-empty
+    batch: numeric if every value parses, categorical otherwise. All-empty batches
+    leave a column untyped. If text shows up later in a numeric column, the column
+    is converted to categorical (earlier numbers re-rendered as text, empty cells as
+    "0") rather than coercing the text to 0.0.
+    """
+
+    def __init__(self, name: str, column_names: List[str], template: Optional[ColumnarTable] = None):
+        self.name = name
+        self.column_names = list(column_names)
+        self.n_rows = 0
+        self._numeric: Dict[str, List[np.ndarray]] = {}
+        self._codes: Dict[str, List[np.ndarray]] = {}
+        self._lookups: Dict[str, Dict[str, int]] = {}
+        self._untyped: Dict[str, int] = {}   # column -> leading rows seen only as empty cells
+        self._fixed_numeric = set()          # numeric in `template`: must stay numeric
+        for col, values in (template.columns.items() if template else ()):
+            if isinstance(values, CategoricalColumn):
+                self._codes[col] = []
+                self._lookups[col] = {v: i for i, v in enumerate(values.categories)}
+            else:
+                self._numeric[col] = []
+                self._fixed_numeric.add(col)
+
+    def add_batch(self, batch: RecordBatch) -> None:
+        for col, values in zip(batch.column_names, batch.columns):
+            if col in self._codes:
+                self._codes[col].append(self._encode(col, values))
+            elif col in self._numeric:
+                arr = _parse_numeric(values)
+                if arr is None:
+                    self._to_categorical(col)
+                    self._codes[col].append(self._encode(col, values))
+                else:
+                    self._numeric[col].append(arr)
+            elif col not in CATEGORICAL_COLUMNS and _is_empty(values):
+                self._untyped[col] = self._untyped.get(col, 0) + len(values)
+            else:
+                arr = _parse_numeric(values) if col not in CATEGORICAL_COLUMNS else None
+                if arr is not None:
+                    self._start_numeric(col)
+                    self._numeric[col].append(arr)
+                else:
+                    self._start_categorical(col)
+                    self._codes[col].append(self._encode(col, values))
+        self.n_rows += batch.n_rows
+
+    def extend(self, other: "TableBuilder") -> None:
+        """
+        Append the rows of `other` (same columns) after ours, remapping its codes into our
+        dictionaries. Merging per-slice builders in slice order gives the same table
+        whatever order the slices were downloaded in.
+        """
+        for col in self.column_names:
+            empty = other._untyped.get(col, 0)
+            if empty:
+                self._add_empty(col, empty)
+            if col in other._numeric:
+                if col in self._codes:
+                    for chunk in other._numeric[col]:
+                        self._codes[col].append(self._encode_numbers(col, chunk))
+                else:
+                    self._start_numeric(col)
+                    self._numeric[col].extend(other._numeric[col])
+            elif col in other._codes:
+                if col in self._numeric:
+                    self._to_categorical(col)
+                else:
+                    self._start_categorical(col)
+                lookup = self._lookups[col]
+                remap = np.fromiter((lookup.setdefault(k, len(lookup)) for k in other._lookups[col]),
+                                    dtype=np.int32, count=len(other._lookups[col]))
+                self._codes[col].extend(remap[chunk] for chunk in other._codes[col])
+        self.n_rows += other.n_rows
+        other._numeric, other._codes, other._lookups, other._untyped = {}, {}, {}, {}
+
+    def _add_empty(self, col: str, n: int) -> None:
+        if col in self._codes:
+            self._codes[col].append(self._encode(col, [""] * n))
+        elif col in self._numeric:
+            self._numeric[col].append(np.zeros(n, dtype=np.float64))
+        else:
+            self._untyped[col] = self._untyped.get(col, 0) + n
+
+    def _start_numeric(self, col: str) -> None:
+        if col not in self._numeric:
+            self._numeric[col] = [np.zeros(self._untyped.pop(col, 0), dtype=np.float64)]
+
+    def _start_categorical(self, col: str) -> None:
+        if col not in self._codes:
+            self._lookups[col] = {}
+            self._codes[col] = [self._encode(col, [""] * self._untyped.pop(col, 0))]
+
+    def _to_categorical(self, col: str) -> None:
+        """Re-type a numeric column as categorical once a batch holds text in it."""
+        if col in self._fixed_numeric:
+            raise ValueError(f"Column {col} of {self.name} changed from numeric to text; a full reload is required")
+        logger.warning(f"Column {col} of {self.name} holds text after numeric batches; storing it as categorical")
+        chunks = self._numeric.pop(col)
+        self._lookups[col] = {}
+        self._codes[col] = [self._encode_numbers(col, chunk) for chunk in chunks]
+
+    def _encode_numbers(self, col: str, values: np.ndarray) -> np.ndarray:
+        uniq, inverse = np.unique(values, return_inverse=True)
+        codes = self._encode(col, [_format_number(v) for v in uniq.tolist()])
+        return codes[inverse.reshape(-1)] if len(values) else np.zeros(0, dtype=np.int32)
+
+    def _encode(self, col: str, values: Sequence[Any]) -> np.ndarray:
+        lookup = self._lookups[col]
+        keys = ("" if v is None else v if isinstance(v, str) else str(v) for v in values)
+        return np.fromiter((lookup.setdefault(k, len(lookup)) for k in keys), dtype=np.int32, count=len(values))
+
+    def build(self) -> ColumnarTable:
+        for col in list(self._untyped):   # never saw a value: numeric zeros
+            self._start_numeric(col)
+        columns: Dict[str, Column] = {}
+        for col in self.column_names:
+            if col in self._numeric:
+                columns[col] = _concat(self._numeric[col], np.float64)
+            elif col in self._codes:
+                columns[col] = CategoricalColumn(_concat(self._codes[col], np.int32), list(self._lookups[col]))
+        self._numeric, self._codes, self._lookups = {}, {}, {}
+        return ColumnarTable(self.name, columns, _derive_month_id(columns, self.n_rows)).sorted_by_month()
+
+
+def shift_month_id(month_id: int, months: int) -> int:
+    """YYYYMM arithmetic: shift_month_id(202502, -2) == 202412."""
+    index = (month_id // 100) * 12 + (month_id % 100 - 1) + months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def _concat(chunks: List[np.ndarray], dtype) -> np.ndarray:
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+
+
+def _derive_month_id(columns: Dict[str, Column], n: int) -> np.ndarray:
+    """YYYYMM per row from `date` (analytics) or Billing_Date_year/month (dashboard)."""
+    date_col = columns.get("date")
+    if isinstance(date_col, CategoricalColumn):
+        # Parse each distinct date string once
+        per_code = np.fromiter((_parse_month_id(v) for v in date_col.categories), dtype=np.int32,
+                               count=len(date_col.categories))
+        return per_code[date_col.codes]
+
+    year = columns.get("Billing_Date_year")
+    month = columns.get("Billing_Date_month")
+    if isinstance(year, np.ndarray) and isinstance(month, np.ndarray):
+        return (year.astype(np.int32) * 100 + month.astype(np.int32)).astype(np.int32)
+
+    return np.zeros(n, dtype=np.int32)
+
+
+# group_ids re-densifies the combined key before it could overflow int64
+_MAX_KEY_SPAN = 1 << 62
+
+
+def group_ids(keys: Sequence[np.ndarray], cardinalities: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group positions by one or more code arrays (codes in [0, cardinality)).
+
+    Returns (first position of each group, group id per position), with groups
+    ordered by their combined key. Unlike group_sum, any number of high-cardinality
+    keys can be combined.
+    """
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    span = 1
+    for codes, size in zip(keys, cardinalities):
+        size = max(int(size), 1)
+        if span * size > _MAX_KEY_SPAN:
+            _, combined = np.unique(combined, return_inverse=True)
+            combined = combined.reshape(-1).astype(np.int64)
+            span = int(combined.max()) + 1 if len(combined) else 1
+        combined = combined * size + codes
+        span *= size
+    _, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+
+def group_sum(keys: Sequence[np.ndarray], cardinalities: Sequence[int],
+              *weights: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray], np.ndarray]:
+    """
+    Group rows by one or more code arrays and sum `weights` per group.
+
+    Returns (group key codes per key array, summed weights per group, row count per group),
+    with groups ordered by their combined key.
+    """
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for codes, size in zip(keys, cardinalities):
+        combined = combined * max(int(size), 1) + codes
+    uniq, inverse = np.unique(combined, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(uniq))
+    sums = [np.bincount(inverse, weights=w, minlength=len(uniq)) for w in weights]
+
+    group_keys: List[np.ndarray] = []
+    rest = uniq
+    for size in reversed(cardinalities):
+        size = max(int(size), 1)
+        group_keys.append(rest % size)
+        rest = rest // size
+    group_keys.reverse()
+    return group_keys, sums, counts
@@ -4,15 +4,45 @@ Data Masking Service
 Maps real product/customer names to anonymous names before sending to frontend.
 Supports reverse mapping for predict API (frontend -> Dataiku needs real names).
 
+Columnar snapshots are masked at the dictionary level: masker.labels() gives the
+masked name of each code of a categorical column, computed once per snapshot column
+and kept for as long as the column lives. Aggregations carry codes and are
+translated to names only when the response is built.
+
+Names for values missing from the static maps come from a thread-safe registry
+persisted to MASK_REGISTRY_FILE: each column's new values are numbered in sorted
+order, so every worker and restart produces the same masked labels.
+
 Usage:
     from ..services.data_masking import masker
 
     masked_name = masker.mask("flavor", "Orange-Mandarin")
     real_name   = masker.unmask("flavor", "Original")
+
+    customers = masker.labels("customer", table.cat("Customer"))
+    customers[code]               # masked name of one dictionary code
+
+    customer = masker.compile("customer", ["FreshMart", "MegaStore"])   # unmask + normalize once
+    rows = table_index(table).select().match("Customer", customer).rows()
 """
 
+import json
 import logging
-from typing import Dict, Optional
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: the registry file is not locked across processes
+    fcntl = None
+
+from ..config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -102,11 +132,20 @@ for _field, _mapping in _RAW_MAPS.items():
         _CI_MAPS[_field][_real.lower()] = (_real, _masked)
         _CI_REVERSE[_field][_masked.lower()] = _real
 
-# Auto-generated names for values not in static maps
+# ─── Auto-generated names (registry) ────────────────────────────
+# Values missing from the static maps get "<Prefix> NN" names. The registry is guarded
+# by _AUTO_LOCK (masking runs on the compute pool) and persisted to MASK_REGISTRY_FILE
+# under an inter-process lock, so every worker and restart hands out the same names.
+# New values of a snapshot column are numbered in sorted order (see register()).
+
+_AUTO_LOCK = threading.RLock()
 _AUTO_COUNTERS: Dict[str, int] = {}
 _AUTO_FORWARD: Dict[str, Dict[str, tuple]] = {}   # field -> {lower_real: (original_real, masked)}
 _AUTO_REVERSE: Dict[str, Dict[str, str]] = {}     # field -> {lower_masked: original_real}
 
+_REGISTRY_PATH: Optional[Path] = Path(settings.MASK_REGISTRY_FILE) if settings.MASK_REGISTRY_FILE else None
+_registry_mtime: Optional[int] = None   # st_mtime_ns of the registry file last merged
+
 _AUTO_PREFIXES = {
     "flavor": "Flavor",
     "product_group": "Category",
@@ -117,6 +156,135 @@ _AUTO_PREFIXES = {
 }
 
 
+def _static_mask(field: str, real_lower: str) -> Optional[str]:
+    ci = _CI_MAPS.get(field, {})
+    if real_lower in ci:
+        return ci[real_lower][1]
+
+    # Prefix match for sites ("SITE-01 (สมุทรปราการ)" -> match "site-01")
+    if field == "site":
+        for key, (orig, masked) in ci.items():
+            if real_lower.startswith(key):
+                return masked
+    return None
+
+
+def _add_locked(field: str, real: str, masked: str) -> None:
+    _AUTO_FORWARD.setdefault(field, {})[real.lower()] = (real, masked)
+    _AUTO_REVERSE.setdefault(field, {})[masked.lower()] = real
+    number = masked.rsplit(" ", 1)[-1]
+    if number.isdigit():
+        _AUTO_COUNTERS[field] = max(_AUTO_COUNTERS.get(field, 0), int(number))
+
+
+def _sync_locked() -> None:
+    """Merge names other workers have persisted since the registry file was last read."""
+    global _registry_mtime
+    if _REGISTRY_PATH is None:
+        return
+    try:
+        mtime = _REGISTRY_PATH.stat().st_mtime_ns
+        if mtime == _registry_mtime:
+            return
+        saved = json.loads(_REGISTRY_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read mask registry {_REGISTRY_PATH}: {e}")
+        return
+    for field, names in saved.items():
+        forward = _AUTO_FORWARD.get(field, {})
+        for real, masked in names.items():
+            if real.lower() not in forward:
+                _add_locked(field, real, masked)
+    _registry_mtime = mtime
+
+
+def _persist_locked() -> None:
+    global _registry_mtime
+    if _REGISTRY_PATH is None:
+        return
+    saved = {field: dict(forward.values()) for field, forward in _AUTO_FORWARD.items()}
+    tmp_path = _REGISTRY_PATH.with_name(f"{_REGISTRY_PATH.name}.{os.getpid()}.tmp")
+    try:
+        _REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(saved, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, _REGISTRY_PATH)
+        _registry_mtime = _REGISTRY_PATH.stat().st_mtime_ns
+    except OSError as e:
+        logger.error(f"Failed to save mask registry {_REGISTRY_PATH}: {e}")
+
+
+@contextmanager
+def _registry_lock() -> Iterator[None]:
+    """_AUTO_LOCK plus, when the registry is persisted, an exclusive lock on its file."""
+    with _AUTO_LOCK:
+        if _REGISTRY_PATH is None or fcntl is None:
+            yield
+            return
+        try:
+            _REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(_REGISTRY_PATH.with_name(_REGISTRY_PATH.name + ".lock"), "a")
+        except OSError as e:
+            logger.error(f"Failed to lock mask registry {_REGISTRY_PATH}: {e}")
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class MaskedLabels:
+    """Masked names of one categorical column's dictionary, indexed by code."""
+
+    def __init__(self, field: str, categories: List[str]):
+        self.field = field
+        self.categories = categories
+        masker.register(field, categories)
+        self._labels: List[str] = [masker.mask(field, value) for value in categories]
+
+    def __getitem__(self, code: int) -> str:
+        return self._labels[code]
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+
+class FilterMatcher:
+    """
+    A multi-select filter compiled once per request: masked values unmasked and normalized
+    (strip + lowercase, as match_in compares) into a frozenset, then matched against a
+    column's dictionary so row filtering works on codes only.
+    """
+
+    def __init__(self, field: str, masked_values: Optional[Iterable[str]], exact: bool = False):
+        self.field = field
+        self.exact = exact
+        self.values: Tuple[str, ...] = tuple(masker.unmask(field, v) for v in (masked_values or ()) if v)
+        self.normalized: FrozenSet[str] = frozenset(
+            self.values if exact else (v.strip().lower() for v in self.values))
+
+    def __bool__(self) -> bool:
+        return bool(self.normalized)
+
+    def codes(self, column) -> np.ndarray:
+        """Sorted codes of a CategoricalColumn's dictionary that pass the filter."""
+        if self.exact:
+            codes = [c for c, value in enumerate(column.categories) if value in self.normalized]
+        else:
+            norm = column.normalized()
+            codes = [c for v in self.normalized for c in norm.get(v, ())]
+        return np.asarray(sorted(set(codes)), dtype=np.int32)
+
+
+# column -> {field: MaskedLabels}; dropped together with the snapshot's column
+_LABELS: "weakref.WeakKeyDictionary[object, Dict[str, MaskedLabels]]" = weakref.WeakKeyDictionary()
+_LABELS_LOCK = threading.Lock()
+
+
 class DataMasker:
     """Bidirectional data masking for demo purposes."""
 
@@ -127,37 +295,72 @@ class DataMasker:
 
         field = field.lower()
         real_stripped = real_value.strip()
+        if not real_stripped:
+            return real_value   # blank cell: nothing to hide, and no name to register
         real_lower = real_stripped.lower()
 
-        # 1. Static map (case-insensitive)
-        ci = _CI_MAPS.get(field, {})
-        if real_lower in ci:
-            return ci[real_lower][1]  # return masked name
-
-        # 1b. Prefix match for sites ("SITE-01 (สมุทรปราการ)" -> match "site-01")
-        if field == "site":
-            for key, (orig, masked) in ci.items():
-                if real_lower.startswith(key):
-                    return masked
-
-        # 2. Already auto-generated
-        if field in _AUTO_FORWARD and real_lower in _AUTO_FORWARD[field]:
-            return _AUTO_FORWARD[field][real_lower][1]
-
-        # 3. Auto-generate
-        prefix = _AUTO_PREFIXES.get(field, field.title())
-        _AUTO_COUNTERS[field] = _AUTO_COUNTERS.get(field, 0) + 1
-        masked = f"{prefix} {_AUTO_COUNTERS[field]:02d}"
-
-        if field not in _AUTO_FORWARD:
-            _AUTO_FORWARD[field] = {}
-            _AUTO_REVERSE[field] = {}
-
-        _AUTO_FORWARD[field][real_lower] = (real_stripped, masked)
-        _AUTO_REVERSE[field][masked.lower()] = real_stripped
-
-        logger.info(f"Auto-mask [{field}]: '{real_stripped}' -> '{masked}'")
-        return masked
+        # 1. Static map (case-insensitive, prefix match for sites)
+        masked = _static_mask(field, real_lower)
+        if masked is not None:
+            return masked
+
+        # 2. Already auto-generated (here or by another worker)
+        auto = _AUTO_FORWARD.get(field, {}).get(real_lower)
+        if auto is None:
+            self.register(field, [real_stripped])
+            auto = _AUTO_FORWARD[field][real_lower]
+        return auto[1]
+
+    def register(self, field: str, values: Iterable[str]) -> None:
+        """
+        Give auto-generated names to the values of `values` that have none yet, numbered
+        in sorted (case-insensitive) order, so the names of a snapshot's dictionary do not
+        depend on which request masks which value first.
+        """
+        field = field.lower()
+        values = list(values)
+
+        def unnamed() -> Dict[str, str]:
+            pending = {}
+            forward = _AUTO_FORWARD.get(field, {})
+            for value in values:
+                if not value:
+                    continue
+                real = value.strip()
+                real_lower = real.lower()
+                if real_lower not in forward and real_lower not in pending and _static_mask(field, real_lower) is None:
+                    pending[real_lower] = real
+            return pending
+
+        if not unnamed():
+            return
+        with _registry_lock():
+            _sync_locked()
+            pending = unnamed()
+            if not pending:
+                return
+            prefix = _AUTO_PREFIXES.get(field, field.title())
+            for real_lower in sorted(pending):
+                masked = f"{prefix} {_AUTO_COUNTERS.get(field, 0) + 1:02d}"
+                _add_locked(field, pending[real_lower], masked)
+                logger.info(f"Auto-mask [{field}]: '{pending[real_lower]}' -> '{masked}'")
+            _persist_locked()
+
+    def labels(self, field: str, column) -> MaskedLabels:
+        """Masked names of a CategoricalColumn's dictionary, shared by every request on its snapshot."""
+        field = field.lower()
+        with _LABELS_LOCK:
+            labels = _LABELS.get(column, {}).get(field)
+        if labels is None:
+            # Built outside the lock (registering may touch the registry file)
+            built = MaskedLabels(field, column.categories)
+            with _LABELS_LOCK:
+                labels = _LABELS.setdefault(column, {}).setdefault(field, built)
+        return labels
+
+    def compile(self, field: str, masked_values: Optional[Iterable[str]], exact: bool = False) -> FilterMatcher:
+        """Unmask and normalize a multi-select filter once (see FilterMatcher); empty when no values."""
+        return FilterMatcher(field.lower(), masked_values, exact=exact)
 
     def unmask(self, field: str, masked_value: str) -> str:
         """Reverse map: anonymous name -> real value (original casing)."""
@@ -172,9 +375,14 @@ class DataMasker:
         if masked_lower in rev:
             return rev[masked_lower]
 
-        # 2. Auto-generated reverse
-        if field in _AUTO_REVERSE and masked_lower in _AUTO_REVERSE[field]:
-            return _AUTO_REVERSE[field][masked_lower]
+        # 2. Auto-generated reverse (re-reading the registry for names other workers gave out)
+        real = _AUTO_REVERSE.get(field, {}).get(masked_lower)
+        if real is None:
+            with _AUTO_LOCK:
+                _sync_locked()
+                real = _AUTO_REVERSE.get(field, {}).get(masked_lower)
+        if real is not None:
+            return real
 
         # 3. Not found — return as-is
         logger.warning(f"Unmask [{field}]: '{masked_value}' not found, returning as-is")
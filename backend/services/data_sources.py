@@ -0,0 +1,239 @@
+"""
+Data Sources
+============
+Pluggable backends behind DataikuService's dataset and managed-folder reads.
+
+- DataikuDataSource : live DSS instance via dataikuapi (default)
+- LocalDataSource   : CSV files on local disk, so the API, caches and aggregation
+                      can be load-tested and profiled without a DSS host
+
+Selected by settings.DATA_SOURCE ("dataiku" | "local").
+
+Local layout (settings.LOCAL_DATA_DIR):
+    {dir}/{dataset_name}.csv             one CSV per dataset (header row = schema)
+    {dir}/folders/{folder_id}/{file}     one directory per managed folder
+
+LOCAL_DATASET_FILES maps dataset names to other files, e.g.
+    LOCAL_DATASET_FILES="sale_data_final_1=Sale_2021_2024_prepared.csv"
+
+CSV headers are normalized to the names the engine reads: spaces become "_" and
+raw export names are renamed (_LOCAL_HEADER_ALIASES), so the shipped export's
+"Billing Date_parsed_year" / "Product Group" / "CTN" load as Billing_Date_year /
+Product_Group / Actual_sale. A column already named like its alias is left alone.
+
+Partial reads (incremental refresh, parallel download): iter_rows() takes either
+`partitions` (Dataiku partition ids) or `date_range=(column, start, end)`, which keeps
+rows whose ISO date text in `column` sorts in [start, end); either bound may be None.
+Open-ended ranges compare as plain text, so adjacent ranges never drop or repeat a row
+(undated rows fall into the range with no start). On Dataiku the range is pushed
+down as a DSS formula (DATASET_DATE_FILTER) so only those rows are transferred.
+"""
+
+import csv
+import logging
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import dataikuapi
+from dataikuapi.utils import DataikuStreamedHttpUTF8CSVReader
+
+logger = logging.getLogger(__name__)
+
+# (column, start inclusive or None, end exclusive or None), ISO "YYYY-MM-DD" bounds
+DateRange = Tuple[str, Optional[str], Optional[str]]
+
+
+class DataSource:
+    """Everything DataikuService needs to read datasets and managed folders."""
+
+    def dataset_columns(self, dataset_name: str) -> List[str]:
+        raise NotImplementedError
+
+    def iter_rows(self, dataset_name: str, partitions: Optional[List[str]] = None,
+                  date_range: Optional[DateRange] = None) -> Iterator[Sequence[Any]]:
+        """Rows as value lists, ordered like dataset_columns()."""
+        raise NotImplementedError
+
+    def list_partitions(self, dataset_name: str) -> List[str]:
+        """Partition ids, or [] for a non-partitioned dataset."""
+        return []
+
+    def list_folder_files(self, folder_id: str) -> Any:
+        raise NotImplementedError
+
+    def read_file(self, folder_id: str, filename: str) -> bytes:
+        raise NotImplementedError
+
+    def put_file(self, folder_id: str, filename: str, file_stream: BinaryIO) -> None:
+        raise NotImplementedError
+
+
+def _iter_filtered_rows(client, project_key: str, dataset_name: str, schema_columns: List[Dict[str, Any]],
+                        partitions: Optional[List[str]], row_filter: str) -> Iterator[Sequence[Any]]:
+    """
+    DSSDataset.iter_rows() plus a server-side row filter (a DSS formula).
+
+    The public client has no filter argument, so this repeats its request through the
+    private DSSClient._perform_raw. Written against dataiku-api-client 15.1 (pinned to
+    <16 in requirements.txt); test_dataiku_data_source.py fails if the private call or
+    the stream reader change signature.
+    """
+    read_session_id = str(uuid.uuid4())
+    csv_stream = client._perform_raw(
+        "GET", "/projects/%s/datasets/%s/data/" % (project_key, dataset_name),
+        params={
+            "format": "tsv-excel-noheader",
+            "partitions": partitions,
+            "readSessionId": read_session_id,
+            "filter": row_filter,
+        })
+    return DataikuStreamedHttpUTF8CSVReader(
+        schema_columns, csv_stream, read_session_id=read_session_id,
+        client=client, project_key=project_key, dataset_name=dataset_name).iter_rows()
+
+
+class DataikuDataSource(DataSource):
+    def __init__(self, host: str, api_key: str, project_key: str,
+                 filter_template: str = 'strval("{column}") {op} "{value}"'):
+        self.host = host
+        self.api_key = api_key
+        self.project_key = project_key
+        self.filter_template = filter_template
+        self._client = None
+        self._project = None
+
+    @property
+    def client(self):
+        if not self._client:
+            logger.info(f"Connecting to Dataiku at {self.host}")
+            self._client = dataikuapi.DSSClient(self.host, self.api_key)
+        return self._client
+
+    @property
+    def project(self):
+        if not self._project:
+            self._project = self.client.get_project(self.project_key)
+        return self._project
+
+    def dataset_columns(self, dataset_name: str) -> List[str]:
+        schema = self.project.get_dataset(dataset_name).get_schema()
+        return [col['name'] for col in schema['columns']]
+
+    def iter_rows(self, dataset_name: str, partitions: Optional[List[str]] = None,
+                  date_range: Optional[DateRange] = None) -> Iterator[Sequence[Any]]:
+        dataset = self.project.get_dataset(dataset_name)
+        column, start, end = date_range or (None, None, None)
+        if start is None and end is None:
+            return dataset.iter_rows(partitions=partitions)
+
+        conditions = []
+        if start is not None:
+            conditions.append(self.filter_template.format(column=column, op=">=", value=start))
+        if end is not None:
+            conditions.append(self.filter_template.format(column=column, op="<", value=end))
+        return _iter_filtered_rows(self.client, self.project_key, dataset_name, dataset.get_schema()["columns"],
+                                   partitions, " && ".join(conditions))
+
+    def list_partitions(self, dataset_name: str) -> List[str]:
+        return self.project.get_dataset(dataset_name).list_partitions()
+
+    def list_folder_files(self, folder_id: str) -> Any:
+        return self.project.get_managed_folder(folder_id).list_contents()
+
+    def read_file(self, folder_id: str, filename: str) -> bytes:
+        return self.project.get_managed_folder(folder_id).get_file(filename).content
+
+    def put_file(self, folder_id: str, filename: str, file_stream: BinaryIO) -> None:
+        self.project.get_managed_folder(folder_id).put_file(filename, file_stream)
+
+
+# Raw Dataiku export headers (after spaces -> "_") -> the column names the engine reads
+_LOCAL_HEADER_ALIASES = {
+    "Billing_Date_parsed": "date",
+    "Billing_Date_parsed_year": "Billing_Date_year",
+    "Billing_Date_parsed_month": "Billing_Date_month",
+    "Billing_Date_parsed_day": "Billing_Date_day",
+    "CTN": "Actual_sale",          # the export's quantity (cartons); its Quantity column is empty
+    "Ship-to": "site_name_public",
+}
+
+
+def _engine_columns(header: List[str]) -> List[str]:
+    names = [h.strip().replace(" ", "_") for h in header]
+    present = set(names)
+    columns = []
+    for name in names:
+        alias = _LOCAL_HEADER_ALIASES.get(name)
+        columns.append(alias if alias and alias not in present else name)
+    return columns
+
+
+class LocalDataSource(DataSource):
+    def __init__(self, root_dir: str, dataset_files: str = ""):
+        self.root = Path(root_dir)
+        self.dataset_files: Dict[str, str] = {}
+        for pair in filter(None, (p.strip() for p in dataset_files.split(","))):
+            name, _, filename = pair.partition("=")
+            self.dataset_files[name.strip()] = filename.strip()
+
+    def _dataset_path(self, dataset_name: str) -> Path:
+        path = self.root / self.dataset_files.get(dataset_name, f"{dataset_name}.csv")
+        if not path.exists():
+            raise FileNotFoundError(f"No local file for dataset {dataset_name}: {path}")
+        return path
+
+    def _folder_path(self, folder_id: str) -> Path:
+        return self.root / "folders" / folder_id
+
+    def dataset_columns(self, dataset_name: str) -> List[str]:
+        with open(self._dataset_path(dataset_name), newline="", encoding="utf-8-sig") as f:
+            return _engine_columns(next(csv.reader(f), []))
+
+    def iter_rows(self, dataset_name: str, partitions: Optional[List[str]] = None,
+                  date_range: Optional[DateRange] = None) -> Iterator[Sequence[Any]]:
+        with open(self._dataset_path(dataset_name), newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = _engine_columns(next(reader, []))
+            column, start, end = date_range or (None, None, None)
+            if start is None and end is None:
+                yield from reader
+                return
+            idx = header.index(column)
+            for row in reader:
+                value = row[idx] if len(row) > idx else ""
+                if (start is None or value >= start) and (end is None or value < end):
+                    yield row
+
+    def list_folder_files(self, folder_id: str) -> Any:
+        """Same shape as Dataiku's list_contents(): {"items": [{"path", "size", "lastModified"}]}."""
+        folder = self._folder_path(folder_id)
+        items = []
+        if folder.exists():
+            for path in sorted(p for p in folder.rglob("*") if p.is_file()):
+                stat = path.stat()
+                items.append({
+                    "path": "/" + path.relative_to(folder).as_posix(),
+                    "size": stat.st_size,
+                    "lastModified": int(stat.st_mtime * 1000),
+                })
+        return {"items": items}
+
+    def read_file(self, folder_id: str, filename: str) -> bytes:
+        return (self._folder_path(folder_id) / filename.lstrip("/")).read_bytes()
+
+    def put_file(self, folder_id: str, filename: str, file_stream: BinaryIO) -> None:
+        path = self._folder_path(folder_id) / filename.lstrip("/")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(file_stream, f)
+
+
+def create_data_source(kind: str, dataiku: DataikuDataSource, local_dir: str, local_files: str) -> DataSource:
+    if kind == "local":
+        logger.info(f"Using local CSV data source at {local_dir}")
+        return LocalDataSource(local_dir, local_files)
+    if kind != "dataiku":
+        raise ValueError(f"Unknown DATA_SOURCE '{kind}' (expected 'dataiku' or 'local')")
+    return dataiku
@@ -1,43 +1,47 @@
 
-import dataikuapi
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from ..config import settings
-from typing import List, Dict, Any
+from .columnar import ColumnarTable, RecordBatch, TableBuilder, shift_month_id
+from .olap_cube import extend_cube
+from .data_sources import DataikuDataSource, DataSource, DateRange, create_data_source
+from typing import List, Dict, Any, Iterator, Optional
 
 logger = logging.getLogger(__name__)
 
+
+def _month_start(month_id: int) -> str:
+    return f"{month_id // 100:04d}-{month_id % 100:02d}-01"
+
+
 class DataikuService:
     def __init__(self):
         self.host = settings.DATAIKU_HOST
         self.api_key = settings.API_KEY
         self.project_key = settings.PROJECT_KEY
-        self._client = None
-        self._project = None
+        # Scenarios always run on DSS; dataset/folder reads go through the configured source
+        self.dss = DataikuDataSource(self.host, self.api_key, self.project_key,
+                                     filter_template=settings.DATASET_DATE_FILTER)
+        self.source: DataSource = create_data_source(
+            settings.DATA_SOURCE, self.dss, settings.LOCAL_DATA_DIR, settings.LOCAL_DATASET_FILES)
 
     @property
     def client(self):
-        if not self._client:
-            logger.info(f"Connecting to Dataiku at {self.host}")
-            self._client = dataikuapi.DSSClient(self.host, self.api_key)
-        return self._client
+        return self.dss.client
 
     @property
     def project(self):
-        if not self._project:
-            self._project = self.client.get_project(self.project_key)
-        return self._project
+        return self.dss.project
 
     def get_dataset_rows(self, dataset_name: str, limit: int = None) -> List[Dict[str, Any]]:
         """Fetch rows from a Dataiku dataset as dictionaries."""
         try:
-            dataset = self.project.get_dataset(dataset_name)
-            
             # 1. Get Schema to map column names
-            schema = dataset.get_schema()
-            column_names = [col['name'] for col in schema['columns']]
+            column_names = self.source.dataset_columns(dataset_name)
             
             rows = []
-            iterator = dataset.iter_rows()
+            iterator = self.source.iter_rows(dataset_name)
             
             for i, row in enumerate(iterator):
                 if limit and i >= limit:
@@ -51,6 +55,151 @@ class DataikuService:
             logger.error(f"Failed to fetch dataset rows: {e}")
             raise
 
+    def iter_dataset_batches(self, dataset_name: str, batch_size: Optional[int] = None,
+                             partitions: Optional[List[str]] = None,
+                             date_range: Optional[DateRange] = None) -> Iterator[RecordBatch]:
+        """
+        Stream a dataset as fixed-size column batches.
+
+        Only one batch of row objects is held at a time, so callers that
+        consume batches incrementally (TableBuilder, aggregates, snapshots)
+        keep peak memory bounded by `batch_size`, not the dataset size.
+        `partitions` / `date_range` restrict the read (see data_sources).
+        """
+        batch_size = batch_size or settings.DATASET_BATCH_SIZE
+        column_names = self.source.dataset_columns(dataset_name)
+
+        records = []
+        n_batches = 0
+        for row in self.source.iter_rows(dataset_name, partitions=partitions, date_range=date_range):
+            records.append(row)
+            if len(records) >= batch_size:
+                n_batches += 1
+                yield RecordBatch.from_records(column_names, records)
+                records = []
+        if records or n_batches == 0:
+            yield RecordBatch.from_records(column_names, records)
+
+    def get_dataset_table(self, dataset_name: str) -> ColumnarTable:
+        """Fetch a dataset straight into a ColumnarTable (no per-row dicts), in parallel slices when possible."""
+        try:
+            column_names = self.source.dataset_columns(dataset_name)
+            slices = self._download_slices(dataset_name, column_names)
+            table = self._build_table(dataset_name, column_names, slices)
+
+            logger.info(f"Fetched {table.n_rows} rows from dataset {dataset_name} in {len(slices)} slice(s) "
+                        f"({table.nbytes / 1e6:.1f} MB columnar)")
+            return table
+        except Exception as e:
+            logger.error(f"Failed to fetch dataset table: {e}")
+            raise
+
+    def refresh_dataset_table(self, dataset_name: str, previous: ColumnarTable) -> ColumnarTable:
+        """
+        Incremental refresh: re-fetch only the trailing DATASET_INCREMENTAL_TRAILING_MONTHS
+        up to the snapshot's high-water month (plus anything newer) and splice them into `previous`.
+
+        Uses the dataset's partitions when they are month/day ids, otherwise a
+        `date >= cutoff` filter on DATASET_DATE_COLUMN.
+        """
+        high_water = int(previous.month_id.max()) if previous.n_rows else 0
+        if high_water == 0:
+            return self.get_dataset_table(dataset_name)
+        from_month = shift_month_id(high_water, 1 - settings.DATASET_INCREMENTAL_TRAILING_MONTHS)
+
+        if self.source.dataset_columns(dataset_name) != previous.column_names:
+            raise ValueError(f"Schema of {dataset_name} changed; a full reload is required")
+        partitions = self._partitions_from(dataset_name, from_month)
+        if partitions is not None:
+            slices = [{"partitions": group} for group in self._partition_groups(partitions)]
+        else:
+            slices = [{"date_range": (settings.DATASET_DATE_COLUMN, _month_start(from_month), None)}]
+
+        delta = self._build_table(dataset_name, previous.column_names, slices, template=previous)
+        table = previous.with_months_replaced(delta, from_month)
+        extend_cube(previous, table, delta, from_month)
+
+        logger.info(f"Incremental refresh of {dataset_name} from {from_month}: "
+                    f"{delta.n_rows} rows re-fetched, {table.n_rows} total")
+        return table
+
+    def _build_table(self, dataset_name: str, column_names: List[str], slices: List[Dict[str, Any]],
+                     template: Optional[ColumnarTable] = None) -> ColumnarTable:
+        """
+        Stream each slice into its own TableBuilder, at most DATASET_DOWNLOAD_WORKERS slices
+        at a time, then merge the builders in slice order. Column kinds, dictionary order
+        and row order therefore depend only on the slices, not on which finished first.
+        """
+        builders = [TableBuilder(dataset_name, column_names, template=template) for _ in slices]
+
+        def download(selection: Dict[str, Any], builder: TableBuilder) -> None:
+            for batch in self.iter_dataset_batches(dataset_name, **selection):
+                if batch.column_names != column_names:
+                    raise ValueError(f"Schema of {dataset_name} changed during download")
+                if batch.n_rows:
+                    builder.add_batch(batch)
+
+        if len(slices) == 1:
+            download(slices[0], builders[0])
+        elif slices:
+            workers = min(max(settings.DATASET_DOWNLOAD_WORKERS, 1), len(slices))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"download-{dataset_name}") as pool:
+                for future in [pool.submit(download, *job) for job in zip(slices, builders)]:
+                    future.result()
+
+        builder = builders[0] if builders else TableBuilder(dataset_name, column_names, template=template)
+        for other in builders[1:]:
+            builder.extend(other)
+        if builder.n_rows == 0:
+            builder.add_batch(RecordBatch.from_records(column_names, []))
+        return builder.build()
+
+    def _download_slices(self, dataset_name: str, column_names: List[str]) -> List[Dict[str, Any]]:
+        """
+        Independent parts of a dataset for parallel download: groups of partitions,
+        date slices (DATASET_DOWNLOAD_SPLIT_FROM / _MONTHS), or the whole dataset.
+        """
+        partitions = self.source.list_partitions(dataset_name)
+        if len(partitions) > 1:
+            return [{"partitions": group} for group in self._partition_groups(partitions)]
+
+        column = settings.DATASET_DATE_COLUMN
+        split_from = settings.DATASET_DOWNLOAD_SPLIT_FROM
+        if split_from and column in column_names:
+            month = int(split_from[:4]) * 100 + int(split_from[5:7])
+            now = datetime.now()
+            bounds = []
+            while month <= now.year * 100 + now.month:
+                bounds.append(_month_start(month))
+                month = shift_month_id(month, max(settings.DATASET_DOWNLOAD_SPLIT_MONTHS, 1))
+            # Open-ended first/last slices also catch undated and future rows
+            edges = [None] + bounds + [None]
+            return [{"date_range": (column, lo, hi)} for lo, hi in zip(edges, edges[1:])]
+
+        return [{}]
+
+    @staticmethod
+    def _partition_groups(partitions: List[str]) -> List[List[str]]:
+        """Contiguous groups, a few per worker, so daily partitions don't mean one request each."""
+        n_groups = max(settings.DATASET_DOWNLOAD_WORKERS, 1) * 4
+        size = max(-(-len(partitions) // n_groups), 1)
+        return [partitions[i:i + size] for i in range(0, len(partitions), size)]
+
+    def _partitions_from(self, dataset_name: str, from_month: int) -> Optional[List[str]]:
+        """Partitions at or after `from_month`, or None if the dataset is not partitioned by date."""
+        partitions = self.source.list_partitions(dataset_name)
+        if not partitions:
+            return None
+        selected = []
+        for partition in partitions:
+            try:
+                month_id = int(partition[:4]) * 100 + int(partition[5:7])
+            except ValueError:
+                return None
+            if month_id >= from_month:
+                selected.append(partition)
+        return selected
+
     def get_folder(self, folder_id: str):
         """Get a managed folder instance."""
         return self.project.get_managed_folder(folder_id)
@@ -58,8 +207,7 @@ class DataikuService:
     def upload_file_to_folder(self, folder_id: str, remote_filename: str, file_stream) -> Dict[str, Any]:
         """Upload a file to a managed folder."""
         try:
-            folder = self.get_folder(folder_id)
-            folder.put_file(remote_filename, file_stream)
+            self.source.put_file(folder_id, remote_filename, file_stream)
             logger.info(f"Uploaded {remote_filename} to folder {folder_id}")
             return {"filename": remote_filename, "folder_id": folder_id}
         except Exception as e:
@@ -69,8 +217,7 @@ class DataikuService:
     def list_folder_files(self, folder_id: str) -> List[Dict[str, Any]]:
         """List files in a managed folder."""
         try:
-            folder = self.get_folder(folder_id)
-            return folder.list_contents()
+            return self.source.list_folder_files(folder_id)
         except Exception as e:
             logger.error(f"Failed to list files in folder {folder_id}: {e}")
             raise
@@ -78,9 +225,7 @@ class DataikuService:
     def read_file_from_folder(self, folder_id: str, filename: str) -> str:
         """Read text/csv file content from managed folder."""
         try:
-            folder = self.get_folder(folder_id)
-            stream = folder.get_file(filename)
-            content = stream.content.decode('utf-8')
+            content = self.source.read_file(folder_id, filename).decode('utf-8')
             return content
         except Exception as e:
             logger.error(f"Failed to read file {filename} from folder {folder_id}: {e}")
@@ -0,0 +1,312 @@
+"""
+Dataset Cache
+=============
+TTL cache of columnar dataset snapshots with single-flight refresh and
+stale-while-revalidate.
+
+- Cold miss      -> the first caller starts the download; concurrent callers wait on that
+                    same download (aget() awaits it without blocking the event loop).
+- Expired entry  -> callers keep getting the stale snapshot while one background
+                    refresh runs; the snapshot is swapped in when ready.
+- Downloads      -> every load, refresh and prefetch runs on worker_pools.fetch_pool
+                    (DATASET_FETCH_WORKERS threads), never on the caller's thread.
+- Memory budget  -> when resident snapshots (base table plus the index, cube and filter
+                    options built from it) exceed DATASET_CACHE_MAX_MB, the least
+                    recently used datasets are evicted.
+- Incremental    -> datasets listed in DATASET_INCREMENTAL (none by default) refresh by
+                    re-fetching only their trailing months and merging them into the
+                    previous snapshot; a full download still happens every
+                    DATASET_FULL_REFRESH_HOURS, and is the only way new undated rows appear.
+- Cold start     -> every download is persisted by the snapshot store; after a restart
+                    the saved file is memory-mapped and served while it is revalidated
+                    in the background.
+
+Every consumer (dashboard/analytics routers, AI agent tools) reads through the
+`dataset_cache` singleton, so each dataset is downloaded once per TTL.
+
+Usage:
+    from ..services.dataset_cache import dataset_cache
+
+    snapshot = dataset_cache.get(settings.DATASET_ANALYTICS_DASHBOARD)
+    table = snapshot.table
+    meta.update(snapshot.meta())
+
+    snapshot = await dataset_cache.aget(settings.DATASET_ANALYTICS_DASHBOARD)   # async callers
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from ..config import settings
+from .columnar import ColumnarTable
+from .dataiku_service import dataiku_service
+from .snapshot_store import SnapshotStore, snapshot_store
+from .filter_options import built_options_bytes
+from .olap_cube import built_cube_bytes
+from .table_index import built_index_bytes
+from .worker_pools import fetch_pool
+
+logger = logging.getLogger(__name__)
+
+_VERSIONS = itertools.count(1)
+_RETRY_BACKOFF = 30  # seconds between background retries after a failed refresh
+
+
+def _resident_bytes(table: ColumnarTable) -> int:
+    """Base table plus the derived structures built from it so far."""
+    return table.nbytes + built_index_bytes(table) + built_cube_bytes(table) + built_options_bytes(table)
+
+
+class DatasetSnapshot:
+    """An immutable, versioned ColumnarTable plus the time it was fetched."""
+
+    def __init__(self, name: str, table: ColumnarTable, fetched_at: float, ttl: float,
+                 full_fetched_at: Optional[float] = None):
+        self.name = name
+        self.table = table
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+        # Last full download; incremental refreshes carry it forward
+        self.full_fetched_at = fetched_at if full_fetched_at is None else full_fetched_at
+        self.version = next(_VERSIONS)
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def is_stale(self) -> bool:
+        return self.age_seconds >= self.ttl
+
+    def meta(self) -> Dict[str, object]:
+        """Snapshot freshness fields for a response `meta` block."""
+        return {
+            "snapshot_fetched_at": datetime.fromtimestamp(self.fetched_at).isoformat(),
+            "snapshot_age_seconds": round(self.age_seconds, 1),
+            "snapshot_stale": self.is_stale,
+        }
+
+
+class _Entry:
+    __slots__ = ("snapshot", "inflight", "failed_at")
+
+    def __init__(self):
+        self.snapshot: Optional[DatasetSnapshot] = None
+        self.inflight: Optional[Future] = None
+        self.failed_at = 0.0
+
+
+class DatasetCache:
+    """One LRU-ordered entry per dataset; at most one download in flight per dataset."""
+
+    def __init__(self, loader: Callable[[str], ColumnarTable], ttl: float, max_bytes: int,
+                 store: Optional[SnapshotStore] = None,
+                 delta_loader: Optional[Callable[[str, ColumnarTable], ColumnarTable]] = None,
+                 incremental: Iterable[str] = (), full_refresh_seconds: float = 0):
+        self._loader = loader
+        self._delta_loader = delta_loader
+        self.incremental = set(incremental)
+        self.full_refresh_seconds = full_refresh_seconds
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._store = store
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                       "refreshes": 0, "delta_refreshes": 0, "refresh_errors": 0,
+                       "evictions": 0, "disk_loads": 0}
+
+    def get(self, dataset_name: str) -> DatasetSnapshot:
+        """The dataset's snapshot; on a cold miss, blocks until the download finishes."""
+        found = self._lookup(dataset_name)
+        return found if isinstance(found, DatasetSnapshot) else found.result()
+
+    async def aget(self, dataset_name: str) -> DatasetSnapshot:
+        """get() for async callers: a cold miss is awaited without blocking the event loop."""
+        found = self._lookup(dataset_name)
+        return found if isinstance(found, DatasetSnapshot) else await asyncio.wrap_future(found)
+
+    def _lookup(self, dataset_name: str) -> Union[DatasetSnapshot, Future]:
+        """A usable snapshot, or the future of the in-flight download (run on fetch_pool)."""
+        owner = False
+        with self._lock:
+            entry = self._entries.get(dataset_name)
+            if entry is None:
+                entry = self._entries[dataset_name] = _Entry()
+            self._entries.move_to_end(dataset_name)
+
+            snapshot = entry.snapshot
+            if snapshot is not None:
+                if not snapshot.is_stale:
+                    self._stats["hits"] += 1
+                    return snapshot
+                self._stats["stale_hits"] += 1
+                retry_ok = time.time() - entry.failed_at >= _RETRY_BACKOFF
+                if entry.inflight is None and retry_ok:
+                    self._refresh_in_background_locked(dataset_name, entry)
+                return snapshot
+
+            # Cold miss: coalesce onto the in-flight download, or become its owner
+            if entry.inflight is None:
+                entry.inflight = Future()
+                owner = True
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+            future = entry.inflight
+
+        if owner:
+            fetch_pool.submit(self._load_or_fetch, dataset_name, entry, future)
+        return future
+
+    def _load_or_fetch(self, dataset_name: str, entry: _Entry, future: Future) -> None:
+        try:
+            if self._load_from_store(dataset_name, entry, future):
+                return
+        except Exception as e:
+            logger.error(f"Failed to load saved snapshot of {dataset_name}: {e}")
+        self._fetch(dataset_name, entry, future)
+
+    def warm(self, dataset_names: List[str]) -> None:
+        """
+        Startup hook: map saved snapshots (revalidated in the background) and
+        start background downloads for datasets without one. Never blocks on the network.
+        """
+        for name in dataset_names:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None:
+                    entry = self._entries[name] = _Entry()
+                if entry.snapshot is not None or entry.inflight is not None:
+                    continue
+                future = entry.inflight = Future()
+            fetch_pool.submit(self._load_or_fetch, name, entry, future)
+
+    def _refresh_in_background_locked(self, dataset_name: str, entry: _Entry) -> None:
+        entry.inflight = Future()
+        fetch_pool.submit(self._fetch, dataset_name, entry, entry.inflight)
+
+    def _load_from_store(self, dataset_name: str, entry: _Entry, future: Future) -> bool:
+        """Resolve a cold miss from the local snapshot file, if one exists."""
+        loaded = self._store.load(dataset_name) if self._store else None
+        if loaded is None:
+            return False
+        table, fetched_at, full_fetched_at = loaded
+        snapshot = DatasetSnapshot(dataset_name, table, fetched_at, self.ttl, full_fetched_at)
+        with self._lock:
+            entry.snapshot = snapshot
+            self._stats["disk_loads"] += 1
+            self._refresh_in_background_locked(dataset_name, entry)  # revalidate against Dataiku
+            self._evict_locked(keep=dataset_name)
+        future.set_result(snapshot)
+        return True
+
+    def _use_delta(self, dataset_name: str, previous: Optional[DatasetSnapshot], now: float) -> bool:
+        return (self._delta_loader is not None and previous is not None
+                and dataset_name in self.incremental
+                and now - previous.full_fetched_at < self.full_refresh_seconds)
+
+    def _fetch(self, dataset_name: str, entry: _Entry, future: Future) -> None:
+        started = time.time()
+        previous = entry.snapshot
+        try:
+            table = None
+            full_fetched_at = started
+            if self._use_delta(dataset_name, previous, started):
+                try:
+                    logger.info(f"Fetching trailing months for {dataset_name}")
+                    table = self._delta_loader(dataset_name, previous.table)
+                    full_fetched_at = previous.full_fetched_at
+                except Exception as e:
+                    logger.error(f"Incremental refresh of {dataset_name} failed, doing a full reload: {e}")
+            if table is None:
+                logger.info(f"Fetching fresh data for {dataset_name}")
+                table = self._loader(dataset_name)
+            snapshot = DatasetSnapshot(dataset_name, table, started, self.ttl, full_fetched_at)
+            with self._lock:
+                entry.snapshot = snapshot
+                entry.inflight = None
+                self._stats["delta_refreshes" if full_fetched_at != started else "refreshes"] += 1
+                self._evict_locked(keep=dataset_name)
+            future.set_result(snapshot)
+            logger.info(f"Refreshed {dataset_name} in {time.time() - started:.1f}s (version {snapshot.version})")
+        except Exception as e:
+            with self._lock:
+                entry.inflight = None
+                entry.failed_at = time.time()
+                self._stats["refresh_errors"] += 1
+            if entry.snapshot is not None:
+                logger.error(f"Background refresh of {dataset_name} failed, keeping stale snapshot: {e}")
+            future.set_exception(e)
+            return
+
+        if self._store:
+            try:
+                self._store.save(table, started, full_fetched_at)
+            except Exception as e:
+                logger.error(f"Failed to save snapshot for {dataset_name}: {e}")
+
+    def _evict_locked(self, keep: str) -> None:
+        """Drop least recently used snapshots until resident bytes fit the budget."""
+        resident = sum(_resident_bytes(e.snapshot.table) for e in self._entries.values() if e.snapshot)
+        for name in list(self._entries):
+            if resident <= self.max_bytes:
+                break
+            entry = self._entries[name]
+            if name == keep or entry.snapshot is None or entry.inflight is not None:
+                continue
+            resident -= _resident_bytes(entry.snapshot.table)
+            del self._entries[name]
+            self._stats["evictions"] += 1
+            logger.info(f"Evicted {name} from dataset cache (budget {self.max_bytes / 1e6:.0f} MB)")
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss/eviction counters and per-dataset residency."""
+        with self._lock:
+            datasets = {
+                name: {
+                    "bytes": e.snapshot.table.nbytes,
+                    "index_bytes": built_index_bytes(e.snapshot.table),
+                    "cube_bytes": built_cube_bytes(e.snapshot.table),
+                    "options_bytes": built_options_bytes(e.snapshot.table),
+                    "resident_bytes": _resident_bytes(e.snapshot.table),
+                    "rows": e.snapshot.table.n_rows,
+                    "version": e.snapshot.version,
+                    "full_fetched_at": datetime.fromtimestamp(e.snapshot.full_fetched_at).isoformat(),
+                    **e.snapshot.meta(),
+                }
+                for name, e in self._entries.items() if e.snapshot is not None
+            }
+            return {
+                **self._stats,
+                "resident_bytes": sum(d["resident_bytes"] for d in datasets.values()),
+                "max_bytes": self.max_bytes,
+                "datasets": datasets,
+            }
+
+    def invalidate(self, dataset_name: Optional[str] = None) -> None:
+        """Drop one dataset (or all) so the next get() downloads again."""
+        with self._lock:
+            if dataset_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(dataset_name, None)
+
+
+# Singleton
+dataset_cache = DatasetCache(
+    loader=dataiku_service.get_dataset_table,
+    ttl=settings.DATASET_CACHE_TTL,
+    max_bytes=settings.DATASET_CACHE_MAX_MB * 1024 * 1024,
+    store=snapshot_store,
+    delta_loader=dataiku_service.refresh_dataset_table,
+    incremental=[n.strip() for n in settings.DATASET_INCREMENTAL.split(",") if n.strip()],
+    full_refresh_seconds=settings.DATASET_FULL_REFRESH_HOURS * 3600,
+)
@@ -0,0 +1,179 @@
+"""
+Deep Dive Engine
+================
+Vectorized aggregations behind /analytics/deep-dive, over the selected rows of a
+snapshot. Python-level work is per distinct group (label x month), never per row.
+
+- Accuracy heatmaps -> grouped sums of actual / planned / |error| / error by
+                       (label code, month_id), merged per display label
+- Stability trend   -> the same sums by month_id
+- Error histogram   -> one np.digitize of error % against ERROR_BIN_EDGES
+- Month labels      -> "%b %y" formatted once per distinct month
+- Rankings          -> top-K rows by |error| via np.partition; only those rows
+                       ever become response objects
+- Scatter           -> a sample of rows: largest errors always kept, the rest drawn
+                       per promo stratum, deterministic for a given seed
+
+Usage:
+    from ..services import deep_dive
+
+    month_labels = deep_dive.month_labels(table.month_id[idx])
+    hm_cust = deep_dive.accuracy_cells(cust_codes, customer_label, month_ids, month_labels,
+                                       actual, planned, err)
+    bins = deep_dive.error_histogram(err, planned)   # [(bin label, count), ...]
+    under_rows, over_rows = deep_dive.ranking_rows(err, RANKING_SIZE)   # positions into idx
+    scatter = deep_dive.scatter_rows(err, is_promo, limit=500, strategy="stratified", seed=0)
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import group_ids
+
+# err% < -30 | -30 <= err% < -20 | ... | err% >= 30
+ERROR_BIN_EDGES = [-30, -20, -10, 0, 10, 20, 30]
+ERROR_BIN_LABELS = [
+    "< -30%", "-30% to -20%", "-20% to -10%", "-10% to 0%",
+    "0% to 10%", "10% to 20%", "20% to 30%", "> 30%",
+]
+
+# Rows listed per side of the under/over-plan ranking
+RANKING_SIZE = 50
+
+# "stratified": promo-stratified sample plus largest errors; "first": the first rows (legacy)
+SCATTER_STRATEGIES = ("stratified", "first")
+
+# Share of the scatter budget reserved for the largest-|error| rows
+SCATTER_OUTLIER_SHARE = 0.1
+
+# {"a": actual, "p": planned, "ae": |error|, "e": error}
+AccuracySums = Dict[str, float]
+
+
+def grouped_sums(keys: Sequence[np.ndarray],
+                 weights: Sequence[np.ndarray]) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Group rows by the values of `keys` and sum each of `weights`.
+
+    Returns (per key: value of each group, per weight: sum of each group), with
+    groups in the order their first row appears.
+    """
+    dense: List[np.ndarray] = []
+    cards: List[int] = []
+    for values in keys:
+        uniq, inverse = np.unique(values, return_inverse=True)
+        dense.append(inverse.reshape(-1))
+        cards.append(len(uniq))
+
+    first, inverse = group_ids(dense, cards)
+    order = np.argsort(first, kind="stable")
+    group_keys = [values[first[order]] for values in keys]
+    sums = [np.bincount(inverse, weights=w, minlength=len(first))[order] for w in weights]
+    return group_keys, sums
+
+
+def month_labels(month_ids: np.ndarray) -> Dict[int, str]:
+    """month_id -> "Jan 24", formatted once per distinct month."""
+    return {m: datetime(m // 100, m % 100, 1).strftime('%b %y') for m in np.unique(month_ids).tolist()}
+
+
+def accuracy_cells(row_codes: np.ndarray, row_label: Callable[[int], str], month_ids: np.ndarray,
+                   labels: Dict[int, str], actual: np.ndarray, planned: np.ndarray,
+                   err: np.ndarray) -> Dict[Tuple[str, str], AccuracySums]:
+    """(row label, month label) -> sums, for codes whose labels may coincide (e.g. masked names)."""
+    (codes, months), (a, p, ae, e) = grouped_sums([row_codes, month_ids], [actual, planned, np.abs(err), err])
+    cells: Dict[Tuple[str, str], AccuracySums] = {}
+    for code, m, a_, p_, ae_, e_ in zip(codes.tolist(), months.tolist(), a.tolist(), p.tolist(),
+                                        ae.tolist(), e.tolist()):
+        key = (row_label(code), labels[m])
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = {"a": a_, "p": p_, "ae": ae_, "e": e_}
+        else:
+            cell["a"] += a_
+            cell["p"] += p_
+            cell["ae"] += ae_
+            cell["e"] += e_
+    return cells
+
+
+def monthly_accuracy(month_ids: np.ndarray, actual: np.ndarray, planned: np.ndarray,
+                     err: np.ndarray) -> Dict[Tuple[int, int], AccuracySums]:
+    """(year, month) -> sums, in month order."""
+    (months,), (a, p, ae, e) = grouped_sums([month_ids], [actual, planned, np.abs(err), err])
+    order = np.argsort(months, kind="stable")
+    return {
+        (m // 100, m % 100): {"a": a_, "p": p_, "ae": ae_, "e": e_}
+        for m, a_, p_, ae_, e_ in zip(months[order].tolist(), a[order].tolist(), p[order].tolist(),
+                                      ae[order].tolist(), e[order].tolist())
+    }
+
+
+def error_histogram(err: np.ndarray, planned: np.ndarray) -> List[Tuple[str, int]]:
+    """Row counts per error-% bin; rows with no plan count as 0%."""
+    err_pct = np.zeros(len(err))
+    np.divide(err, planned, out=err_pct, where=planned > 0)
+    err_pct *= 100
+    counts = np.bincount(np.digitize(err_pct, ERROR_BIN_EDGES), minlength=len(ERROR_BIN_LABELS))
+    return list(zip(ERROR_BIN_LABELS, counts.tolist()))
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest values, largest first; ties keep position order (as a stable sort would)."""
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(values) > k:
+        kth_largest = np.partition(values, len(values) - k)[len(values) - k]
+        candidates = np.flatnonzero(values >= kth_largest)
+    else:
+        candidates = np.arange(len(values))
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order[:k]]
+
+
+def ranking_rows(err: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of the k largest |error| rows with error > 0, and with error < 0."""
+    positive = np.flatnonzero(err > 0)
+    negative = np.flatnonzero(err < 0)
+    return positive[top_k(err[positive], k)], negative[top_k(-err[negative], k)]
+
+
+def scatter_rows(err: np.ndarray, is_promo: np.ndarray, limit: int, strategy: str = "stratified",
+                 seed: int = 0) -> np.ndarray:
+    """
+    Positions of at most `limit` rows for the planned-vs-actual scatter, in row order.
+
+    "stratified" keeps the largest-|error| rows (SCATTER_OUTLIER_SHARE of the budget) and
+    fills the rest with a uniform sample of promo and non-promo rows, in proportion to
+    their counts (each present stratum gets at least one point). Each row draws one
+    random key from `seed` and the smallest keys per stratum win, so one pass over the
+    rows suffices and the same selection and seed always give the same sample.
+    """
+    if strategy not in SCATTER_STRATEGIES:
+        raise ValueError(f"Unknown scatter strategy '{strategy}', expected one of {SCATTER_STRATEGIES}")
+    n = len(err)
+    if n <= limit:
+        return np.arange(n)
+    if strategy == "first" or limit <= 0:
+        return np.arange(max(limit, 0))
+
+    outliers = top_k(np.abs(err), int(limit * SCATTER_OUTLIER_SHARE))
+    rest = np.ones(n, dtype=bool)
+    rest[outliers] = False
+    promo = np.flatnonzero(rest & is_promo)
+    other = np.flatnonzero(rest & ~is_promo)
+
+    budget = limit - len(outliers)
+    promo_quota = int(round(budget * len(promo) / (len(promo) + len(other))))
+    if len(promo) and len(other):
+        promo_quota = min(max(promo_quota, 1), budget - 1)
+
+    keys = np.random.default_rng(seed).random(n)
+    chosen = [outliers]
+    for stratum, quota in ((promo, promo_quota), (other, budget - promo_quota)):
+        if quota < len(stratum):
+            stratum = stratum[np.argpartition(keys[stratum], quota - 1)[:quota]] if quota > 0 else stratum[:0]
+        chosen.append(stratum)
+    return np.sort(np.concatenate(chosen))
@@ -0,0 +1,137 @@
+"""
+Filter Options
+==============
+Cascading dropdown options for /filters, served from a per-snapshot co-occurrence
+index instead of a scan of the snapshot's rows.
+
+- Co-occurrence -> the distinct combinations of the filter columns (FILTER_FIELDS)
+                   present in the snapshot, one row per combination, with the same
+                   dictionary codes as the table. Being a ColumnarTable, it gets a
+                   table_index: a selection intersects the posting lists of the
+                   selected values, and the options of each column are the codes
+                   left in the surviving combinations.
+- Masking       -> option values are masked once per dictionary code of the snapshot
+                   (masker.labels), not once per selection
+- Memo          -> the masked, sorted option lists of each distinct selection (up
+                   to MEMO_SIZE per snapshot, least recently used dropped first)
+
+Usage:
+    from ..services.filter_options import filter_options
+
+    opts = filter_options(table).options({"Product_Group": product_group, "Size": size}, exact=["Size"],
+                                         exclude={"Product_Group": ["Canned Fruit"]})
+    opts["Flavor"]   # masked, sorted flavors present under the selection
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .columnar import CategoricalColumn, ColumnarTable, group_ids
+from .data_masking import masker
+from .table_index import built_index_bytes, table_index
+
+# Filter column -> masking field of its values
+FILTER_FIELDS = {
+    "Product_Group": "product_group",
+    "Flavor": "flavor",
+    "Size": "size",
+    "Customer": "customer",
+    "site_name_public": "site",
+    "MechGroup": "mechgroup",
+}
+
+# Selections whose option lists are kept per snapshot
+MEMO_SIZE = 1024
+
+
+class CooccurrenceIndex:
+    """Distinct filter-value combinations of one snapshot table, with memoized option lists."""
+
+    def __init__(self, table: ColumnarTable):
+        cols = {name: table.cat(name) for name in FILTER_FIELDS}
+        first, _ = group_ids([col.codes for col in cols.values()], [len(col.categories) for col in cols.values()])
+        first = np.sort(first)
+        self.combos = ColumnarTable(
+            table.name,
+            {name: CategoricalColumn(col.codes[first], col.categories) for name, col in cols.items()},
+            np.zeros(len(first), dtype=np.int32),
+        )
+        self._memo: "OrderedDict[tuple, Dict[str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.combos.nbytes + built_index_bytes(self.combos)
+
+    def options(self, where: Dict[str, Union[None, str, Sequence[str]]], exact: Sequence[str] = (),
+                exclude: Optional[Dict[str, Sequence[str]]] = None,
+                hide: Optional[Dict[str, Sequence[str]]] = None,
+                columns: Sequence[str] = tuple(FILTER_FIELDS)) -> Dict[str, List[str]]:
+        """
+        Masked, sorted options of each of `columns` under a cascading selection.
+
+        `where` selects a value or a list of values per column (None, "" or [] = no filter;
+        case-insensitive unless the column is in `exact`), `exclude` drops rows holding any
+        of the listed values (exact), and `hide` drops listed values from the options only.
+        """
+        where = {col: [v] if isinstance(v, str) else list(v) for col, v in where.items() if v}
+        key = (
+            tuple(sorted(
+                (col, tuple(sorted({v if col in exact else v.strip().lower() for v in values}))) for col, values in where.items()
+            )),
+            tuple(sorted((col, tuple(vs)) for col, vs in (exclude or {}).items())),
+            tuple(sorted((col, tuple(vs)) for col, vs in (hide or {}).items())),
+            tuple(columns),
+        )
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                return cached
+
+        index = table_index(self.combos)
+        sel = index.select()
+        for col, values in (exclude or {}).items():
+            sel.exclude(col, values)
+        for col, values in where.items():
+            sel.where(col, values, exact=col in exact)
+        rows = sel.rows()
+
+        result = {}
+        for col in columns:
+            column = self.combos.cat(col)
+            names = masker.labels(FILTER_FIELDS[col], column)
+            hidden = set((hide or {}).get(col, ()))
+            result[col] = sorted(names[c] for c in index.distinct_codes(col, rows) if column.categories[c] not in hidden)
+
+        with self._lock:
+            self._memo[key] = result
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return result
+
+
+_INDEXES: "weakref.WeakKeyDictionary[ColumnarTable, CooccurrenceIndex]" = weakref.WeakKeyDictionary()
+_INDEXES_LOCK = threading.Lock()
+
+
+def filter_options(table: ColumnarTable) -> CooccurrenceIndex:
+    """The co-occurrence index for a snapshot's table (built on first use, dropped with the table)."""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(table)
+    if index is None:
+        # Built outside the lock; a concurrent duplicate build is discarded
+        built = CooccurrenceIndex(table)
+        with _INDEXES_LOCK:
+            index = _INDEXES.setdefault(table, built)
+    return index
+
+
+def built_options_bytes(table: ColumnarTable) -> int:
+    """Bytes held by the co-occurrence index already built for `table` (0 if never built)."""
+    index = _INDEXES.get(table)
+    return index.nbytes if index else 0
@@ -0,0 +1,215 @@
+"""
+Aggregate Cube
+==============
+Materialized roll-up of a ColumnarTable over every dimension the routers filter
+or group by, built once per snapshot so /summary requests aggregate cells
+instead of rows.
+
+- Dimensions -> month_id x Customer x site_name_public x Product_Group x Flavor
+                x Size x MechGroup x has_promotion (truncated), same dictionary
+                codes as the source table
+- Measures   -> additive sums per cell (MEASURES): rows, qty, actual, planned,
+                abs_err, err, over/under-plan volume, promo rows, discount and
+                promo-day sums over promo rows
+
+The cells are themselves a ColumnarTable, ordered by month_id, whose rows are
+cells and whose numeric columns are the measures. Every router filter is a
+predicate on the dimensions, so the same table_index selection that filters the
+source rows selects whole cells, and any group_sum over the selected cells
+equals the same aggregate over the matching rows.
+
+An incremental refresh (ColumnarTable.with_months_replaced) carries the cube
+forward with extend_cube: cells of the untouched months are kept and only the
+re-fetched rows are aggregated.
+
+Usage:
+    from ..services.olap_cube import aggregate_cube
+
+    cube = aggregate_cube(table)
+    sel = table_index(cube.cells).select(start_id, end_id)
+    sel.where("Customer", customer)
+    cells = sel.rows()
+    total_qty = cube.cells.num("qty")[cells].sum()
+    (months, customers), (actual,) = cube.rollup(cells, ["month_id", "Customer"], ["actual"])
+"""
+
+import threading
+import weakref
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import CategoricalColumn, Column, ColumnarTable, group_ids
+from .table_index import built_index_bytes
+
+DIMENSIONS = ("Customer", "site_name_public", "Product_Group", "Flavor", "Size", "MechGroup")
+
+MEASURES = ("rows", "qty", "actual", "planned", "abs_err", "err", "over_vol", "under_vol",
+            "promo_rows", "discount_sum", "promo_days_sum")
+
+
+def row_measures(table: ColumnarTable) -> Iterator[Tuple[str, np.ndarray]]:
+    """Per-row values of each measure (one array at a time, to bound peak memory)."""
+    actual = table.num("Actual_sale")
+    planned = table.num("Planed_sales_from_start")
+    err = actual - planned
+    is_promo = np.trunc(table.num(table.find_column(["has_promotion", "is_promo"]))) == 1
+    discount = table.num(table.find_column(["discount_pct", "discount"]))
+    promo_days = table.num(table.find_column(["promotion_dt", "Promo_Days", "promo_days", "duration", "promotion_days"]))
+
+    # Dashboard dataset counts Quantity_sum, analytics counts Actual_sale
+    yield "qty", table.num("Quantity_sum") if table.has("Quantity_sum") else actual
+    yield "actual", actual
+    yield "planned", planned
+    yield "abs_err", np.abs(err)
+    yield "err", err
+    yield "over_vol", np.where(err > 0, err, 0.0)
+    yield "under_vol", np.where(err < 0, -err, 0.0)
+    yield "promo_rows", is_promo.astype(np.float64)
+    yield "discount_sum", np.where(is_promo, discount, 0.0)
+    # A promo row with no (or non-positive) duration counts as one day
+    yield "promo_days_sum", np.where(is_promo, np.where(promo_days > 0, promo_days, 1.0), 0.0)
+
+
+class AggregateCube:
+    """Cells of one snapshot table; `first_row[i]` is the first source row of cell i."""
+
+    def __init__(self, table: ColumnarTable):
+        months, month_keys = np.unique(table.month_id, return_inverse=True)
+        promo_values, promo_keys = np.unique(np.trunc(table.num("has_promotion")), return_inverse=True)
+        # Absent dimensions stay absent, so cells.cat(name, default) behaves as on the table
+        dims = {name: table.cat(name) for name in DIMENSIONS if table.has(name)}
+
+        keys = [month_keys.reshape(-1)] + [col.codes for col in dims.values()] + [promo_keys.reshape(-1)]
+        cards = [len(months)] + [len(col.categories) for col in dims.values()] + [len(promo_values)]
+        first, inverse = group_ids(keys, cards)
+        n_cells = len(first)
+
+        columns: Dict[str, Column] = {
+            name: CategoricalColumn(col.codes[first], col.categories) for name, col in dims.items()
+        }
+        columns["has_promotion"] = promo_values[promo_keys.reshape(-1)[first]]
+        columns["rows"] = np.bincount(inverse, minlength=n_cells).astype(np.float64)
+        for name, values in row_measures(table):
+            columns[name] = np.bincount(inverse, weights=values, minlength=n_cells)
+
+        self.cells = ColumnarTable(table.name, columns, table.month_id[first])
+        self.first_row = first.astype(np.int64)
+        self.source_rows = table.n_rows
+
+    @classmethod
+    def _from_cells(cls, cells: ColumnarTable, first_row: np.ndarray, source_rows: int) -> "AggregateCube":
+        cube = cls.__new__(cls)
+        cube.cells = cells
+        cube.first_row = first_row
+        cube.source_rows = source_rows
+        return cube
+
+    @property
+    def nbytes(self) -> int:
+        return self.cells.nbytes + self.first_row.nbytes + built_index_bytes(self.cells)
+
+    def with_months_replaced(self, table: ColumnarTable, delta: ColumnarTable,
+                             from_month_id: int) -> "AggregateCube":
+        """
+        Cube of `table` = previous.with_months_replaced(delta, from_month_id), where this is
+        the cube of `previous`: the cells before `from_month_id` are kept and only the delta
+        rows are aggregated, so the cost follows the size of the delta, not of the table.
+        The result equals AggregateCube(table).
+        """
+        delta = delta.sorted_by_month().rows_from(from_month_id)
+        added = AggregateCube(delta)
+        n_kept = int(np.searchsorted(self.cells.month_id, from_month_id, side="left"))
+
+        # Kept rows keep their positions in `table`; delta rows follow all of them
+        kept_rows = int(np.searchsorted(table.month_id, from_month_id, side="left"))
+
+        columns: Dict[str, Column] = {}
+        for name, col in added.cells.columns.items():
+            old = self.cells.columns[name]
+            if isinstance(col, CategoricalColumn):
+                # Delta dictionaries extend the previous ones, so kept codes stay valid
+                columns[name] = CategoricalColumn(np.concatenate([old.codes[:n_kept], col.codes]), col.categories)
+            else:
+                columns[name] = np.concatenate([old[:n_kept], col])
+        month_id = np.concatenate([self.cells.month_id[:n_kept], added.cells.month_id])
+        first_row = np.concatenate([self.first_row[:n_kept], added.first_row + kept_rows]).astype(np.int64)
+        return AggregateCube._from_cells(ColumnarTable(table.name, columns, month_id), first_row, table.n_rows)
+
+    def rollup(self, cells: np.ndarray, by: Sequence[str],
+               measures: Sequence[str]) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Group the selected `cells` by `by` ("month_id" or a DIMENSIONS column) and sum `measures`.
+
+        Returns (per `by` column: month ids or dictionary codes, per measure: sums), with
+        groups in the order their first source row appears, as a per-row loop would see them.
+        """
+        keys: List[np.ndarray] = []
+        cards: List[int] = []
+        for name in by:
+            values = self.cells.month_id[cells] if name == "month_id" else self.cells.cat(name).codes[cells]
+            uniq, inverse = np.unique(values, return_inverse=True)
+            keys.append(inverse.reshape(-1))
+            cards.append(len(uniq))
+        first, inverse = group_ids(keys, cards)
+
+        first_row = np.full(len(first), self.source_rows, dtype=np.int64)
+        np.minimum.at(first_row, inverse, self.first_row[cells])
+        order = np.argsort(first_row, kind="stable")
+
+        group_keys = []
+        for name in by:
+            values = self.cells.month_id if name == "month_id" else self.cells.cat(name).codes
+            group_keys.append(values[cells[first[order]]])
+        sums = [np.bincount(inverse, weights=self.cells.num(m)[cells], minlength=len(first))[order] for m in measures]
+        return group_keys, sums
+
+
+class _Slot:
+    __slots__ = ("lock", "cube")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cube = None
+
+
+_CUBES: "weakref.WeakKeyDictionary[ColumnarTable, _Slot]" = weakref.WeakKeyDictionary()
+_CUBES_LOCK = threading.Lock()
+
+
+def aggregate_cube(table: ColumnarTable) -> AggregateCube:
+    """The cube for a snapshot's table (built once on first use, dropped with the table)."""
+    with _CUBES_LOCK:
+        slot = _CUBES.get(table)
+        if slot is None:
+            slot = _CUBES[table] = _Slot()
+    if slot.cube is None:
+        # Concurrent first requests for the same snapshot wait for one build
+        with slot.lock:
+            if slot.cube is None:
+                slot.cube = AggregateCube(table)
+    return slot.cube
+
+
+def extend_cube(previous: ColumnarTable, table: ColumnarTable, delta: ColumnarTable, from_month_id: int) -> None:
+    """
+    After table = previous.with_months_replaced(delta, from_month_id): if `previous` already
+    has a cube, give `table` its incrementally updated cube instead of a rebuild on first use.
+    """
+    slot = _CUBES.get(previous)
+    if slot is None or slot.cube is None:
+        return
+    cube = slot.cube.with_months_replaced(table, delta, from_month_id)
+    with _CUBES_LOCK:
+        new_slot = _CUBES.get(table)
+        if new_slot is None:
+            new_slot = _CUBES[table] = _Slot()
+    with new_slot.lock:
+        if new_slot.cube is None:
+            new_slot.cube = cube
+
+
+def built_cube_bytes(table: ColumnarTable) -> int:
+    """Bytes held by the cube already built for `table` (0 if never built)."""
+    slot = _CUBES.get(table)
+    return slot.cube.nbytes if slot and slot.cube else 0
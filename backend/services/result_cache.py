@@ -0,0 +1,132 @@
+"""
+Result Cache
+============
+Byte-bounded LRU cache of computed endpoint responses, so repeat views of the
+same filter combination skip filtering and aggregation entirely.
+
+- Key         -> (endpoint, dataset, snapshot version, normalized params). Filter
+                 lists are the unmasked values, stripped, lowercased, de-duplicated
+                 and sorted (row matching is case-insensitive, so this is lossless);
+                 date ranges are the resolved month_ids.
+- Invalidation-> a key carries its snapshot version; the first lookup against a newer
+                 snapshot of a dataset drops every entry of the older ones.
+- Budget      -> RESULT_CACHE_MAX_MB of serialized response size; least recently
+                 used entries are evicted first.
+
+Usage:
+    from ..services.result_cache import result_cache
+
+    key = result_cache.key("analytics/summary", snapshot, start_id=start_id, customer=customer)
+    data = result_cache.get(key, snapshot)
+    if data is None:
+        data = DashboardSummaryResponse(...)
+        result_cache.put(key, data)
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pydantic import BaseModel
+
+from ..config import settings
+
+CacheKey = Tuple[Hashable, ...]
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted({str(v).strip().lower() for v in value}))
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, (list, tuple, set, frozenset)) and not value)
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[BaseModel, int]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}   # dataset -> newest snapshot version seen
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def key(endpoint: str, snapshot, **params: Any) -> CacheKey:
+        """Cache key for `endpoint` over `snapshot`; empty filters (None / empty collections) are dropped."""
+        normalized = tuple(sorted((k, _normalize(v)) for k, v in params.items() if not _is_empty(v)))
+        return (endpoint, snapshot.name, snapshot.version, normalized)
+
+    def get(self, key: CacheKey, snapshot) -> Optional[BaseModel]:
+        """
+        Cached response data, with its meta refreshed for `snapshot`, or None on a miss.
+        """
+        endpoint, dataset, version = key[0], key[1], key[2]
+        with self._lock:
+            self._invalidate_older_locked(dataset, version)
+            counters = self._endpoints.setdefault(endpoint, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            counters["hits"] += 1
+            data = entry[0]
+        meta = {**data.meta, "refreshed_at": datetime.now().isoformat(), **snapshot.meta(), "result_cache": "hit"}
+        return data.model_copy(update={"meta": meta})
+
+    def put(self, key: CacheKey, data: BaseModel) -> None:
+        nbytes = len(data.model_dump_json())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self._versions.get(key[1], key[2]) > key[2]:
+                return  # computed against a snapshot that has since been replaced
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (data, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats["evictions"] += 1
+
+    def _invalidate_older_locked(self, dataset: str, version: int) -> None:
+        if self._versions.get(dataset, 0) >= version:
+            return
+        self._versions[dataset] = version
+        for key in [k for k in self._entries if k[1] == dataset and k[2] < version]:
+            self._bytes -= self._entries.pop(key)[1]
+            self._stats["invalidations"] += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters (overall and per endpoint), entries and resident bytes."""
+        def ratio(c: Dict[str, int]) -> float:
+            lookups = c["hits"] + c["misses"]
+            return round(c["hits"] / lookups, 4) if lookups else 0.0
+
+        with self._lock:
+            return {
+                **self._stats,
+                "hit_ratio": ratio(self._stats),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "endpoints": {ep: {**c, "hit_ratio": ratio(c)} for ep, c in self._endpoints.items()},
+            }
+
+
+# Singleton
+result_cache = ResultCache(max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,131 @@
+"""
+Snapshot Store
+==============
+Persists ColumnarTable snapshots as Arrow IPC files so a restart can serve the
+first request from a memory-mapped file instead of a full Dataiku download.
+
+File layout:
+    {SNAPSHOT_DIR}/{dataset_name}.arrow
+
+Each file carries schema metadata: dataset name, fetch time, time of the last
+full (non-incremental) download, snapshot format version and the source column order. Numeric columns are float64, categorical
+columns are Arrow dictionary arrays (int32 indices), plus a `__month_id__` column.
+Loading maps the file and wraps the Arrow buffers as NumPy arrays without copying.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from ..config import settings
+from .columnar import CategoricalColumn, Column, ColumnarTable
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = "1"
+_MONTH_ID_COLUMN = "__month_id__"
+
+
+class SnapshotStore:
+    """Reads/writes one Arrow IPC file per dataset under `directory`."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory) if directory else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path_for(self, dataset_name: str) -> Path:
+        return self.directory / f"{dataset_name}.arrow"
+
+    def save(self, table: ColumnarTable, fetched_at: float, full_fetched_at: Optional[float] = None) -> Optional[Path]:
+        """Write atomically (temp file + rename); returns the path, or None if disabled."""
+        if not self.enabled:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        names, arrays = [], []
+        for name, col in table.columns.items():
+            names.append(name)
+            if isinstance(col, CategoricalColumn):
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(col.codes, type=pa.int32()), pa.array(col.categories, type=pa.string())))
+            else:
+                arrays.append(pa.array(col, type=pa.float64()))
+        names.append(_MONTH_ID_COLUMN)
+        arrays.append(pa.array(table.month_id, type=pa.int32()))
+
+        metadata = {
+            "dataset": table.name,
+            "fetched_at": repr(fetched_at),
+            "full_fetched_at": repr(fetched_at if full_fetched_at is None else full_fetched_at),
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "columns": json.dumps(table.column_names),
+        }
+        schema = pa.schema([pa.field(n, a.type) for n, a in zip(names, arrays)], metadata=metadata)
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+        path = self.path_for(table.name)
+        tmp_path = path.with_suffix(".arrow.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_batch(batch)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved snapshot {path} ({table.n_rows} rows)")
+        return path
+
+    def load(self, dataset_name: str) -> Optional[Tuple[ColumnarTable, float, float]]:
+        """
+        Memory-map a saved snapshot -> (table, fetched_at, full_fetched_at);
+        None if missing, unreadable or from another format version.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(dataset_name)
+        if not path.exists():
+            return None
+        try:
+            reader = pa.ipc.open_file(pa.memory_map(str(path), "r"))
+            arrow_table = reader.read_all()
+            meta = {k.decode(): v.decode() for k, v in (arrow_table.schema.metadata or {}).items()}
+            if meta.get("format_version") != SNAPSHOT_FORMAT_VERSION or meta.get("dataset") != dataset_name:
+                logger.warning(f"Ignoring snapshot {path}: format/dataset mismatch")
+                return None
+
+            columns: Dict[str, Column] = {}
+            for name in json.loads(meta["columns"]):
+                columns[name] = _to_column(arrow_table.column(name))
+            month_id = _to_numpy(arrow_table.column(_MONTH_ID_COLUMN))
+
+            table = ColumnarTable(dataset_name, columns, month_id).sorted_by_month()
+            logger.info(f"Loaded snapshot {path} ({table.n_rows} rows, fetched {meta['fetched_at']})")
+            fetched_at = float(meta["fetched_at"])
+            return table, fetched_at, float(meta.get("full_fetched_at", fetched_at))
+        except Exception as e:
+            logger.error(f"Failed to load snapshot {path}: {e}")
+            return None
+
+
+def _single_chunk(chunked: pa.ChunkedArray) -> pa.Array:
+    return chunked.chunk(0) if chunked.num_chunks == 1 else chunked.combine_chunks()
+
+
+def _to_numpy(chunked: pa.ChunkedArray) -> np.ndarray:
+    return _single_chunk(chunked).to_numpy(zero_copy_only=True)
+
+
+def _to_column(chunked: pa.ChunkedArray) -> Column:
+    arr = _single_chunk(chunked)
+    if pa.types.is_dictionary(arr.type):
+        return CategoricalColumn(arr.indices.to_numpy(zero_copy_only=True), arr.dictionary.to_pylist())
+    return arr.to_numpy(zero_copy_only=True)
+
+
+# Singleton
+snapshot_store = SnapshotStore(settings.SNAPSHOT_DIR)
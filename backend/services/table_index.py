@@ -0,0 +1,208 @@
+"""
+Table Index
+===========
+Per-snapshot inverted index over a ColumnarTable, so a filter combination costs
+O(result size) instead of one comparison per row per filter.
+
+- Categorical columns -> one posting list per dictionary code: the sorted row ids
+                         holding that value (a compressed bitmap, array-container style)
+- Numeric flags       -> one posting list per distinct truncated value (e.g. has_promotion 0/1)
+- month_id            -> rows are sorted by month_id, so a date range is a row-id
+                         interval; each posting list is clipped to it by binary search
+
+A selection ORs the posting lists within a field, then ANDs across fields starting
+from the smallest, probing the others by binary search. Posting lists are built
+lazily, per column, the first time that column is filtered, and live as long as
+the snapshot's table.
+
+Usage:
+    from ..services.table_index import table_index
+
+    sel = table_index(table).select(start_id, end_id)
+    sel.where("Customer", customer)                      # case-insensitive, OR within field
+    sel.where("Size", [size], exact=True)
+    sel.match("Flavor", masker.compile("flavor", flavor))   # compiled filter of masked values
+    sel.where_value("has_promotion", has_promotion)      # np.trunc(value) == has_promotion
+    sel.exclude("Product_Group", ["Canned Fruit"])       # exact
+    idx = sel.rows()                                     # sorted row ids
+"""
+
+import threading
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import CategoricalColumn, ColumnarTable
+
+
+class PostingLists:
+    """Row ids grouped by key: rows of key k are `row_ids[offsets[k]:offsets[k + 1]]`, ascending."""
+
+    __slots__ = ("row_ids", "offsets")
+
+    def __init__(self, keys: np.ndarray, n_keys: int):
+        self.row_ids = np.argsort(keys, kind="stable").astype(np.int32)
+        self.offsets = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=n_keys), out=self.offsets[1:])
+
+    @property
+    def nbytes(self) -> int:
+        return self.row_ids.nbytes + self.offsets.nbytes
+
+    def rows(self, key: int, lo: int, hi: int) -> np.ndarray:
+        """Rows with `key` inside the row-id interval [lo, hi)."""
+        rows = self.row_ids[self.offsets[key]:self.offsets[key + 1]]
+        return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+    def union(self, keys: Sequence[int], lo: int, hi: int) -> np.ndarray:
+        parts = [self.rows(k, lo, hi) for k in keys]
+        if len(parts) == 1:
+            return parts[0]
+        # Lists of different keys are disjoint: concatenating and sorting is their union
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int32)
+
+
+def _members(rows: np.ndarray, sorted_set: np.ndarray) -> np.ndarray:
+    """Boolean mask: which of `rows` appear in `sorted_set` (binary search per row)."""
+    if len(sorted_set) == 0:
+        return np.zeros(len(rows), dtype=bool)
+    pos = np.searchsorted(sorted_set, rows)
+    pos[pos == len(sorted_set)] = 0
+    return sorted_set[pos] == rows
+
+
+class Selection:
+    """A filter combination over one TableIndex; evaluated by rows()."""
+
+    def __init__(self, index: "TableIndex", lo: int, hi: int):
+        self._index = index
+        self.lo, self.hi = lo, hi
+        self._include: List[Tuple[PostingLists, np.ndarray]] = []
+        self._exclude: List[Tuple[PostingLists, np.ndarray]] = []
+
+    def where(self, column: str, values: Optional[Sequence[str]], exact: bool = False) -> "Selection":
+        """Keep rows whose `column` is any of `values` (no-op when values is empty/None)."""
+        if values:
+            self.where_codes(column, self._index.table.cat(column).codes_for(values, exact=exact))
+        return self
+
+    def match(self, column: str, matcher) -> "Selection":
+        """Keep rows whose `column` passes a compiled filter (masker.compile; no-op when it is empty)."""
+        if matcher:
+            self.where_codes(column, matcher.codes(self._index.table.cat(column)))
+        return self
+
+    def where_codes(self, column: str, codes: np.ndarray) -> "Selection":
+        self._include.append((self._index.postings(column), codes))
+        return self
+
+    def where_value(self, column: str, value: Optional[float]) -> "Selection":
+        """Keep rows where np.trunc(column) == value (no-op when value is None)."""
+        if value is not None:
+            postings, values = self._index.value_postings(column)
+            self._include.append((postings, np.flatnonzero(values == value)))
+        return self
+
+    def exclude(self, column: str, values: Sequence[str], exact: bool = True) -> "Selection":
+        codes = self._index.table.cat(column).codes_for(values, exact=exact)
+        if len(codes):
+            self._exclude.append((self._index.postings(column), codes))
+        return self
+
+    def rows(self) -> np.ndarray:
+        """Sorted row ids matching every filter."""
+        lo, hi = self.lo, self.hi
+        if self._include:
+            fields = sorted((p.union(codes.tolist(), lo, hi) for p, codes in self._include), key=len)
+            rows = fields[0]
+            for other in fields[1:]:
+                if len(rows) == 0:
+                    break
+                rows = rows[_members(rows, other)]
+        else:
+            rows = np.arange(lo, hi, dtype=np.int32)
+        for postings, codes in self._exclude:
+            rows = rows[~_members(rows, postings.union(codes.tolist(), lo, hi))]
+        return rows
+
+
+class TableIndex:
+    def __init__(self, table: ColumnarTable):
+        # Weak: the index is the value of a WeakKeyDictionary keyed by this table
+        self._table = weakref.ref(table)
+        self._postings: Dict[str, PostingLists] = {}
+        self._values: Dict[str, Tuple[PostingLists, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def table(self) -> ColumnarTable:
+        return self._table()
+
+    @property
+    def nbytes(self) -> int:
+        built = list(self._postings.values()) + [p for p, _ in self._values.values()]
+        return sum(p.nbytes for p in built)
+
+    def postings(self, column: str) -> PostingLists:
+        postings = self._postings.get(column)
+        if postings is None:
+            with self._lock:
+                postings = self._postings.get(column)
+                if postings is None:
+                    col = self.table.cat(column)
+                    postings = self._postings[column] = PostingLists(col.codes, len(col.categories))
+        return postings
+
+    def value_postings(self, column: str) -> Tuple[PostingLists, np.ndarray]:
+        """Posting lists keyed by distinct np.trunc(value), plus those distinct values."""
+        entry = self._values.get(column)
+        if entry is None:
+            with self._lock:
+                entry = self._values.get(column)
+                if entry is None:
+                    values, keys = np.unique(np.trunc(self.table.num(column)), return_inverse=True)
+                    entry = self._values[column] = (PostingLists(keys, len(values)), values)
+        return entry
+
+    def select(self, start_id: Optional[int] = None, end_id: Optional[int] = None) -> Selection:
+        """Start a selection, optionally limited to start_id <= month_id <= end_id."""
+        if start_id is None and end_id is None:
+            return Selection(self, 0, self.table.n_rows)
+        rng = self.table.month_range(start_id if start_id is not None else np.iinfo(np.int32).min,
+                                     end_id if end_id is not None else np.iinfo(np.int32).max)
+        return Selection(self, rng.start, rng.stop)
+
+    def distinct_codes(self, column: str, rows: np.ndarray) -> List[int]:
+        """Codes of the distinct non-empty values of `column` among `rows`."""
+        col = self.table.cat(column)
+        if len(rows) == self.table.n_rows:
+            counts = np.diff(self.postings(column).offsets)
+            codes = np.flatnonzero(counts).tolist()
+        else:
+            codes = np.unique(col.codes[rows]).tolist()
+        return [c for c in codes if col.categories[c]]
+
+    def distinct_values(self, column: str, rows: np.ndarray) -> List[str]:
+        """Distinct non-empty values of `column` among `rows`."""
+        categories = self.table.cat(column).categories
+        return [categories[c] for c in self.distinct_codes(column, rows)]
+
+
+_INDEXES: "weakref.WeakKeyDictionary[ColumnarTable, TableIndex]" = weakref.WeakKeyDictionary()
+_INDEXES_LOCK = threading.Lock()
+
+
+def table_index(table: ColumnarTable) -> TableIndex:
+    """The index for a snapshot's table (created on first use, dropped with the table)."""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(table)
+        if index is None:
+            index = _INDEXES[table] = TableIndex(table)
+        return index
+
+
+def built_index_bytes(table: ColumnarTable) -> int:
+    """Bytes held by posting lists already built for `table` (0 if never indexed)."""
+    index = _INDEXES.get(table)
+    return index.nbytes if index else 0
@@ -0,0 +1,139 @@
+"""
+Worker Pools
+============
+Bounded thread pools that keep blocking work off the event loop.
+
+- compute_pool -> CPU-bound aggregation behind the dashboard/analytics routes
+                  (COMPUTE_WORKERS threads; numpy releases the GIL in its kernels).
+                  At most COMPUTE_MAX_QUEUE requests wait; beyond that a route
+                  answers SERVER_BUSY at once instead of piling up.
+- fetch_pool   -> Dataiku downloads and refreshes run by dataset_cache
+                  (DATASET_FETCH_WORKERS threads, one download per dataset at a time).
+
+Each pool reports active, queued (queue depth), peak queue depth, completed and
+rejected counts through stats(), exposed at /api/v1/health/pools.
+
+Usage:
+    from ..services.worker_pools import offloaded
+
+    @router.get("/summary")
+    @offloaded(prefetch=settings.DATASET_ANALYTICS_DASHBOARD)
+    def get_summary(...):          # plain blocking body, runs on compute_pool
+        ...
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(RuntimeError):
+    """The pool's wait queue is full."""
+
+
+class WorkerPool:
+    """A ThreadPoolExecutor with a bounded wait queue and queue-depth counters."""
+
+    def __init__(self, name: str, workers: int, max_queue: int = 0):
+        self.name = name
+        self.workers = max(workers, 1)
+        self.max_queue = max_queue   # 0 = unbounded
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "max_queued": 0}
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Schedule fn(*args, **kwargs); raises PoolSaturated when max_queue tasks already wait."""
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise PoolSaturated(f"{self.name} pool is saturated ({self._queued} requests waiting)")
+            self._queued += 1
+            self._stats["submitted"] += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._queued)
+        return self._executor.submit(self._run, fn, args, kwargs)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn on the pool and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._stats["completed" if ok else "failed"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                **self._stats,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+            }
+
+
+def offloaded(prefetch: Optional[str] = None, pool: Optional[WorkerPool] = None):
+    """
+    Route decorator: run a blocking endpoint body on `pool` (compute_pool by default).
+
+    The wrapper is `async def` with the body's signature, so FastAPI still parses the
+    same parameters. `prefetch` names the dataset the body reads: it is awaited first
+    via dataset_cache.aget, so a cold download never ties up a compute worker. A model
+    returned by the body is JSON-encoded on the worker too (ModelJSONResponse), which
+    skips FastAPI's response_model re-validation and encoding on the event loop.
+    """
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        def encoded(*args: Any, **kwargs: Any) -> Any:
+            from ..schemas.common import ModelJSONResponse
+
+            result = fn(*args, **kwargs)
+            return ModelJSONResponse(result) if isinstance(result, BaseModel) else result
+
+        @functools.wraps(fn)
+        async def endpoint(*args: Any, **kwargs: Any) -> Any:
+            from ..schemas.common import APIResponse
+            from .dataset_cache import dataset_cache
+
+            if prefetch:
+                try:
+                    await dataset_cache.aget(prefetch)
+                except Exception as e:
+                    logger.error(f"Loading {prefetch} failed: {e}", exc_info=True)
+                    return APIResponse(success=False, error={"code": "INTERNAL_ERROR", "message": str(e)})
+            try:
+                return await (pool or compute_pool).run(encoded, *args, **kwargs)
+            except PoolSaturated as e:
+                logger.warning(str(e))
+                return APIResponse(success=False, error={"code": "SERVER_BUSY", "message": str(e)})
+        return endpoint
+    return decorate
+
+
+def stats() -> Dict[str, object]:
+    return {"compute": compute_pool.stats(), "fetch": fetch_pool.stats()}
+
+
+# Singletons
+compute_pool = WorkerPool("compute", settings.COMPUTE_WORKERS, settings.COMPUTE_MAX_QUEUE)
+fetch_pool = WorkerPool("fetch", settings.DATASET_FETCH_WORKERS)
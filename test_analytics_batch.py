@@ -0,0 +1,58 @@
+"""
+/analytics/batch widgets must equal their single-endpoint counterparts, default date ranges included.
+
+Usage: python -m pytest test_analytics_batch.py
+"""
+
+import asyncio
+import json
+
+from backend.routers import analytics
+from backend.schemas.dashboard_v2 import AnalyticsBatchRequest
+from backend.services.result_cache import result_cache
+from test_analytics_summary_engine import synthetic_table, use_table
+
+DEEP_DIVE_FIELDS = ("heatmap_customer", "heatmap_product", "ranking_under_plan", "ranking_over_plan",
+                    "scatter_data", "error_dist", "stability_trend", "sales_trend")
+NO_FILTERS = dict(customer=None, product_group=None, size=None, flavor=None, mechgroup=None,
+                  has_promotion=None, breakdown=None)
+
+
+def data(response) -> dict:
+    payload = json.loads(response.body)
+    assert payload["success"], payload["error"]
+    return payload["data"]
+
+
+def batch(**kwargs) -> dict:
+    result_cache.invalidate()
+    return data(asyncio.run(analytics.get_analytics_batch(AnalyticsBatchRequest(**kwargs))))
+
+
+def test_batch_deep_dive_widgets_default_like_deep_dive(monkeypatch, tmp_path):
+    use_table(synthetic_table(20_000), monkeypatch, tmp_path)
+    widgets = ["heatmaps", "rankings", "scatter", "error_dist", "stability_trend", "sales_trend"]
+
+    for dates in [{}, {"year_to": 2025, "month_to": 6}]:
+        result_cache.invalidate()
+        expected = data(asyncio.run(analytics.get_deep_dive_analytics(
+            **dates, **NO_FILTERS, scatter_limit=500, scatter_strategy="stratified", scatter_seed=0,
+            format="objects")))
+        actual = batch(widgets=widgets, **dates)
+
+        assert actual["meta"]["deep_dive_record_count"] == expected["meta"]["record_count"] > 0
+        for field in DEEP_DIVE_FIELDS:
+            assert actual[field] == expected[field], field
+
+
+def test_batch_summary_widgets_default_like_summary(monkeypatch, tmp_path):
+    use_table(synthetic_table(20_000), monkeypatch, tmp_path)
+
+    for dates in [{}, {"year_to": 2025, "month_to": 6}]:
+        result_cache.invalidate()
+        expected = data(asyncio.run(analytics.get_analytics_summary(**dates, site=None, **NO_FILTERS)))
+        actual = batch(widgets=["kpi", "monthly_ts", "by_customer", "top_products"], **dates)
+
+        assert actual["meta"]["record_count"] == expected["meta"]["record_count"]
+        for field in ("kpi", "monthly_ts", "by_customer", "top_products"):
+            assert actual[field] == expected[field], field
@@ -0,0 +1,235 @@
+"""
+Equivalence + speed check for /analytics/summary
+Compares the cube-based summary with the original per-row loop on synthetic data.
+
+Usage: python test_analytics_summary_engine.py [rows]    (default 1,000,000 rows)
+"""
+
+import asyncio
+import json
+import math
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from backend.config import settings
+from backend.routers import analytics
+from backend.services.columnar import CategoricalColumn, ColumnarTable
+from backend.services import data_masking, dataset_cache
+from backend.services.data_masking import masker
+from backend.services.dataset_cache import DatasetCache
+from backend.services.result_cache import result_cache
+
+CUSTOMERS = ["7 - Eleven", "Lotus", "Big C", "Tops", "CP ALL", "Makro", " lotus "]
+GROUPS = ["Fruit Juice", "Coconut Water", "Beverage", "Canned Fruit"]
+FLAVORS = ["Orange-Mandarin", "Orange", "Apple", "Grape", "Kiwi", ""]
+SIZES = ["200 ml", "350 ml", "1000 ml", "20 oz"]
+MECHGROUPS = ["7Days", "Stamp", "No_Promotion", "Corporate"]
+PERIOD = dict(year_from=2023, month_from=1, year_to=2025, month_to=12)
+
+
+def synthetic_table(n_rows: int, seed: int = 7) -> ColumnarTable:
+    rng = np.random.default_rng(seed)
+
+    def cat(values):
+        return CategoricalColumn(rng.integers(0, len(values), n_rows).astype(np.int32), list(values))
+
+    actual = rng.gamma(2.0, 50.0, n_rows).round(1)
+    planned = (actual * rng.uniform(0.5, 1.6, n_rows)).round(1)
+    planned[rng.random(n_rows) < 0.05] = 0.0
+    month_id = (rng.integers(2023, 2026, n_rows) * 100 + rng.integers(1, 13, n_rows)).astype(np.int32)
+    month_id[rng.random(n_rows) < 0.01] = 0  # undated rows
+    columns = {
+        "Customer": cat(CUSTOMERS),
+        "Product_Group": cat(GROUPS),
+        "Flavor": cat(FLAVORS),
+        "Size": cat(SIZES),
+        "MechGroup": cat(MECHGROUPS),
+        "Actual_sale": actual,
+        "Planed_sales_from_start": planned,
+        "has_promotion": rng.integers(0, 2, n_rows).astype(np.float64),
+        "discount_pct": rng.choice([0.0, 5.0, 10.5], n_rows),
+        "Promo_Days": rng.choice([0.0, 3.0, 7.0], n_rows),
+    }
+    return ColumnarTable(settings.DATASET_ANALYTICS_DASHBOARD, columns, month_id).sorted_by_month()
+
+
+def reference_summary(table: ColumnarTable, breakdown=None, customer=None, has_promotion=None) -> dict:
+    """The per-row filter and aggregation loop /analytics/summary used before the cube."""
+    start_id = PERIOD["year_from"] * 100 + PERIOD["month_from"]
+    end_id = PERIOD["year_to"] * 100 + PERIOD["month_to"]
+    if customer:
+        customer = [masker.unmask("customer", v) for v in customer]
+
+    def text(name):
+        col = table.cat(name)
+        return [col.categories[c] for c in col.codes.tolist()]
+
+    rows = zip(
+        table.month_id.tolist(), text("Customer"), text("Product_Group"), text("Flavor"), text("Size"),
+        table.num("Actual_sale").tolist(), table.num("Planed_sales_from_start").tolist(),
+        table.num("has_promotion").tolist(), table.num("discount_pct").tolist(), table.num("Promo_Days").tolist(),
+    )
+    filtered = []
+    for month_id, c, pg, fl, sz, actual, planned, promo, disc, p_days in rows:
+        if not month_id or not (start_id <= month_id <= end_id):
+            continue
+        if pg == "Canned Fruit":
+            continue
+        if customer and not (c and any(c.strip().lower() == f.strip().lower() for f in customer)):
+            continue
+        if has_promotion is not None and int(promo) != has_promotion:
+            continue
+        filtered.append((actual, planned, bool(promo) and int(promo) == 1, disc, p_days,
+                         month_id // 100, month_id % 100, c, pg, fl, sz))
+
+    total_actual = total_planned = sum_abs_diff = sum_diff = under = over = 0.0
+    promo_rows = 0
+    sum_discount = sum_pdays = 0.0
+    active_items = set()
+    breakdown_agg, monthly_promo, monthly_agg, cust_agg, product_agg = {}, {}, {}, {}, {}
+
+    for actual, planned, is_promo, disc, p_days, y, m, c, pg, fl, sz in filtered:
+        total_actual += actual
+        total_planned += planned
+        diff = actual - planned
+        sum_abs_diff += abs(diff)
+        sum_diff += diff
+        if diff > 0:
+            over += diff
+        elif diff < 0:
+            under += abs(diff)
+        active_items.add((pg, fl, sz))
+        monthly_agg[(y, m)] = monthly_agg.get((y, m), 0.0) + actual
+        if is_promo:
+            promo_rows += 1
+            sum_discount += disc
+            if p_days <= 0:
+                p_days = 1.0
+            sum_pdays += p_days
+            stats = monthly_promo.setdefault((y, m), {"discount_sum": 0.0, "pdays_sum": 0.0, "count": 0})
+            stats["discount_sum"] += disc
+            stats["pdays_sum"] += p_days
+            stats["count"] += 1
+        b_key = None
+        if breakdown == "product_group":
+            b_key = masker.mask("product_group", pg)
+        elif breakdown == "flavor":
+            b_key = masker.mask("flavor", fl) if fl else "Other"
+        elif breakdown == "size":
+            masked_fl = masker.mask("flavor", fl.strip()) if fl.strip() else ""
+            masked_sz = masker.mask("size", sz.strip())
+            b_key = f"{masked_fl} {masked_sz}" if masked_fl and sz.strip() else "Other"
+        if b_key:
+            breakdown_agg[(b_key, y, m)] = breakdown_agg.get((b_key, y, m), 0.0) + actual
+        cust_agg[c] = cust_agg.get(c, 0.0) + actual
+        product_agg[(pg, fl, sz)] = product_agg.get((pg, fl, sz), 0.0) + actual
+
+    months = sorted(monthly_promo)
+    disc_change = pdays_change = 0.0
+    if len(months) >= 2:
+        cur, prev = monthly_promo[months[-1]], monthly_promo[months[-2]]
+        prev_disc = prev["discount_sum"] / prev["count"]
+        if prev_disc > 0:
+            disc_change = (cur["discount_sum"] / cur["count"] - prev_disc) / prev_disc * 100
+        pdays_change = cur["pdays_sum"] / cur["count"] - prev["pdays_sum"] / prev["count"]
+
+    labels = {}
+    for (label, y, m), qty in breakdown_agg.items():
+        labels.setdefault(label, []).append({"year": y, "month": m, "qty": qty})
+    return {
+        "kpi": {
+            "total_actual": total_actual, "total_planned": total_planned,
+            "wape": sum_abs_diff / total_actual * 100, "bias": sum_diff / total_actual * 100,
+            "under_plan_volume": under, "over_plan_volume": over,
+            "promo_coverage": promo_rows / len(filtered) * 100, "avg_discount_pct": sum_discount / promo_rows,
+            "avg_promo_days": sum_pdays / promo_rows, "total_active_items": len(active_items),
+            "avg_discount_pct_change": disc_change, "avg_promo_days_change": pdays_change,
+        },
+        "monthly_ts": [{"year": y, "month": m, "qty": q} for (y, m), q in sorted(monthly_agg.items())],
+        "breakdown_ts": [{"label": k, "data": sorted(v, key=lambda p: (p["year"], p["month"]))}
+                         for k, v in labels.items()] if breakdown else None,
+        "by_customer": sorted(({"label": masker.mask("customer", k), "qty": v} for k, v in cust_agg.items()),
+                              key=lambda p: p["qty"], reverse=True)[:20],
+        "top_products": [{"qty": q} for q in sorted(product_agg.values(), reverse=True)[:10]],
+    }
+
+
+def summary(breakdown=None, customer=None, has_promotion=None) -> dict:
+    result_cache.invalidate()  # measure the aggregation, not a cached response
+    response = asyncio.run(analytics.get_analytics_summary(
+        **PERIOD, customer=customer, site=None, product_group=None, size=None, flavor=None,
+        mechgroup=None, has_promotion=has_promotion, breakdown=breakdown,
+    ))
+    payload = json.loads(response.body)   # the JSON body the client receives
+    assert payload["success"], payload["error"]
+    return payload["data"]
+
+
+def assert_matches(expected, actual, path="summary"):
+    if isinstance(expected, dict):
+        for key, value in expected.items():
+            assert_matches(value, actual[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), f"{path}: {len(expected)} != {len(actual)} items"
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_matches(e, a, f"{path}[{i}]")
+    elif isinstance(expected, float):
+        assert math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6), f"{path}: {expected} != {actual}"
+    else:
+        assert expected == actual, f"{path}: {expected!r} != {actual!r}"
+
+
+def use_table(table: ColumnarTable, monkeypatch: pytest.MonkeyPatch, tmp_dir: Path) -> None:
+    """Serve `table` from a private dataset cache; debug log and mask registry go to `tmp_dir`."""
+    cache = DatasetCache(loader=lambda name: table, ttl=3600, max_bytes=1 << 40)
+    monkeypatch.setattr(analytics, "dataset_cache", cache)       # the route body
+    monkeypatch.setattr(dataset_cache, "dataset_cache", cache)   # and its prefetch
+    monkeypatch.setattr(data_masking, "_REGISTRY_PATH", tmp_dir / "mask_registry.json")
+    monkeypatch.setattr(data_masking, "_registry_mtime", None)
+    monkeypatch.chdir(tmp_dir)   # the route writes backend_debug.txt to the working directory
+
+
+def test_summary_matches_row_loop(monkeypatch, tmp_path, n_rows: int = 50_000):
+    table = synthetic_table(n_rows)
+    use_table(table, monkeypatch, tmp_path)
+    for kwargs in [{}, {"breakdown": "product_group"}, {"breakdown": "flavor", "has_promotion": 1},
+                   {"breakdown": "size", "customer": ["LOTUS"]}]:
+        assert_matches(reference_summary(table, **kwargs), summary(**kwargs))
+
+
+def benchmark(monkeypatch: pytest.MonkeyPatch, tmp_dir: Path, n_rows: int = 1_000_000) -> float:
+    table = synthetic_table(n_rows)
+    use_table(table, monkeypatch, tmp_dir)
+
+    started = time.perf_counter()
+    expected = reference_summary(table, breakdown="size")
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    summary(breakdown="size")  # builds the snapshot's index and cube
+    cold_seconds = time.perf_counter() - started
+
+    runs = 5
+    started = time.perf_counter()
+    for _ in range(runs):
+        actual = summary(breakdown="size")
+    warm_seconds = (time.perf_counter() - started) / runs
+
+    assert_matches(expected, actual)
+    speedup = loop_seconds / warm_seconds
+    print(f"{n_rows:,} rows: row loop {loop_seconds:.2f}s | first request {cold_seconds:.2f}s "
+          f"| per request {warm_seconds * 1000:.1f}ms ({speedup:.0f}x)")
+    return speedup
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        test_summary_matches_row_loop(mp, Path(tmp))
+        print("Equivalence: OK")
+        speedup = benchmark(mp, Path(tmp), int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+    assert speedup >= 20, f"expected at least 20x, got {speedup:.1f}x"
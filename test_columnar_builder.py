@@ -0,0 +1,107 @@
+"""
+Column typing in TableBuilder: a column's kind must not depend on which batch arrives first.
+
+Usage: python -m pytest test_columnar_builder.py
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.columnar import CategoricalColumn, RecordBatch, TableBuilder
+
+COLUMNS = ["date", "Customer", "Actual", "Note"]
+
+
+def batch(*rows):
+    return RecordBatch.from_records(COLUMNS, list(rows))
+
+
+def values(table, col):
+    column = table.columns[col]
+    if isinstance(column, CategoricalColumn):
+        return [column.categories[c] for c in column.codes]
+    return column.tolist()
+
+
+def test_empty_first_batch_leaves_column_untyped():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["", "Lotus", "1", ""], [None, "Tops", "2", None]))
+    builder.add_batch(batch(["2023-01-05", "Lotus", "3", "promo"]))
+    table = builder.build()
+
+    assert isinstance(table.columns["date"], CategoricalColumn)
+    assert isinstance(table.columns["Note"], CategoricalColumn)
+    assert values(table, "Note") == ["", "", "promo"]
+    assert table.month_id.tolist() == [0, 0, 202301]
+
+
+def test_text_after_numeric_batch_becomes_categorical():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["2023-01-05", "Lotus", "1", "7"], ["2023-01-06", "Tops", "2.5", "8"]))
+    builder.add_batch(batch(["2023-01-07", "Lotus", "3", "late"]))
+    table = builder.build()
+
+    assert isinstance(table.columns["Actual"], np.ndarray)
+    assert values(table, "Actual") == [1.0, 2.5, 3.0]
+    assert isinstance(table.columns["Note"], CategoricalColumn)
+    assert values(table, "Note") == ["7", "8", "late"]
+
+
+def test_all_empty_column_is_numeric_zeros():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["2023-01-05", "Lotus", "1", ""]))
+    table = builder.build()
+
+    assert values(table, "Note") == [0.0]
+
+
+def test_numeric_date_values_stay_categorical():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["20230105", "Lotus", "1", ""]))
+    builder.add_batch(batch(["2023-02-01", "Lotus", "1", ""]))
+    table = builder.build()
+
+    assert isinstance(table.columns["date"], CategoricalColumn)
+    assert table.month_id.tolist() == [0, 202302]
+
+
+def test_text_in_template_numeric_column_requires_full_reload():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["2023-01-05", "Lotus", "1", ""]))
+    template = builder.build()
+
+    delta = TableBuilder("t", COLUMNS, template=template)
+    with pytest.raises(ValueError):
+        delta.add_batch(batch(["2023-02-05", "Lotus", "n/a", ""]))
+
+
+def test_repeated_refresh_keeps_undated_rows_once():
+    builder = TableBuilder("t", COLUMNS)
+    builder.add_batch(batch(["", "Tops", "1", ""], ["2023-01-05", "Lotus", "2", ""],
+                            ["2023-02-05", "Lotus", "3", ""]))
+    table = builder.build()
+
+    for _ in range(2):
+        # Re-fetching from February returns the undated row again
+        delta = TableBuilder("t", COLUMNS, template=table)
+        delta.add_batch(batch(["", "Tops", "1", ""], ["2023-02-07", "Big C", "4", ""]))
+        table = table.with_months_replaced(delta.build(), 202302)
+
+    assert table.n_rows == 3
+    assert table.month_id.tolist() == [0, 202301, 202302]
+    assert values(table, "Customer") == ["Tops", "Lotus", "Big C"]
+
+
+def test_extend_merges_builders_in_order():
+    first = TableBuilder("t", COLUMNS)
+    first.add_batch(batch(["", "Tops", "1", ""]))
+    second = TableBuilder("t", COLUMNS)
+    second.add_batch(batch(["2023-03-01", "Lotus", "2", "x"], ["2023-03-02", "Tops", "3", ""]))
+
+    first.extend(second)
+    table = first.build()
+
+    assert table.columns["Customer"].categories == ["Tops", "Lotus"]
+    assert values(table, "Customer") == ["Tops", "Lotus", "Tops"]
+    assert values(table, "Note") == ["", "x", ""]
+    assert values(table, "Actual") == [1.0, 2.0, 3.0]
@@ -0,0 +1,69 @@
+"""
+DataMasker auto-name registry: blank values, sorted numbering and the persisted registry file.
+
+Usage: python -m pytest test_data_masking.py
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from backend.config import settings
+from backend.services import data_masking
+from backend.services.data_masking import masker
+from backend.services.table_index import table_index
+from test_analytics_summary_engine import synthetic_table
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch) -> Path:
+    path = tmp_path / "mask_registry.json"
+    monkeypatch.setattr(data_masking, "_REGISTRY_PATH", path)
+    monkeypatch.setattr(data_masking, "_registry_mtime", None)
+    return path
+
+
+@pytest.mark.parametrize("value", ["", "   ", "\t"])
+def test_blank_values_are_returned_unchanged(registry, value):
+    assert masker.mask("customer", value) == value
+    assert "" not in data_masking._AUTO_FORWARD.get("customer", {})
+
+
+def test_register_numbers_new_values_in_sorted_order(registry):
+    masker.register("testfield", ["Zeta", " alpha ", "Mid", "ALPHA", ""])
+
+    assert [masker.mask("testfield", v) for v in ("alpha", "Mid", "zeta")] == \
+        ["Testfield 01", "Testfield 02", "Testfield 03"]
+    assert masker.unmask("testfield", "Testfield 01") == "alpha"
+    assert json.loads(registry.read_text(encoding="utf-8"))["testfield"] == \
+        {"alpha": "Testfield 01", "Mid": "Testfield 02", "Zeta": "Testfield 03"}
+
+
+def test_names_persisted_by_another_worker_are_merged(registry):
+    masker.mask("otherfield", "Known")
+    saved = json.loads(registry.read_text(encoding="utf-8"))
+    saved["otherfield"]["From Worker"] = "Otherfield 02"
+    registry.write_text(json.dumps(saved), encoding="utf-8")
+    data_masking._registry_mtime = None
+
+    assert masker.unmask("otherfield", "Otherfield 02") == "From Worker"
+    assert masker.mask("otherfield", "New") == "Otherfield 03"
+
+
+def test_default_registry_is_outside_the_source_tree():
+    repo = Path(data_masking.__file__).resolve().parents[2]
+    default = Path(settings.MASK_REGISTRY_FILE).resolve()
+    assert repo not in default.parents
+
+
+@pytest.mark.parametrize("filters", [["LOTUS"], [" big c", "Tops "], ["nobody"]])
+def test_compiled_filter_selects_the_rows_match_in_keeps(filters):
+    table = synthetic_table(2_000)
+    customer = table.cat("Customer")
+    expected = [i for i, code in enumerate(customer.codes.tolist())
+                if masker.match_in("customer", customer.categories[code], filters)]
+
+    rows = table_index(table).select().match("Customer", masker.compile("customer", filters)).rows()
+
+    assert rows.tolist() == expected
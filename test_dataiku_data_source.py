@@ -0,0 +1,65 @@
+"""
+Date-range pushdown on Dataiku goes through a private dataikuapi call: pin down what it relies on.
+
+Usage: python -m pytest test_dataiku_data_source.py
+"""
+
+import inspect
+import io
+
+import dataikuapi
+from dataikuapi.dss.dataset import DSSDataset
+from dataikuapi.utils import DataikuStreamedHttpUTF8CSVReader
+
+from backend.services.data_sources import _iter_filtered_rows
+
+
+def parameters(fn):
+    return list(inspect.signature(fn).parameters)
+
+
+def test_private_client_call_keeps_its_signature():
+    assert parameters(dataikuapi.DSSClient._perform_raw)[:4] == ["self", "method", "path", "params"]
+    assert parameters(dataikuapi.DSSClient._perform_empty)[:4] == ["self", "method", "path", "params"]
+    assert parameters(DataikuStreamedHttpUTF8CSVReader.__init__) == \
+        ["self", "schema", "csv_stream", "read_session_id", "client", "project_key", "dataset_name"]
+
+
+def test_public_iter_rows_still_uses_the_same_request():
+    # _iter_filtered_rows repeats this request with a "filter" param added
+    source = inspect.getsource(DSSDataset.iter_rows)
+    assert "/projects/%s/datasets/%s/data/" in source
+    assert '"tsv-excel-noheader"' in source and "readSessionId" in source
+
+
+class RecordingClient:
+    """Stands in for DSSClient: records requests, serves one TSV body."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.calls = []
+
+    def _perform_raw(self, method, path, params=None):
+        self.calls.append((method, path, params))
+        response = io.BytesIO(self.body)
+        response.raw = io.BytesIO(self.body)
+        return response
+
+    def _perform_empty(self, method, path, params=None):
+        self.calls.append((method, path, params))
+
+
+def test_filtered_read_sends_the_filter_and_finishes_the_session():
+    client = RecordingClient(b"2024-01-05\tLotus\t3\n2024-02-01\tTops\t4\n")
+    schema = [{"name": "date", "type": "string"}, {"name": "Customer", "type": "string"},
+              {"name": "Actual_sale", "type": "double"}]
+
+    rows = list(_iter_filtered_rows(client, "PROJ", "sales", schema, None, 'strval("date") >= "2024-01-01"'))
+
+    assert rows == [["2024-01-05", "Lotus", 3.0], ["2024-02-01", "Tops", 4.0]]
+    (method, path, params), (_, finish_path, finish_params) = client.calls
+    assert (method, path) == ("GET", "/projects/PROJ/datasets/sales/data/")
+    assert params["filter"] == 'strval("date") >= "2024-01-01"'
+    assert params["format"] == "tsv-excel-noheader"
+    assert finish_path == "/projects/PROJ/datasets/sales/finish-streaming/"
+    assert finish_params["readSessionId"] == params["readSessionId"]
@@ -0,0 +1,59 @@
+"""
+Parallel (date-sliced) download of a local CSV dataset must give the same table every time.
+
+Usage: python -m pytest test_dataiku_split_download.py
+"""
+
+import csv
+
+import numpy as np
+
+from backend.config import settings
+from backend.services.columnar import CategoricalColumn
+from backend.services.data_sources import LocalDataSource
+from backend.services.dataiku_service import dataiku_service
+
+CUSTOMERS = ["Lotus", "Tops", "Big C", "Makro", "CP ALL"]
+
+
+def write_dataset(path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "Customer", "Actual", "Note"])
+        for i in range(20):
+            writer.writerow(["", CUSTOMERS[i % 2], "", ""])
+        for i in range(60):
+            month = 1 + i % 24
+            date = f"{2023 + (month - 1) // 12}-{(month - 1) % 12 + 1:02d}-{1 + i % 28:02d}"
+            writer.writerow([date, CUSTOMERS[(i * 7) % len(CUSTOMERS)], str(i), "promo" if i % 5 == 0 else ""])
+
+
+def snapshot(table):
+    out = {"month_id": table.month_id.tolist()}
+    for name, col in table.columns.items():
+        if isinstance(col, CategoricalColumn):
+            out[name] = ("categorical", list(col.categories), col.codes.tolist())
+        else:
+            out[name] = ("numeric", col.tolist())
+    return out
+
+
+def test_split_download_is_deterministic(tmp_path, monkeypatch):
+    write_dataset(tmp_path / "sales.csv")
+    monkeypatch.setattr(dataiku_service, "source", LocalDataSource(str(tmp_path)))
+    monkeypatch.setattr(settings, "DATASET_DOWNLOAD_SPLIT_FROM", "2023-01-01")
+    monkeypatch.setattr(settings, "DATASET_DOWNLOAD_SPLIT_MONTHS", 6)
+    monkeypatch.setattr(settings, "DATASET_DOWNLOAD_WORKERS", 4)
+    monkeypatch.setattr(settings, "DATASET_BATCH_SIZE", 7)
+
+    first = dataiku_service.get_dataset_table("sales")
+    expected = snapshot(first)
+    for _ in range(20):
+        assert snapshot(dataiku_service.get_dataset_table("sales")) == expected
+
+    assert first.n_rows == 80
+    assert isinstance(first.columns["date"], CategoricalColumn)
+    assert isinstance(first.columns["Actual"], np.ndarray)
+    assert isinstance(first.columns["Note"], CategoricalColumn)
+    assert int((first.month_id == 0).sum()) == 20
+    assert first.month_id[20:].min() == 202301
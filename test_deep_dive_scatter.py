@@ -0,0 +1,66 @@
+"""
+Scatter sampling of /analytics/deep-dive: stable across calls, "first" keeps the table's leading rows.
+
+Usage: python -m pytest test_deep_dive_scatter.py
+"""
+
+import asyncio
+import json
+
+import numpy as np
+
+from backend.routers import analytics
+from backend.services import deep_dive
+from backend.services.result_cache import result_cache
+from test_analytics_summary_engine import PERIOD, synthetic_table, use_table
+
+
+def scatter(**kwargs) -> list:
+    params = dict(customer=None, product_group=None, size=None, flavor=None, mechgroup=None,
+                  has_promotion=None, breakdown=None, scatter_limit=200, scatter_strategy="stratified",
+                  scatter_seed=0, format="objects")
+    params.update(kwargs)
+    result_cache.invalidate()  # sample again rather than replay a cached response
+    response = asyncio.run(analytics.get_deep_dive_analytics(**PERIOD, **params))
+    payload = json.loads(response.body)
+    assert payload["success"], payload["error"]
+    return payload["data"]["scatter_data"]
+
+
+def test_repeated_calls_return_the_same_sample(monkeypatch, tmp_path):
+    use_table(synthetic_table(20_000), monkeypatch, tmp_path)
+    for kwargs in [{}, {"scatter_seed": 3}, {"has_promotion": 1}, {"customer": ["LOTUS"]}]:
+        first = scatter(**kwargs)
+        assert len(first) == 200
+        for _ in range(3):
+            assert scatter(**kwargs) == first
+    assert scatter(scatter_seed=1) != scatter(scatter_seed=2)
+
+
+def test_first_strategy_keeps_leading_month_sorted_rows(monkeypatch, tmp_path):
+    table = synthetic_table(20_000)
+    use_table(table, monkeypatch, tmp_path)
+    start_id = PERIOD["year_from"] * 100 + PERIOD["month_from"]
+    end_id = PERIOD["year_to"] * 100 + PERIOD["month_to"]
+
+    customer = table.cat("Customer")
+    lotus = np.array([c.strip().lower() == "lotus" for c in customer.categories])[customer.codes]
+    for kwargs, selected in [({}, np.ones(table.n_rows, dtype=bool)), ({"customer": ["LOTUS"]}, lotus)]:
+        rows = np.flatnonzero(selected & (table.month_id >= start_id) & (table.month_id <= end_id))[:150]
+        expected = [(p, a) for p, a in zip(table.num("Planed_sales_from_start")[rows].tolist(),
+                                           table.num("Actual_sale")[rows].tolist())]
+        points = scatter(scatter_strategy="first", scatter_limit=150, **kwargs)
+        assert [(p["planned"], p["actual"]) for p in points] == expected
+
+
+def test_stratified_sample_keeps_largest_errors():
+    rng = np.random.default_rng(1)
+    err = rng.normal(0, 10, 5_000)
+    is_promo = rng.random(5_000) < 0.2
+    rows = deep_dive.scatter_rows(err, is_promo, 100)
+
+    assert np.array_equal(rows, deep_dive.scatter_rows(err, is_promo, 100))
+    assert np.all(np.diff(rows) > 0)
+    n_outliers = int(100 * deep_dive.SCATTER_OUTLIER_SHARE)
+    assert set(np.argsort(-np.abs(err))[:n_outliers].tolist()) <= set(rows.tolist())
+    assert is_promo[rows].any() and (~is_promo[rows]).any()
@@ -0,0 +1,68 @@
+"""
+Offline mode: the shipped CSV export, read through LocalDataSource, must feed the dashboard.
+
+Usage: python -m pytest test_local_data_source.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from backend.config import settings
+from backend.routers import dashboard
+from backend.services import data_masking, dataset_cache
+from backend.services.data_sources import LocalDataSource, create_data_source
+from backend.services.dataiku_service import dataiku_service
+from backend.services.dataset_cache import DatasetCache
+from backend.services.result_cache import result_cache
+
+# The offline setup documented in .env.example
+DATASET_FILES = "sale_data_final_1=Sale_2021_2024_prepared.csv"
+
+
+@pytest.fixture
+def local_dashboard(monkeypatch, tmp_path):
+    source = create_data_source("local", dataiku_service.dss, settings.LOCAL_DATA_DIR, DATASET_FILES)
+    cache = DatasetCache(loader=dataiku_service.get_dataset_table, ttl=3600, max_bytes=1 << 40)
+    monkeypatch.setattr(dataiku_service, "source", source)
+    monkeypatch.setattr(settings, "DATASET_DASHBOARD_SUMMARY", "sale_data_final_1")
+    monkeypatch.setattr(dashboard, "dataset_cache", cache)
+    monkeypatch.setattr(dataset_cache, "dataset_cache", cache)
+    monkeypatch.setattr(data_masking, "_REGISTRY_PATH", tmp_path / "mask_registry.json")
+    monkeypatch.setattr(data_masking, "_registry_mtime", None)
+    result_cache.invalidate()
+    return cache
+
+
+def data(response) -> dict:
+    payload = json.loads(response.body)
+    assert payload["success"], payload["error"]
+    return payload["data"]
+
+
+def test_raw_export_headers_are_normalized():
+    columns = LocalDataSource(settings.LOCAL_DATA_DIR, DATASET_FILES).dataset_columns("sale_data_final_1")
+
+    for name in ("date", "Billing_Date_year", "Billing_Date_month", "Product_Group", "Actual_sale", "Customer"):
+        assert name in columns
+    assert "Product Group" not in columns and "CTN" not in columns
+
+
+def test_dashboard_summary_reads_the_shipped_csv(local_dashboard):
+    summary = data(asyncio.run(dashboard.get_dashboard_summary(
+        year_from=2021, month_from=1, year_to=2024, month_to=12, customer=None, site=None,
+        product_group=None, size=None, flavor=None, mechgroup=None, has_promotion=None,
+    )))
+    table = local_dashboard.get("sale_data_final_1").table
+
+    assert table.month_id.min() >= 202101
+    assert summary["meta"]["record_count"] > 0
+    assert summary["kpi"]["total_qty"] > 0
+
+
+def test_dashboard_filters_read_the_shipped_csv(local_dashboard):
+    filters = data(asyncio.run(dashboard.get_dashboard_filters(
+        product_group=None, flavor=None, size=None, customer=None)))
+
+    assert filters["product_groups"] and filters["customers"] and filters["flavors"]
@@ -0,0 +1,78 @@
+"""
+Incremental cube maintenance (extend_cube) must equal a full AggregateCube rebuild.
+
+Usage: python -m pytest test_olap_cube_incremental.py
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.columnar import CategoricalColumn, ColumnarTable
+from backend.services.olap_cube import AggregateCube, aggregate_cube, built_cube_bytes, extend_cube
+from test_analytics_summary_engine import synthetic_table
+
+
+def make_delta(previous: ColumnarTable, n_rows: int, months, undated: bool, new_categories: bool,
+               seed: int = 3) -> ColumnarTable:
+    """Re-fetched rows for `months`, with dictionaries extending `previous` (as TableBuilder(template=...))."""
+    source = synthetic_table(n_rows, seed=seed)
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, col in previous.columns.items():
+        new = source.columns[name]
+        if isinstance(col, CategoricalColumn):
+            categories = list(col.categories)
+            lookup = {c: i for i, c in enumerate(categories)}
+            codes = np.array([lookup.setdefault(c, len(lookup)) for c in new.categories], dtype=np.int32)[new.codes]
+            if new_categories:
+                codes[::97] = lookup.setdefault(f"NEW {name}", len(lookup))
+            columns[name] = CategoricalColumn(codes, list(lookup))
+        else:
+            columns[name] = new.copy()
+    month_id = rng.choice(np.array(months, dtype=np.int32), n_rows)
+    if undated:
+        month_id[::13] = 0
+    return ColumnarTable(previous.name, columns, month_id)
+
+
+def assert_same_cube(actual: AggregateCube, expected: AggregateCube) -> None:
+    assert actual.source_rows == expected.source_rows
+    assert np.array_equal(actual.cells.month_id, expected.cells.month_id)
+    assert np.array_equal(actual.first_row, expected.first_row)
+    for name, col in expected.cells.columns.items():
+        other = actual.cells.columns[name]
+        if isinstance(col, CategoricalColumn):
+            assert other.categories == col.categories, name
+            assert np.array_equal(other.codes, col.codes), name
+        else:
+            assert np.allclose(other, col), name
+
+
+@pytest.mark.parametrize("months, undated, new_categories", [
+    ([202511, 202512], False, False),           # overlaps existing months only
+    ([202512, 202601], False, True),            # existing + new month, unseen categories
+    ([202512, 202601, 202602], True, True),     # plus undated rows in the re-fetch
+])
+def test_extend_cube_equals_rebuild(months, undated, new_categories):
+    previous = synthetic_table(30_000)
+    aggregate_cube(previous)   # the cube extend_cube carries forward
+    from_month = months[0]
+    delta = make_delta(previous, 3_000, months, undated, new_categories)
+
+    table = previous.with_months_replaced(delta, from_month)
+    extend_cube(previous, table, delta, from_month)
+
+    assert built_cube_bytes(table) > 0   # carried forward, not built by aggregate_cube below
+    assert_same_cube(aggregate_cube(table), AggregateCube(table))
+
+
+def test_repeated_refresh_matches_rebuild():
+    table = synthetic_table(30_000)
+    aggregate_cube(table)
+    for seed in (3, 4, 5):
+        delta = make_delta(table, 2_000, [202512, 202601], True, True, seed=seed)
+        refreshed = table.with_months_replaced(delta, 202512)
+        extend_cube(table, refreshed, delta, 202512)
+        table = refreshed
+        assert built_cube_bytes(table) > 0
+        assert_same_cube(aggregate_cube(table), AggregateCube(table))
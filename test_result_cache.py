@@ -0,0 +1,109 @@
+"""
+ResultCache: key normalization, snapshot-version invalidation, stale puts and LRU byte budget.
+
+Usage: python -m pytest test_result_cache.py
+"""
+
+from typing import Any, Dict
+
+from pydantic import BaseModel
+
+from backend.services.result_cache import ResultCache
+
+
+class StubSnapshot:
+    def __init__(self, name: str = "sales", version: int = 1):
+        self.name = name
+        self.version = version
+
+    def meta(self) -> Dict[str, Any]:
+        return {"snapshot_version": self.version}
+
+
+class Payload(BaseModel):
+    value: str
+    meta: Dict[str, Any] = {}
+
+
+def entry_bytes(value: str) -> int:
+    return len(Payload(value=value).model_dump_json())
+
+
+def test_key_normalizes_filters_and_drops_empty_ones():
+    snapshot = StubSnapshot()
+    a = ResultCache.key("summary", snapshot, customer=["Lotus ", "TOPS", "lotus"], flavor=None, size=[], start_id=202301)
+    b = ResultCache.key("summary", snapshot, start_id=202301, customer=frozenset({"tops", "LOTUS"}))
+
+    assert a == b == ("summary", "sales", 1, (("customer", ("lotus", "tops")), ("start_id", 202301)))
+    assert ResultCache.key("summary", snapshot, customer=["lotus"]) != a
+    assert ResultCache.key("summary", StubSnapshot(version=2), customer=["lotus", "tops"], start_id=202301) != a
+
+
+def test_hit_refreshes_meta():
+    cache = ResultCache(max_bytes=1 << 20)
+    snapshot = StubSnapshot()
+    key = cache.key("summary", snapshot, customer=["lotus"])
+
+    assert cache.get(key, snapshot) is None
+    cache.put(key, Payload(value="x", meta={"record_count": 3}))
+    hit = cache.get(key, snapshot)
+
+    assert hit.value == "x"
+    assert hit.meta["record_count"] == 3 and hit.meta["result_cache"] == "hit"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_new_snapshot_version_invalidates_older_entries():
+    cache = ResultCache(max_bytes=1 << 20)
+    old, other = StubSnapshot(version=1), StubSnapshot(name="dashboard", version=1)
+    old_key, other_key = cache.key("summary", old), cache.key("summary", other)
+    cache.put(old_key, Payload(value="old"))
+    cache.put(other_key, Payload(value="other"))
+
+    new = StubSnapshot(version=2)
+    assert cache.get(cache.key("summary", new), new) is None
+
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["entries"] == 1
+    assert stats["bytes"] == entry_bytes("other")
+    assert cache.get(other_key, other).value == "other"
+
+
+def test_put_computed_against_a_replaced_snapshot_is_dropped():
+    cache = ResultCache(max_bytes=1 << 20)
+    old, new = StubSnapshot(version=1), StubSnapshot(version=2)
+    stale_key = cache.key("summary", old)
+    cache.get(cache.key("summary", new), new)   # version 2 seen first
+
+    cache.put(stale_key, Payload(value="stale"))
+
+    assert cache.stats()["entries"] == 0
+    assert cache.get(stale_key, old) is None
+
+
+def test_lru_eviction_keeps_bytes_within_budget():
+    size = entry_bytes("a")
+    cache = ResultCache(max_bytes=2 * size)
+    snapshot = StubSnapshot()
+    keys = {name: cache.key("summary", snapshot, customer=[name]) for name in "abc"}
+
+    cache.put(keys["a"], Payload(value="a"))
+    cache.put(keys["b"], Payload(value="b"))
+    cache.get(keys["a"], snapshot)              # "b" is now least recently used
+    cache.put(keys["c"], Payload(value="c"))
+
+    assert cache.get(keys["b"], snapshot) is None
+    assert cache.get(keys["a"], snapshot).value == "a"
+    assert cache.get(keys["c"], snapshot).value == "c"
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 2 * size <= stats["max_bytes"]
+
+
+def test_oversized_response_is_not_cached():
+    cache = ResultCache(max_bytes=entry_bytes("a") - 1)
+    snapshot = StubSnapshot()
+    key = cache.key("summary", snapshot)
+    cache.put(key, Payload(value="a"))
+
+    assert cache.get(key, snapshot) is None
+    assert cache.stats()["bytes"] == 0